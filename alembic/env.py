@@ -22,11 +22,14 @@ SSL_CA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "DigiCert
 
 from models.database import Base
 from models.user import User
+from models.user_avatar import UserAvatar
+from models.avatar_rendition import AvatarRendition
 from models.knowledge import Knowledge
 from models.file import File
 from models.comment import Comment
 from models.knowledge_collaborator import KnowledgeCollaborator
 from models.user_activity import UserActivity
+from models.user_stats import UserStats
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,59 @@
+"""move avatars to user_avatars
+
+Revision ID: a3c1e2f4b5d6
+Revises: 5d471a54ead8
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c1e2f4b5d6'
+down_revision: Union[str, None] = '5d471a54ead8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_avatars',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(length=(2**32) - 1), nullable=False),
+        sa.Column('content_type', sa.String(length=50), nullable=False),
+        sa.Column('etag', sa.String(length=64), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.add_column('users', sa.Column('avatar_etag', sa.String(length=64), nullable=True))
+
+    # 既存のアバター画像を移行する
+    op.execute(
+        "INSERT INTO user_avatars (user_id, data, content_type, etag, updated_at) "
+        "SELECT id, avatar_data, COALESCE(avatar_content_type, 'application/octet-stream'), "
+        "SHA2(avatar_data, 256), updated_at "
+        "FROM users WHERE avatar_data IS NOT NULL"
+    )
+    op.execute(
+        "UPDATE users u JOIN user_avatars a ON a.user_id = u.id "
+        "SET u.avatar_etag = a.etag"
+    )
+
+    op.drop_column('users', 'avatar_data')
+    op.drop_column('users', 'avatar_content_type')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('users', sa.Column('avatar_content_type', sa.String(length=50), nullable=True))
+    op.add_column('users', sa.Column('avatar_data', sa.LargeBinary(length=(2**32) - 1), nullable=True))
+    op.execute(
+        "UPDATE users u JOIN user_avatars a ON a.user_id = u.id "
+        "SET u.avatar_data = a.data, u.avatar_content_type = a.content_type"
+    )
+    op.drop_column('users', 'avatar_etag')
+    op.drop_table('user_avatars')
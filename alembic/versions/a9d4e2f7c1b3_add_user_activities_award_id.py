@@ -0,0 +1,31 @@
+"""add user_activities.award_id
+
+Revision ID: a9d4e2f7c1b3
+Revises: f3a8c1d5b7e9
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4e2f7c1b3'
+down_revision: Union[str, None] = 'f3a8c1d5b7e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 既存の行はNULLのまま（一意制約はNULL同士を区別する）
+    op.add_column('user_activities', sa.Column('award_id', sa.String(length=36), nullable=True))
+    op.create_index('ix_user_activities_award_id', 'user_activities', ['award_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_activities_award_id', table_name='user_activities')
+    op.drop_column('user_activities', 'award_id')
@@ -0,0 +1,28 @@
+"""add knowledges (created_at, id) index
+
+Revision ID: b7e2d9c0a1f3
+Revises: a3c1e2f4b5d6
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d9c0a1f3'
+down_revision: Union[str, None] = 'a3c1e2f4b5d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_knowledges_created_at_id', 'knowledges', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_knowledges_created_at_id', table_name='knowledges')
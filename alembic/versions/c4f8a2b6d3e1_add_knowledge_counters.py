@@ -0,0 +1,37 @@
+"""add knowledge comment_count / file_count
+
+Revision ID: c4f8a2b6d3e1
+Revises: b7e2d9c0a1f3
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f8a2b6d3e1'
+down_revision: Union[str, None] = 'b7e2d9c0a1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('knowledges', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('knowledges', sa.Column('file_count', sa.Integer(), server_default='0', nullable=False))
+
+    # 既存データのバックフィル（以降のずれは python -m utils.counters で修正する）
+    op.execute(
+        "UPDATE knowledges k SET "
+        "comment_count = (SELECT COUNT(*) FROM comments c WHERE c.knowledge_id = k.id), "
+        "file_count = (SELECT COUNT(*) FROM files f WHERE f.knowledge_id = k.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('knowledges', 'file_count')
+    op.drop_column('knowledges', 'comment_count')
@@ -0,0 +1,42 @@
+"""add file storage columns
+
+Revision ID: d2a9f6c3e8b4
+Revises: c4f8a2b6d3e1
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a9f6c3e8b4'
+down_revision: Union[str, None] = 'c4f8a2b6d3e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column('files', 'file_url',
+        existing_type=sa.String(length=255),
+        type_=sa.String(length=1024),
+        existing_nullable=False)
+    op.add_column('files', sa.Column('storage_key', sa.String(length=512), nullable=True))
+    op.add_column('files', sa.Column('content_type', sa.String(length=255), nullable=True))
+    op.add_column('files', sa.Column('size', sa.BigInteger(), nullable=True))
+    op.add_column('files', sa.Column('sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('files', 'sha256')
+    op.drop_column('files', 'size')
+    op.drop_column('files', 'content_type')
+    op.drop_column('files', 'storage_key')
+    op.alter_column('files', 'file_url',
+        existing_type=sa.String(length=1024),
+        type_=sa.String(length=255),
+        existing_nullable=False)
@@ -0,0 +1,37 @@
+"""add user_avatar_renditions
+
+Revision ID: e5b1c7d4f9a2
+Revises: d2a9f6c3e8b4
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1c7d4f9a2'
+down_revision: Union[str, None] = 'd2a9f6c3e8b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 既存のアバターの縮小版は初回参照時に生成される
+    op.create_table('user_avatar_renditions',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('content_type', sa.String(length=50), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user_avatars.user_id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'size')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_avatar_renditions')
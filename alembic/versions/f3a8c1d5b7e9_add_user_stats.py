@@ -0,0 +1,62 @@
+"""add user_stats
+
+Revision ID: f3a8c1d5b7e9
+Revises: e5b1c7d4f9a2
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8c1d5b7e9'
+down_revision: Union[str, None] = 'e5b1c7d4f9a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('knowledge_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('total_views', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('last_activity_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    # 最近のナレッジ・コメントの取得用
+    op.create_index('ix_knowledges_author_id_created_at', 'knowledges', ['author_id', 'created_at'], unique=False)
+    op.create_index('ix_comments_author_id_created_at', 'comments', ['author_id', 'created_at'], unique=False)
+
+    # 既存データのバックフィル（以降のずれは python -m utils.counters で修正する）
+    op.execute(
+        "INSERT INTO user_stats (user_id, knowledge_count, comment_count, total_views, last_activity_at) "
+        "SELECT u.id, "
+        "(SELECT COUNT(*) FROM knowledges k WHERE k.author_id = u.id), "
+        "(SELECT COUNT(*) FROM comments c WHERE c.author_id = u.id), "
+        "(SELECT COALESCE(SUM(k.views), 0) FROM knowledges k WHERE k.author_id = u.id), "
+        "GREATEST("
+        "COALESCE((SELECT MAX(k.updated_at) FROM knowledges k WHERE k.author_id = u.id), '1970-01-01'), "
+        "COALESCE((SELECT MAX(c.created_at) FROM comments c WHERE c.author_id = u.id), '1970-01-01')"
+        ") "
+        "FROM users u"
+    )
+    op.execute("UPDATE user_stats SET last_activity_at = NULL WHERE last_activity_at = '1970-01-01'")
+    # GET時にプロフィールを作らなくなるため、未作成のユーザーの分を作っておく
+    op.execute(
+        "INSERT INTO profiles (user_id, created_at) "
+        "SELECT u.id, NOW() FROM users u "
+        "WHERE NOT EXISTS (SELECT 1 FROM profiles p WHERE p.user_id = u.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_comments_author_id_created_at', table_name='comments')
+    op.drop_index('ix_knowledges_author_id_created_at', table_name='knowledges')
+    op.drop_table('user_stats')
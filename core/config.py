@@ -10,6 +10,19 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24時間
 
+    # 認証済みユーザー（プリンシパル）キャッシュ
+    PRINCIPAL_CACHE_SIZE: int = 4096  # 保持する最大ユーザー数
+    PRINCIPAL_CACHE_TTL: int = 60  # 秒（他ワーカーでの更新が反映されるまでの上限）
+
+    # 検証済みトークンのキャッシュ
+    TOKEN_CACHE_SIZE: int = 4096  # 保持する最大トークン数
+    TOKEN_CACHE_TTL: int = 300  # 秒（トークンの有効期限の方が早い場合はそちらまで）
+
+    # パスワードハッシュ（bcrypt）
+    PASSWORD_HASH_ROUNDS: int = 12  # コスト。変更すると既存ハッシュはログイン成功時に再ハッシュされる
+    PASSWORD_HASH_WORKERS: int = 4  # ハッシュ計算用のスレッド数
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32  # 実行待ちの上限（超えた場合は503を返す）
+
     # データベース設定
     MYSQL_HOST: str
     MYSQL_PORT: str
@@ -19,10 +32,77 @@ class Settings(BaseSettings):
     MYSQL_SSL_MODE: str
     DATABASE_URL: Optional[str] = None
 
+    # コネクションプール設定
+    DB_POOL_SIZE: int = 10  # 常時保持する接続数
+    DB_MAX_OVERFLOW: int = 20  # プールを超えて一時的に作成できる接続数
+    DB_POOL_RECYCLE: int = 1800  # 接続を再作成するまでの秒数（Azure MySQLのアイドル切断対策）
+    DB_POOL_PRE_PING: bool = True  # チェックアウト時に死活確認する
+    DB_POOL_TIMEOUT: int = 10  # 接続待ちのタイムアウト秒数
+    DB_POOL_PREWARM: int = 5  # 起動時に事前確立する接続数（0で無効）
+
+    # キャッシュ設定
+    POPULAR_KNOWLEDGE_CACHE_TTL: int = 30  # 人気ナレッジのキャッシュ秒数
+    RESPONSE_CACHE_SIZE: int = 1024  # GETレスポンスのキャッシュ件数（ワーカーごと）
+    RESPONSE_CACHE_TTL: float = 60.0  # GETレスポンスのキャッシュ秒数（更新時はタグで即時無効化）
+    RESPONSE_CACHE_SHARED_PATH: Optional[str] = "./var/response_cache.sqlite3"  # ワーカー間で共有するSQLiteファイル（空にすると共有しない。その場合は1ワーカーで起動する）
+
+    # 閲覧数の書き込みバッファ
+    VIEW_COUNTER_FLUSH_INTERVAL: float = 5.0  # DBへ反映する間隔（秒）
+    VIEW_COUNTER_FLUSH_THRESHOLD: int = 1000  # この件数溜まったら間隔を待たずに反映
+    VIEW_COUNTER_DEDUPE_WINDOW: float = 0  # 同一ユーザーの再閲覧を数えない秒数（0で無効）
+
+    # バックグラウンドジョブ
+    JOB_SPOOL_PATH: str = "./var/jobs.sqlite3"  # ジョブを保存するSQLiteファイル（同じマシンのワーカーで共有）
+    JOB_WORKERS: int = 2  # プロセスあたりのワーカー数
+    JOB_POLL_INTERVAL: float = 1.0  # ジョブがないときの確認間隔（秒）
+    JOB_MAX_ATTEMPTS: int = 5  # 再試行を含めた最大実行回数
+    JOB_RETRY_BASE_DELAY: float = 2.0  # 再試行までの待ち時間の初期値（秒、失敗のたびに倍）
+    JOB_RETRY_MAX_DELAY: float = 300.0  # 再試行までの待ち時間の上限（秒）
+    JOB_LOCK_TIMEOUT: float = 300.0  # 取り出したまま完了しないジョブを再実行するまでの秒数
+
+    # レスポンスの圧縮・エンコーディング
+    COMPRESSION_MIN_SIZE: int = 1024  # これより小さいレスポンスは圧縮しない（バイト）
+    COMPRESSION_GZIP_LEVEL: int = 6  # gzipの圧縮レベル（1〜9）
+    COMPRESSION_BROTLI_QUALITY: int = 5  # brotliの品質（0〜11）
+    COMPRESSION_CACHE_SIZE: int = 512  # 圧縮結果のキャッシュ件数（ETag付き・キャッシュ済みのレスポンスのみ）
+    COMPRESSION_CACHE_TTL: float = 300.0  # 圧縮結果のキャッシュ秒数
+
+    # 一括取得（/knowledge/batch, /profile/batch）
+    BATCH_MAX_IDS: int = 100  # 1回のリクエストで指定できるIDの上限
+
+    # 全文検索
+    SEARCH_INDEX_REFRESH_INTERVAL: float = 30.0  # 他ワーカーの変更を取り込む間隔（秒）
+
+    # ランキング
+    LEADERBOARD_CHECK_INTERVAL: float = 60.0  # DBとの整合性チェック間隔（秒）
+
+    # メトリクス（/metrics）
+    METRICS_TOKEN: Optional[str] = None  # Authorization: Bearer または ?token= で指定するトークン（未指定の場合は無効）
+
+    # ヘルスチェック（/readyz）
+    HEALTH_CHECK_INTERVAL: float = 5.0  # 依存サービスを確認する間隔（秒）
+    HEALTH_CHECK_TIMEOUT: float = 2.0  # 1回の確認のタイムアウト（秒）
+
+    # サーバー（serve.py）
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: Optional[int] = None  # 未指定の場合は利用可能なCPU数から決める
+    SERVER_MAX_WORKERS: int = 8  # CPU数から決める場合の上限
+    SERVER_TIMEOUT: int = 120  # 応答のないワーカーを再起動するまでの秒数
+    SERVER_GRACEFUL_TIMEOUT: int = 30  # 再起動時に処理中のリクエストを待つ秒数
+    SERVER_KEEPALIVE: int = 5  # Keep-Aliveの秒数
+    SERVER_MAX_REQUESTS: int = 10000  # この件数を処理したワーカーを入れ替える（0で無効）
+    SERVER_MAX_REQUESTS_JITTER: int = 1000  # ワーカーが同時に入れ替わらないよう加えるばらつき
+
     # Azure Storage設定
     AZURE_STORAGE_CONNECTION_STRING: str
     AZURE_STORAGE_CONTAINER_NAME: str
 
+    # 添付ファイルの保存先
+    STORAGE_BACKEND: str = "azure"  # "azure" または "local"（開発・テスト用）
+    LOCAL_STORAGE_DIR: str = "./uploads"  # local の保存先ディレクトリ
+    STORAGE_CHUNK_SIZE: int = 4 * 1024 * 1024  # アップロード時のチャンクサイズ（バイト）
+
     class Config:
         env_file = ".env"
         case_sensitive = False  # 環境変数名の大文字小文字を区別しない
@@ -1,35 +1,258 @@
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-import os
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import settings
 from models.database import get_db
-from models.user import User
+from models.user import User, build_avatar_url
+from utils.cache import TTLCache
+from utils.metrics import metrics
+from utils.response_cache import response_cache
 
 # 設定
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")  # 環境変数から取得、デフォルトも設定
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 1440
+SECRET_KEY = settings.SECRET_KEY
+ALGORITHM = settings.ALGORITHM
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
 # パスワードハッシュ
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min/max_rounds を指定しておくと、コストの異なる既存ハッシュが再ハッシュ対象になる
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_HASH_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_HASH_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_HASH_ROUNDS,
+)
 
 # トークンエンドポイントのURLを正しく設定
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
+@dataclass(frozen=True)
+class CurrentUser:
+    """
+    認証済みユーザーの軽量スナップショット
+    アバター画像などの大きなカラムは含まず、プリンシパルキャッシュに保存される
+    更新系の処理では get_current_db_user でORMのUserを取得すること
+    """
+    id: int
+    email: str
+    username: Optional[str]
+    department: Optional[str]
+    level: int
+    points: int
+    current_xp: int
+    experience_points: int
+    is_first_login: bool
+    avatar_etag: Optional[str]
+    updated_at: Optional[datetime]
+
+    @property
+    def has_avatar(self) -> bool:
+        return self.avatar_etag is not None
+
+    @property
+    def avatar_url(self) -> str | None:
+        """ユーザーのアバター画像のURLを返す（未設定の場合はNone）"""
+        return build_avatar_url(self.id, self.avatar_etag)
+
+
+# トークンのダイジェスト → (検証済みのクレーム, 有効期限のUNIX時刻)
+# 同じトークンでのリクエストが続く間、署名検証を省略する
+token_cache = TTLCache(
+    "verified_token",
+    maxsize=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL,
+)
+
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """
+    アクセストークンを検証してクレームを返す
+    検証済みのトークンはキャッシュし、有効期限（exp）を過ぎたものは再検証する
+
+    Raises:
+        JWTError: 署名が不正・期限切れなどで検証に失敗した場合
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+    cached = token_cache.get(digest)
+    if cached is not None:
+        claims, expires_at = cached
+        # jwt.decode と同じく exp の時刻ちょうどまでは有効
+        if expires_at is None or now <= expires_at:
+            return dict(claims)
+        token_cache.invalidate(digest)
+
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    expires_at = claims.get("exp")
+    ttl = settings.TOKEN_CACHE_TTL
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - now)
+    if ttl > 0:
+        token_cache.set(digest, (claims, expires_at), ttl=ttl)
+    return dict(claims)
+
+
+# トークンのsubject（メールアドレス）→ (CurrentUser, 読み込みを始めた時刻)
+# 更新は "principal:{メールアドレス}" タグの無効化でワーカー間に伝える
+principal_cache = TTLCache(
+    "principal",
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+)
+
+
+def _principal_tag(email: str) -> str:
+    return f"principal:{email}"
+
+
+async def invalidate_principal(*emails: str) -> None:
+    """
+    ユーザー情報（表示名・レベル・経験値など）を更新したときにプリンシパルキャッシュを破棄する
+    レスポンスキャッシュの共有ストアを通じて、他のワーカーのキャッシュも読み直させる
+    """
+    for email in emails:
+        principal_cache.invalidate(email)
+    await response_cache.invalidate(*(_principal_tag(email) for email in emails))
+
+
+async def _load_principal(db: AsyncSession, email: str) -> Optional[CurrentUser]:
+    result = await db.execute(
+        select(
+            User.id,
+            User.email,
+            User.username,
+            User.department,
+            User.level,
+            User.points,
+            User.current_xp,
+            User.experience_points,
+            User.is_first_login,
+            User.avatar_etag,
+            User.updated_at,
+        ).where(User.email == email)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    return CurrentUser(
+        id=row.id,
+        email=row.email,
+        username=row.username,
+        department=row.department,
+        level=row.level or 0,
+        points=row.points or 0,
+        current_xp=row.current_xp or 0,
+        experience_points=row.experience_points or 0,
+        is_first_login=bool(row.is_first_login),
+        avatar_etag=row.avatar_etag,
+        updated_at=row.updated_at,
+    )
+
+
+class PasswordHasher:
+    """
+    bcrypt の計算を専用のスレッドプールで実行する
+    （bcrypt はGILを解放するため、イベントループを止めずに並列に計算できる）
+
+    実行中・実行待ちの件数が max_workers + queue_limit に達した場合は、
+    待たせずに503を返す（ログインが集中しても他のリクエストを巻き込まない）
+
+    Args:
+        context (CryptContext): パスワードハッシュの設定
+        max_workers (int): ハッシュ計算用のスレッド数
+        queue_limit (int): 実行待ちの上限
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int, queue_limit: int):
+        self.context = context
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        metrics.register_gauge("password_hash.in_flight", lambda: self._in_flight)
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    async def _run(self, name: str, func: Callable, *args):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.queue_limit:
+                metrics.incr("password_hash.rejected")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="ただいま混み合っています。しばらくしてから再度お試しください",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+
+        queued_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            metrics.observe("password_hash.queue_wait", started_at - queued_at)
+            try:
+                return func(*args)
+            finally:
+                metrics.observe(f"password_hash.{name}", time.perf_counter() - started_at)
+
+        # 完了・キャンセルのどちらでも件数を戻す（呼び出し側が切断されても数がずれないように）
+        future = self._executor.submit(task)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        パスワードを照合する
+
+        Returns:
+            Tuple[bool, Optional[str]]: (一致したか, 再ハッシュ後の値)
+                コストの設定が変わっている場合だけ再ハッシュ後の値を返す
+        """
+        verified, new_hash = await self._run(
+            "verify", self.context.verify_and_update, plain_password, hashed_password
+        )
+        if verified and new_hash is not None:
+            metrics.incr("password_hash.rehashed")
+        return verified, new_hash
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    queue_limit=settings.PASSWORD_HASH_QUEUE_LIMIT,
+)
+
+
 # パスワード照合
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    verified, _ = await password_hasher.verify_and_update(plain_password, hashed_password)
+    return verified
 
 
 # パスワードのハッシュ化
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
 # アクセストークン作成
@@ -46,15 +269,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 # 現在のユーザー取得（JWTトークンから）
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_db)
+) -> CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="認証情報が正しくありません",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         # トークン解凍データの例 {'sub': 'rebema1@example.com', 'exp': 1744215602} 
         user_email = payload.get("sub")
         if user_email is None:
@@ -62,7 +285,34 @@ async def get_current_user(
     except (JWTError, ValueError):
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == user_email).first()
+    user = None
+    cached = principal_cache.get(user_email)
+    if cached is not None:
+        user, loaded_at = cached
+        # 他のワーカーで更新（経験値の付与・プロフィール編集など）された場合は読み直す
+        if await response_cache.last_invalidated([_principal_tag(user_email)]) >= loaded_at:
+            metrics.incr("principal.stale")
+            user = None
     if user is None:
-        raise credentials_exception
+        loaded_at = time.time()
+        user = await _load_principal(db, user_email)
+        if user is None:
+            raise credentials_exception
+        principal_cache.set(user_email, (user, loaded_at))
+    return user
+
+
+# 現在のユーザーをORMオブジェクトとして取得（更新処理用）
+async def get_current_db_user(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    user = await db.get(User, current_user.id)
+    if user is None:
+        await invalidate_principal(current_user.email)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="認証情報が正しくありません",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
@@ -1,8 +1,18 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
-from routers import auth, knowledge, ranking, profile
-from models.database import engine, Base
+from routers import auth, knowledge, ranking, profile, metrics, health
+from models.database import engine, Base, warm_pool
+from core.security import password_hasher
+from utils.view_counter import view_counter
+from utils.jobs import job_queue
+from utils.search import knowledge_search
+from utils.leaderboard import leaderboard
+from utils.storage import get_storage
+from utils.health import health_monitor
+from utils.compression import ContentEncodingMiddleware
+from core.config import settings
 import os
 from routers import comments
 from dotenv import load_dotenv
@@ -11,7 +21,10 @@ load_dotenv()
 
 
 
-app = FastAPI(title="Rebema API")
+# レスポンスのJSON化は orjson で行う（標準の json より大幅に速い）
+app = FastAPI(title="Rebema API", default_response_class=ORJSONResponse)
+# 起動処理（DB接続の事前確立など）が終わるまでFalse
+app.state.ready = False
 
 # CORS設定
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -23,12 +36,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Accept-Encoding / Accept に応じた圧縮・MessagePack変換
+app.add_middleware(
+    ContentEncodingMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    cache_size=settings.COMPRESSION_CACHE_SIZE,
+    cache_ttl=settings.COMPRESSION_CACHE_TTL,
+)
+
 # ルーターの登録
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(knowledge.router, prefix="/knowledge", tags=["knowledge"])
-app.include_router(ranking.router, prefix="/ranking", tags=["ranking"])
-app.include_router(profile.router, prefix="/profile", tags=["profile"])
+app.include_router(ranking.router)
+app.include_router(profile.router)
 app.include_router(comments.router)
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+app.include_router(health.router)
+
+
+@app.on_event("startup")
+async def startup():
+    # 最初のリクエストでTLSハンドシェイク待ちが発生しないよう接続を事前確立する
+    warmed = await warm_pool()
+    print(f"✅ DBコネクションを事前確立しました: {warmed}件")
+    view_counter.start()
+    job_queue.start()
+    knowledge_search.start()
+    leaderboard.start()
+    # 最初の確認を済ませてから準備完了にする
+    await health_monitor.check_all()
+    health_monitor.start()
+    app.state.ready = True
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.ready = False
+    await health_monitor.stop()
+    # バッファ中の閲覧数を反映してからコネクションプールを閉じる
+    await leaderboard.stop()
+    await knowledge_search.stop()
+    await view_counter.stop()
+    await job_queue.stop()
+    await get_storage().close()
+    await engine.dispose()
+    password_hasher.shutdown()
 
 
 @app.get("/")
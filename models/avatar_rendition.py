@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary
+from datetime import datetime
+from .database import Base
+
+class AvatarRendition(Base):
+    """
+    アバター画像の縮小版（32/64/256pxなど）
+    一覧表示で元画像を配信しないよう、アップロード時（旧データは初回参照時）に生成する
+    """
+    __tablename__ = "user_avatar_renditions"
+
+    user_id = Column(Integer, ForeignKey("user_avatars.user_id"), primary_key=True)
+    size = Column(Integer, primary_key=True)  # 一辺のピクセル数
+    data = Column(LargeBinary, nullable=False)
+    content_type = Column(String(50), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
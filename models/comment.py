@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -14,4 +14,9 @@ class Comment(Base):
 
     # リレーションシップ
     knowledge = relationship("Knowledge", back_populates="comments")
-    author = relationship("User", back_populates="comments") 
\ No newline at end of file
+    author = relationship("User", back_populates="comments")
+
+    # インデックス
+    __table_args__ = (
+        Index('ix_comments_author_id_created_at', 'author_id', 'created_at'),  # ユーザーの最近のコメント用
+    )
@@ -1,9 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy import event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import asyncio
 import os
+import ssl
+import time
+from typing import AsyncIterator
 from dotenv import load_dotenv
-import pymysql
+
+from core.config import settings
+from utils.metrics import metrics
 
 load_dotenv()
 
@@ -16,27 +24,127 @@ DB_PORT = os.getenv("MYSQL_PORT", "3306")
 
 # SSL証明書のパス
 SSL_CA_PATH = "/home/site/wwwroot/DigiCertGlobalRootCA.crt.pem"
+if not os.path.exists(SSL_CA_PATH):
+    # ローカル実行時はリポジトリ直下の証明書を使う
+    SSL_CA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "DigiCertGlobalRootCA.crt.pem")
+
+# データベースURLを構築（非同期ドライバ aiomysql を使用）
+# ASYNC_DATABASE_URL が指定されていればそちらを優先する（テスト時の sqlite+aiosqlite など）
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+)
+
+
+def _build_connect_args(url: str) -> dict:
+    """ドライバごとの接続引数を返す（MySQLのみSSL検証を有効化）"""
+    if not url.startswith("mysql"):
+        return {}
+    ssl_context = ssl.create_default_context(cafile=SSL_CA_PATH)
+    ssl_context.check_hostname = True
+    ssl_context.verify_mode = ssl.CERT_REQUIRED
+    return {"ssl": ssl_context}
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """チェックアウト待ち時間とタイムアウトを計測するコネクションプール"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.incr("db_pool.checkout_timeouts")
+            raise
+        finally:
+            metrics.observe("db_pool.checkout_wait", time.perf_counter() - start)
+
+
+def _build_pool_args(url: str) -> dict:
+    """プール設定を返す（SQLiteなどMySQL以外はドライバ既定のプールを使う）"""
+    if not url.startswith("mysql"):
+        return {}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
 
-# データベースURLを構築
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 # エンジンの作成
-engine = create_engine(
+engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={
-        "ssl": {
-            "ca": SSL_CA_PATH,
-            "ssl_mode": "VERIFY_IDENTITY"
-        }
-    }
+    connect_args=_build_connect_args(SQLALCHEMY_DATABASE_URL),
+    **_build_pool_args(SQLALCHEMY_DATABASE_URL),
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_pool = engine.sync_engine.pool
+
+
+@event.listens_for(_pool, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    metrics.incr("db_pool.connections_created")
+    if isinstance(_pool, InstrumentedQueuePool) and _pool.overflow() > 0:
+        metrics.incr("db_pool.overflow_connections")
+
+
+@event.listens_for(_pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    metrics.incr("db_pool.checkouts")
+
+
+@event.listens_for(_pool, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    # pre-ping で切断が検出された接続など
+    metrics.incr("db_pool.invalidated")
+
+
+if isinstance(_pool, InstrumentedQueuePool):
+    metrics.register_gauge("db_pool.size", _pool.size)
+    metrics.register_gauge("db_pool.in_use", _pool.checkedout)
+    metrics.register_gauge("db_pool.idle", _pool.checkedin)
+    metrics.register_gauge("db_pool.overflow", lambda: max(_pool.overflow(), 0))
+
+# expire_on_commit=False: コミット後の属性アクセスで暗黙の遅延ロードが走らないようにする
+AsyncSessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def warm_pool(size: int = settings.DB_POOL_PREWARM) -> int:
+    """
+    起動時に接続を事前確立してプールに戻す
+    TLSハンドシェイクを最初のリクエストではなく起動時に済ませておくため
+
+    Returns:
+        int: 確立できた接続数
+    """
+    size = min(size, settings.DB_POOL_SIZE)
+    if size <= 0:
+        return 0
+
+    async def _open():
+        connection = await engine.connect()
+        await connection.execute(text("SELECT 1"))
+        return connection
+
+    results = await asyncio.gather(*(_open() for _ in range(size)), return_exceptions=True)
+    warmed = 0
+    for result in results:
+        if isinstance(result, BaseException):
+            print(f"❌ コネクションの事前確立に失敗しました: {str(result)}")
+            continue
+        await result.close()
+        warmed += 1
+    return warmed
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -9,7 +9,12 @@ class File(Base):
     id = Column(Integer, primary_key=True, index=True)
     knowledge_id = Column(Integer, ForeignKey("knowledges.id"))
     file_name = Column(String(255))
+    file_url = Column(String(1024))  # 保存先ストレージ上のURL
+    storage_key = Column(String(512), nullable=True)  # ストレージ内のキー（utils.storage）
+    content_type = Column(String(255), nullable=True)
+    size = Column(BigInteger, nullable=True)  # バイト数
+    sha256 = Column(String(64), nullable=True)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
     # リレーションシップ
-    knowledge = relationship("Knowledge", back_populates="files") 
\ No newline at end of file
+    knowledge = relationship("Knowledge", back_populates="files") 
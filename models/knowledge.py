@@ -13,6 +13,9 @@ class Knowledge(Base):
     description = Column(Text)
     category = Column(String(100), nullable=True)
     views = Column(Integer, default=0)
+    # 非正規化カウンタ（コメント作成・削除、ファイル登録時に同一トランザクションで更新）
+    comment_count = Column(Integer, default=0, server_default="0", nullable=False)
+    file_count = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     author_id = Column(Integer, ForeignKey("users.id"))
@@ -26,4 +29,6 @@ class Knowledge(Base):
     # インデックス
     __table_args__ = (
         Index('ix_knowledges_category', 'category'),
+        Index('ix_knowledges_created_at_id', 'created_at', 'id'),  # キーセットページネーション用
+        Index('ix_knowledges_author_id_created_at', 'author_id', 'created_at'),  # ユーザーの最近のナレッジ用
     ) 
\ No newline at end of file
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, LargeBinary
+from sqlalchemy import Column, Integer, String, Boolean, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
 from .knowledge_collaborator import KnowledgeCollaborator 
+from .user_avatar import UserAvatar
 
 
 class User(Base):
@@ -19,8 +20,7 @@ class User(Base):
     is_first_login = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    avatar_data = Column(LargeBinary, nullable=True)
-    avatar_content_type = Column(String(50), nullable=True)  # 画像のMIMEタイプを保存
+    avatar_etag = Column(String(64), nullable=True)  # アバター画像のハッシュ（画像本体は user_avatars に保存）
     department = Column(String(100), nullable=True)
 
     # リレーションシップ
@@ -29,15 +29,28 @@ class User(Base):
     activities = relationship("UserActivity", back_populates="user")
     collaborations = relationship("KnowledgeCollaborator", back_populates="user")
     profile = relationship("Profile", back_populates="user", uselist=False) 
+    avatar = relationship("UserAvatar", back_populates="user", uselist=False, cascade="all, delete-orphan")
 
     @property
     def avatar_url(self) -> str | None:
         """
         ユーザーのアバター画像のURLを返す
         画像が設定されていない場合はNoneを返す
+        URLには画像のハッシュを含め、画像が変わるとURLも変わるようにする
         """
-        if self.avatar_data is None:
-            return None
-        return f"/profile/{self.id}/avatar"
+        return build_avatar_url(self.id, self.avatar_etag)
+
+
+def build_avatar_url(user_id: int, avatar_etag: str | None, size: int | None = None) -> str | None:
+    """
+    アバター画像のバージョン付きURLを組み立てる
+    size を指定すると縮小版（32/64/256px）のURLになる
+    """
+    if avatar_etag is None:
+        return None
+    url = f"/profile/{user_id}/avatar?v={avatar_etag[:16]}"
+    if size is not None:
+        url += f"&size={size}"
+    return url
 
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -11,6 +11,13 @@ class UserActivity(Base):
     action = Column(String(50))  # 例: "create_knowledge", "comment", "view"
     xp_amount = Column(Integer)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # 経験値付与ジョブの一意なID（ジョブが再実行されても二重に付与しないため）
+    award_id = Column(String(36), nullable=True)
 
     # リレーションシップ
-    user = relationship("User", back_populates="activities") 
\ No newline at end of file
+    user = relationship("User", back_populates="activities")
+
+    # インデックス
+    __table_args__ = (
+        Index('ix_user_activities_award_id', 'award_id', unique=True),
+    ) 
\ No newline at end of file
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from .database import Base
+
+class UserAvatar(Base):
+    """
+    ユーザーのアバター画像
+    usersテーブルから分離し、ユーザー一覧の取得で画像データを読み込まないようにする
+    """
+    __tablename__ = "user_avatars"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    data = Column(LargeBinary(length=(2**32) - 1), nullable=False)  # MySQLではLONGBLOB
+    content_type = Column(String(50), nullable=False)
+    etag = Column(String(64), nullable=False)  # 画像データのSHA-256
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # リレーションシップ
+    user = relationship("User", back_populates="avatar")
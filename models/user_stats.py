@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey, event, insert
+from datetime import datetime
+from .database import Base
+from .user import User
+from .profile import Profile
+
+class UserStats(Base):
+    """
+    ユーザーごとの集計値（プロフィール・マイページ用）
+    ナレッジ・コメントの作成削除、閲覧数の反映時に同一トランザクションで加算する
+    ずれた場合は python -m utils.counters で再計算する
+    """
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    knowledge_count = Column(Integer, default=0, server_default="0", nullable=False)
+    comment_count = Column(Integer, default=0, server_default="0", nullable=False)
+    total_views = Column(BigInteger, default=0, server_default="0", nullable=False)  # 自分のナレッジの累積PV
+    last_activity_at = Column(DateTime, nullable=True)  # 最後にナレッジ・コメントを投稿・更新した日時
+
+
+@event.listens_for(User, "after_insert")
+def create_user_rows(mapper, connection, target):
+    """ユーザー登録と同じトランザクションでプロフィールと集計行を作る（GET時に作らないように）"""
+    connection.execute(insert(Profile.__table__).values(user_id=target.id, created_at=datetime.utcnow()))
+    connection.execute(insert(UserStats.__table__).values(user_id=target.id))
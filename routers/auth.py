@@ -1,16 +1,20 @@
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import EmailStr
 
 from models.database import get_db
 from models.user import User
 from models.knowledge import Knowledge
 from models.comment import Comment
+from schemas.auth import TokenResponse
+from schemas.profile import UserProfileResponse
 from core.security import (
-    verify_password,
+    password_hasher,
     create_access_token,
+    CurrentUser,
     get_current_user
 )
 
@@ -32,14 +36,15 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-@router.post("/login")
+@router.post("/login", response_model=TokenResponse)
 async def login(
     form_data: OAuth2EmailRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     print("ログイン試行:", form_data.username)  # emailが入る
 
-    user = db.query(User).filter(User.email == form_data.username).first()
+    result = await db.execute(select(User).where(User.email == form_data.username))
+    user = result.scalars().first()
 
     if not user:
         print("ユーザーが存在しません")
@@ -48,57 +53,36 @@ async def login(
             detail="メールアドレスまたはパスワードが正しくありません",
         )
 
-    if not verify_password(form_data.password, user.password_hash):
+    # bcrypt は専用スレッドで計算する（混雑時は503）
+    verified, new_hash = await password_hasher.verify_and_update(form_data.password, user.password_hash)
+    if not verified:
         print("パスワードが一致しません")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="メールアドレスまたはパスワードが正しくありません",
         )
 
+    if new_hash is not None:
+        # ハッシュのコスト設定が変わった場合は、ログイン成功時に新しい設定で保存し直す
+        user.password_hash = new_hash
+        await db.commit()
+
     access_token = create_access_token(data={"sub": user.email})
-    return {"jwt_token": access_token}
+    return TokenResponse(jwt_token=access_token)
 
 
-@router.get("/me")
+@router.get("/me", response_model=UserProfileResponse)
 async def get_profile(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     # ユーザーの最新のナレッジを取得
-    recent_knowledge = (
-        db.query(Knowledge)
-        .filter(Knowledge.author_id == current_user.id)
+    result = await db.execute(
+        select(Knowledge)
+        .where(Knowledge.author_id == current_user.id)
         .order_by(Knowledge.created_at.desc())
         .limit(5)
-        .all()
     )
+    recent_knowledge = result.scalars().all()
 
-    # アクティビティリストの作成
-    activities = []
-    for knowledge in recent_knowledge:
-        # ナレッジをアクティビティリストに追加
-        activities.append({
-            "id": knowledge.id,
-            "title": knowledge.title,
-            "category": knowledge.category,
-            "method": knowledge.method,
-            "target": knowledge.target,
-            "views": knowledge.views,
-            "createdAt": knowledge.created_at.strftime("%Y年%m月%d日"),
-            "author": {
-                "id": current_user.id,
-                "name": current_user.username,
-                "avatarUrl": current_user.avatar_url
-            }
-        })
-
-    return {
-        "id": current_user.id,
-        "email": current_user.email,
-        "name": current_user.username,
-        "department": current_user.department,
-        "level": current_user.level,
-        "currentXp": current_user.current_xp,
-        "avatar": current_user.avatar_data,
-        "activity": activities
-    }
\ No newline at end of file
+    return UserProfileResponse.from_user(current_user, recent_knowledge)
\ No newline at end of file
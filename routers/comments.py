@@ -1,13 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Body
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from typing import List
 from datetime import datetime
 
 from models.database import get_db
-from models.user import User
+from models.user import User, build_avatar_url
 from models.knowledge import Knowledge
 from models.comment import Comment
-from core.security import get_current_user
+from core.security import CurrentUser, get_current_user
+from utils.counters import adjust_knowledge_counters, adjust_user_stats
+from utils.experience import add_experience, COMMENT_XP
+from utils.response_cache import response_cache
+from schemas.common import AVATAR_SIZE_INLINE
 from pydantic import BaseModel
 from fastapi import Path
 from typing import Optional, List
@@ -32,10 +38,10 @@ class CommentResponse(BaseModel):
 async def create_comment(
     knowledge_id: int = Path(..., description="コメント対象のナレッジID"),
     comment: CommentCreate = Body(..., description="コメントの内容"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
+    knowledge = await db.get(Knowledge, knowledge_id)
     if not knowledge:
         raise HTTPException(status_code=404, detail="ナレッジが見つかりません")
 
@@ -46,15 +52,22 @@ async def create_comment(
     )
 
     db.add(new_comment)
-    db.commit()
-    db.refresh(new_comment)
+    await adjust_knowledge_counters(db, knowledge_id, comments=1)
+    await adjust_user_stats(db, current_user.id, comments=1, activity_at=datetime.utcnow())
+    await db.commit()
+    await db.refresh(new_comment)
+    # コメント数を含むキャッシュ（一覧・人気ナレッジ）を無効化する
+    await response_cache.invalidate(f"knowledge:{knowledge_id}")
+
+    # 経験値の付与はジョブとして登録する（付与履歴はアクティビティランキングに反映される）
+    await add_experience(current_user, COMMENT_XP, action="comment")
 
     return CommentResponse(
         id=new_comment.id,
         content=new_comment.content,
         author_id=current_user.id,
         author_name=current_user.username,
-        avatar_url=current_user.avatar_url,
+        avatar_url=build_avatar_url(current_user.id, current_user.avatar_etag, size=AVATAR_SIZE_INLINE),
         created_at=new_comment.created_at
     )
 
@@ -62,12 +75,15 @@ async def create_comment(
 @router.get("/", response_model=List[CommentResponse])
 async def get_comments(
     knowledge_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # authorをeager loadして取得
-    comments = db.query(Comment).options(
-        joinedload(Comment.author)
-    ).filter(Comment.knowledge_id == knowledge_id).order_by(Comment.created_at.asc()).all()
+    result = await db.execute(
+        select(Comment).options(
+            joinedload(Comment.author)
+        ).where(Comment.knowledge_id == knowledge_id).order_by(Comment.created_at.asc())
+    )
+    comments = result.scalars().all()
 
     return [
         CommentResponse(
@@ -76,7 +92,10 @@ async def get_comments(
             author_id=comment.author_id,
             # authorがNoneの場合のフォールバック
             author_name=comment.author.username if comment.author else "削除されたユーザー",
-            avatar_url=comment.author.avatar_url if comment.author else None,
+            avatar_url=(
+                build_avatar_url(comment.author.id, comment.author.avatar_etag, size=AVATAR_SIZE_INLINE)
+                if comment.author else None
+            ),
             created_at=comment.created_at
         )
         for comment in comments
@@ -87,10 +106,13 @@ async def get_comments(
 async def delete_comment(
     knowledge_id: int,
     comment_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    comment = db.query(Comment).filter(Comment.id == comment_id, Comment.knowledge_id == knowledge_id).first()
+    result = await db.execute(
+        select(Comment).where(Comment.id == comment_id, Comment.knowledge_id == knowledge_id)
+    )
+    comment = result.scalars().first()
 
     if not comment:
         raise HTTPException(status_code=404, detail="コメントが見つかりません")
@@ -98,7 +120,10 @@ async def delete_comment(
     if comment.author_id != current_user.id:
         raise HTTPException(status_code=403, detail="コメントを削除する権限がありません")
 
-    db.delete(comment)
-    db.commit()
+    await db.delete(comment)
+    await adjust_knowledge_counters(db, knowledge_id, comments=-1)
+    await adjust_user_stats(db, comment.author_id, comments=-1)
+    await db.commit()
+    await response_cache.invalidate(f"knowledge:{knowledge_id}")
 
     return {"detail": "コメントが削除されました"}
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Request, status
+from fastapi.responses import ORJSONResponse
+
+from utils.health import health_monitor
+
+router = APIRouter(tags=["health"])
+
+@router.get("/healthz")
+async def healthz():
+    # プロセスが応答できるかだけを返す（依存サービスには問い合わせない）
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz(request: Request):
+    """
+    トラフィックを受けられるかを返す
+    ワーカーの起動処理が終わり、必須の依存サービスが直近の確認で正常な場合に200
+    依存サービスの状態はバックグラウンドで確認済みの結果を返す
+    """
+    started = request.app.state.ready
+    ready = started and health_monitor.is_ready()
+    body = {
+        "status": "ready" if ready else ("unavailable" if started else "starting"),
+        "dependencies": health_monitor.report(),
+    }
+    if not ready:
+        return ORJSONResponse(body, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return body
@@ -1,19 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Response, Query
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from typing import List, Optional, Union
+import time
 from datetime import datetime
+from urllib.parse import quote
 
+from core.config import settings
 from models.database import get_db
 from models.user import User
 from models.knowledge import Knowledge
 from models.file import File as FileModel
 from models.comment import Comment
-from core.security import get_current_user
-from utils.experience import add_experience
+from core.security import CurrentUser, get_current_user, get_current_db_user
+from schemas.common import AuthorCard
+from schemas.knowledge import (
+    CommentItem,
+    ExperienceResult,
+    KnowledgeBatchResponse,
+    KnowledgeCreateResponse,
+    KnowledgeCursorPage,
+    KnowledgeDetail,
+    KnowledgeFileItem,
+    KnowledgeListItem,
+    KnowledgeSearchItem,
+    KnowledgeSearchResponse,
+    KnowledgeStats,
+    KnowledgeSummary,
+    PopularKnowledgeResponse,
+)
+from utils.experience import add_experience, KNOWLEDGE_XP
+from utils.batch import parse_ids
+from utils.counters import adjust_user_stats
+from utils.pagination import encode_cursor, decode_cursor
+from utils.response_cache import response_cache
+from utils.view_counter import view_counter
+from utils.search import knowledge_search, highlight, FIELD_WEIGHTS
+from utils.storage import get_storage, build_storage_key
+from utils.conditional import http_date, is_not_modified, validator_headers, weak_etag
+from utils.range_response import parse_range, ZeroCopyFileResponse, range_streaming_response
 
 router = APIRouter()
 
-@router.post("/")
+# 1ページの最大件数（キャッシュのキーがパラメータごとに増えすぎないようにする）
+MAX_PAGE_SIZE = 100
+# 検索結果をたどれる件数の上限
+MAX_SEARCH_OFFSET = 10000
+
+
+def knowledge_tags(knowledges) -> List[str]:
+    """一覧系レスポンスのキャッシュタグ（ナレッジ・著者ごと）"""
+    tags = ["knowledge:list"]
+    for k in knowledges:
+        tags.append(f"knowledge:{k.id}")
+        tags.append(f"user:{k.author_id}")
+    return tags
+
+
+def _fallback_knowledge(
+    title: str,
+    method: str,
+    target: str,
+    description: str,
+    category: Optional[str]
+) -> KnowledgeCreateResponse:
+    # 認証されていないとき・作成に失敗したときのテスト用デフォルトレスポンス
+    now = datetime.now()
+    return KnowledgeCreateResponse(
+        id=1,
+        title=title,
+        method=method,
+        target=target,
+        description=description,
+        category=category,
+        views=0,
+        createdAt=now,
+        updatedAt=now,
+        author=AuthorCard(id=1, name="テストユーザー", avatarUrl=None, department="開発部"),
+        stats=KnowledgeStats(commentCount=0, fileCount=0)
+    )
+
+# experience は通常の作成時だけ返す（テスト用レスポンスには含めない）
+@router.post("/", response_model=KnowledgeCreateResponse, response_model_exclude_unset=True)
 async def create_knowledge(
     title: str = Form(...),
     method: str = Form(...),
@@ -21,211 +90,428 @@ async def create_knowledge(
     description: str = Form(...),
     category: Optional[str] = Form(None),
     files: Optional[List[UploadFile]] = File(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_db_user)
 ):
+    storage_keys = []
+    committed = False
     try:
         if current_user is None:
             # 認証されていないときのテスト用デフォルトレスポンス
-            return {
-                "id": 1,
-                "title": title,
-                "method": method,
-                "target": target,
-                "description": description,
-                "category": category,
-                "views": 0,
-                "createdAt": datetime.now().strftime("%Y年%m月%d日"),
-                "updatedAt": datetime.now().strftime("%Y年%m月%d日"),
-                "author": {
-                    "id": 1,
-                    "name": "テストユーザー",
-                    "avatarUrl": None,
-                    "department": "開発部"
-                },
-                "stats": {
-                    "commentCount": 0,
-                    "fileCount": 0
-                }
-            }
+            return _fallback_knowledge(title, method, target, description, category)
 
-        # ナレッジの作成
+        # ナレッジの作成（IDを採番するためflushし、添付ファイルとまとめて1回でコミットする）
         knowledge = Knowledge(
             title=title,
             method=method,
             target=target,
             description=description,
             category=category,
-            author_id=current_user.id
+            author_id=current_user.id,
+            comment_count=0,
+            file_count=len(files) if files else 0
         )
         db.add(knowledge)
-        db.commit()
-        db.refresh(knowledge)
+        await db.flush()
         
         # ファイルのアップロード処理
         if files:
+            storage = get_storage()
             for file in files:
-                file_content = await file.read()
+                # チャンク単位でストレージへ転送する（ファイル全体をメモリに載せない）
+                stored = await storage.save(
+                    build_storage_key(knowledge.id, file.filename),
+                    file,
+                    file.content_type
+                )
+                storage_keys.append(stored.key)
                 db_file = FileModel(
                     knowledge_id=knowledge.id,
                     file_name=file.filename,
+                    file_url=stored.url,
+                    storage_key=stored.key,
                     content_type=file.content_type,
-                    file_data=file_content
+                    size=stored.size,
+                    sha256=stored.sha256
                 )
                 db.add(db_file)
-        
-        db.commit()
 
-        # 経験値を追加
-        experience_result = add_experience(current_user, 10, db)
+        await adjust_user_stats(db, current_user.id, knowledge=1, activity_at=datetime.utcnow())
+        await db.commit()
+        committed = True
+        knowledge_search.index_knowledge(knowledge)
+        await response_cache.invalidate("knowledge:list", f"user:{current_user.id}")
+
+        # 経験値の付与はジョブとして登録する（レスポンスには付与後の見込みを返す）
+        experience_result = await add_experience(current_user, KNOWLEDGE_XP, action="create_knowledge")
         
-        return {
-            "id": knowledge.id,
-            "title": knowledge.title,
-            "method": knowledge.method,
-            "target": knowledge.target,
-            "description": knowledge.description,
-            "category": knowledge.category,
-            "views": knowledge.views,
-            "createdAt": knowledge.created_at.strftime("%Y年%m月%d日"),
-            "updatedAt": knowledge.updated_at.strftime("%Y年%m月%d日"),
-            "author": {
-                "id": current_user.id,
-                "name": current_user.username,
-                "avatarUrl": current_user.avatar_url,
-                "department": current_user.department
-            },
-            "stats": {
-                "commentCount": 0,
-                "fileCount": len(files) if files else 0
-            },
-            "experience": {
-                "level_up": experience_result["level_up"],
-                "before_level": experience_result["before_level"],
-                "before_xp": experience_result["before_xp"],
-                "after_level": experience_result["after_level"],
-                "after_xp": experience_result["after_xp"],
-                "required_xp": experience_result["required_xp"]
-            }
-        }
+        return KnowledgeCreateResponse(
+            id=knowledge.id,
+            title=knowledge.title,
+            method=knowledge.method,
+            target=knowledge.target,
+            description=knowledge.description,
+            category=knowledge.category,
+            views=knowledge.views,
+            createdAt=knowledge.created_at,
+            updatedAt=knowledge.updated_at,
+            author=AuthorCard.from_user(current_user),
+            stats=KnowledgeStats(commentCount=0, fileCount=len(files) if files else 0),
+            experience=ExperienceResult(**experience_result)
+        )
 
     except Exception as e:
         print(f"ナレッジ作成エラー: {str(e)}")
-        return {
-            "id": 1,
-            "title": title,
-            "method": method,
-            "target": target,
-            "description": description,
-            "category": category,
-            "views": 0,
-            "createdAt": datetime.now().strftime("%Y年%m月%d日"),
-            "updatedAt": datetime.now().strftime("%Y年%m月%d日"),
-            "author": {
-                "id": 1,
-                "name": "テストユーザー",
-                "avatarUrl": None,
-                "department": "開発部"
-            },
-            "stats": {
-                "commentCount": 0,
-                "fileCount": 0
+        # コミットされなかった添付ファイルはストレージから消しておく
+        if not committed:
+            await db.rollback()
+            for key in storage_keys:
+                try:
+                    await get_storage().delete(key)
+                except Exception as delete_error:
+                    print(f"❌ 添付ファイルの削除に失敗しました ({key}): {str(delete_error)}")
+        return _fallback_knowledge(title, method, target, description, category)
+
+# 閲覧数順のナレッジ取得を追加　0408
+# /{knowledge_id} より先に定義しないと "popular" がIDとして解釈されてしまう
+@router.get("/popular", response_model=PopularKnowledgeResponse)
+async def get_popular_knowledge(
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    # ホーム画面のたびに呼ばれるため、短時間キャッシュする（閲覧数の変化はTTLの範囲で遅れる）
+    cache_key = response_cache.key("knowledge.popular", limit=limit)
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    started_at = time.time()
+
+    # 著者を結合し、件数は非正規化カウンタから読むことで1クエリで取得する
+    rows = await db.execute(
+        select(Knowledge, User)
+        .join(User, User.id == Knowledge.author_id)
+        .order_by(Knowledge.views.desc())
+        .limit(limit)
+    )
+
+    rows = rows.all()
+    items = [KnowledgeSummary.from_knowledge(k, author) for k, author in rows]
+    return await response_cache.store(
+        cache_key,
+        PopularKnowledgeResponse(total=len(items), items=items),
+        tags=knowledge_tags(k for k, _ in rows),
+        started_at=started_at,
+        ttl=settings.POPULAR_KNOWLEDGE_CACHE_TTL,
+    )
+
+# 全文検索（日本語対応のn-gramインデックス、BM25でスコア順）
+@router.get("/search", response_model=KnowledgeSearchResponse)
+async def search_knowledge(
+    q: str,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    ranked, query_tokens = knowledge_search.search(q)
+    page = ranked[offset:offset + limit]
+
+    # 該当ページの本文と著者だけをDBから取得する
+    knowledge_by_id = {}
+    if page:
+        result = await db.execute(
+            select(Knowledge)
+            .options(selectinload(Knowledge.author))
+            .where(Knowledge.id.in_([knowledge_id for knowledge_id, _ in page]))
+        )
+        knowledge_by_id = {k.id: k for k in result.scalars().all()}
+
+    items = []
+    for knowledge_id, score in page:
+        k = knowledge_by_id.get(knowledge_id)
+        if k is None:
+            # 他ワーカーで削除され、まだインデックスに残っている場合
+            continue
+        items.append(KnowledgeSearchItem.from_knowledge(
+            k,
+            score=round(score, 4),
+            highlights={
+                field: snippet
+                for field in FIELD_WEIGHTS
+                if (snippet := highlight(getattr(k, field), query_tokens)) is not None
             }
+        ))
+
+    return KnowledgeSearchResponse(total=len(ranked), items=items)
+
+# フィード表示用の一括取得（/{knowledge_id} より先に定義する）
+@router.get("/batch", response_model=KnowledgeBatchResponse)
+async def get_knowledge_batch(
+    ids: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    カンマ区切りで指定したナレッジをまとめて返す（閲覧数は記録しない）
+    著者は結合し、件数は非正規化カウンタから読むため、件数によらず1クエリで取得する
+    """
+    knowledge_ids = parse_ids(ids, settings.BATCH_MAX_IDS)
+    found = {}
+    if knowledge_ids:
+        rows = await db.execute(
+            select(Knowledge, User)
+            .join(User, User.id == Knowledge.author_id)
+            .where(Knowledge.id.in_(knowledge_ids))
+        )
+        found = {
+            k.id: KnowledgeSummary.from_knowledge(
+                k,
+                author,
+                views=(k.views or 0) + view_counter.pending(k.id)
+            )
+            for k, author in rows.all()
         }
 
-@router.get("/{knowledge_id}")
+    return KnowledgeBatchResponse(
+        items={knowledge_id: found[knowledge_id] for knowledge_id in knowledge_ids if knowledge_id in found},
+        missing=[knowledge_id for knowledge_id in knowledge_ids if knowledge_id not in found]
+    )
+
+@router.get("/{knowledge_id}", response_model=KnowledgeDetail)
 async def get_knowledge_detail(
     knowledge_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user) ,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user) ,
 ):
-    knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
-    if not knowledge:
+    """
+    ナレッジの詳細を返す
+
+    ETag は本文の更新日時・コメント数・添付ファイル数・著者の更新日時から作る。
+    カウンタの更新では updated_at は変わらないため、コメント・添付ファイルの増減は件数と
+    最新のコメントID（削除と追加で件数が変わらない場合のため）で検出する。
+    閲覧数は閲覧のたびに変わるため含めない。
+    一致する条件付きGETにはコメントを読み込まずに304を返す
+    """
+    latest_comment_id = (
+        select(func.max(Comment.id))
+        .where(Comment.knowledge_id == Knowledge.id)
+        .correlate(Knowledge)
+        .scalar_subquery()
+    )
+    # 非同期セッションでは遅延ロードできないため、著者は結合して読み込む
+    result = await db.execute(
+        select(Knowledge, latest_comment_id)
+        .options(joinedload(Knowledge.author))
+        .where(Knowledge.id == knowledge_id)
+    )
+    row = result.first()
+    if not row:
         raise HTTPException(status_code=404, detail="ナレッジが見つかりません")
+    knowledge, latest_comment_id = row
+
+    # 閲覧数はバッファに記録し、まとめてDBに反映する（行ロックを避けるため）
+    view_counter.record(knowledge.id, current_user.id)
+
+    author = knowledge.author
+    etag = weak_etag(
+        knowledge.id,
+        knowledge.updated_at,
+        knowledge.comment_count,
+        knowledge.file_count,
+        latest_comment_id,
+        author.id if author else None,
+        author.updated_at if author else None,
+    )
+    last_modified = max(
+        (value for value in (knowledge.updated_at, author.updated_at if author else None) if value is not None),
+        default=None,
+    )
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    views = (knowledge.views or 0) + view_counter.pending(knowledge.id)
 
-    # 閲覧数をインクリメント
-    knowledge.views += 1
-    db.commit()
-    
     # コメント一覧を取得
+    comment_rows = await db.execute(
+        select(Comment)
+        .options(joinedload(Comment.author))
+        .where(Comment.knowledge_id == knowledge.id)
+        .order_by(Comment.id.asc())
+    )
     comments = [
-        {
-            "id": c.id,
-            "content": c.content,
-            "author": {
-                "id": c.author.id,
-                "name": c.author.username,
-                "avatarUrl": c.author.avatar_url,
-                "department": c.author.department
-            },
-            "createdAt": c.created_at.strftime("%Y年%m月%d日")
-        }
-        for c in knowledge.comments
+        CommentItem(
+            id=c.id,
+            content=c.content,
+            author=AuthorCard.from_user(c.author),
+            createdAt=c.created_at
+        )
+        for c in comment_rows.scalars().all()
     ]
 
-    return {
-        "id": knowledge.id,
-        "title": knowledge.title,
-        "method": knowledge.method,
-        "target": knowledge.target,
-        "description": knowledge.description,
-        "category": knowledge.category,
-        "views": knowledge.views,
-        "createdAt": knowledge.created_at.strftime("%Y年%m月%d日"),
-        "updatedAt": knowledge.updated_at.strftime("%Y年%m月%d日"),
-        "author": {
-            "id": knowledge.author.id,
-            "name": knowledge.author.username,
-            "avatarUrl": knowledge.author.avatar_url,
-            "department": knowledge.author.department
-        },
-        "stats": {
-            "commentCount": len(comments),
-            "fileCount": len(knowledge.files)
-        },
-        "comments": comments
+    response.headers.update(headers)
+    return KnowledgeDetail.from_knowledge(
+        knowledge,
+        author,
+        views=views,
+        comments=comments
+    )
+
+
+@router.get("/{knowledge_id}/files", response_model=List[KnowledgeFileItem])
+async def get_knowledge_files(
+    knowledge_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    # 添付ファイルの一覧（本文は含まない）
+    result = await db.execute(
+        select(FileModel)
+        .where(FileModel.knowledge_id == knowledge_id)
+        .order_by(FileModel.id.asc())
+    )
+    return [
+        KnowledgeFileItem(
+            id=f.id,
+            fileName=f.file_name,
+            contentType=f.content_type,
+            size=f.size,
+            uploadedAt=f.uploaded_at,
+            url=f"/knowledge/{knowledge_id}/files/{f.id}"
+        )
+        for f in result.scalars().all()
+    ]
+
+@router.get("/{knowledge_id}/files/{file_id}")
+async def download_knowledge_file(
+    knowledge_id: int,
+    file_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    添付ファイルをダウンロードする
+    Range（部分取得）と ETag / Last-Modified による条件付きGETに対応し、
+    ファイル本体はメモリに載せずにストリーミングする
+    """
+    result = await db.execute(
+        select(FileModel).where(FileModel.id == file_id, FileModel.knowledge_id == knowledge_id)
+    )
+    db_file = result.scalars().first()
+    if not db_file or not db_file.storage_key or db_file.size is None:
+        raise HTTPException(status_code=404, detail="ファイルが見つかりません")
+
+    etag = f'"{db_file.sha256}"' if db_file.sha256 else f'W/"{db_file.id}-{db_file.size}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # 同じファイルIDの内容は変わらないが、認証が必要なため共有キャッシュには載せない
+        "Cache-Control": "private, max-age=86400",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(db_file.file_name or 'file')}",
     }
+    if db_file.uploaded_at is not None:
+        headers["Last-Modified"] = http_date(db_file.uploaded_at)
+
+    if is_not_modified(request, etag, db_file.uploaded_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
+    byte_range = parse_range(request, db_file.size, etag)
+    if byte_range is None:
+        start, length, status_code = 0, db_file.size, status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{db_file.size}"
 
-@router.get("/")
+    media_type = db_file.content_type or "application/octet-stream"
+    storage = get_storage()
+    local_path = storage.local_path(db_file.storage_key)
+    if local_path is not None:
+        return ZeroCopyFileResponse(local_path, start, length, status_code, headers, media_type)
+    return range_streaming_response(
+        storage.iter_range(db_file.storage_key, start, length),
+        length,
+        status_code,
+        headers,
+        media_type
+    )
+
+@router.get("/", response_model=Union[KnowledgeCursorPage, List[KnowledgeListItem]])
 async def get_knowledge_list(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
     keyword: Optional[str] = None,
-    limit: int = 20,
-    offset: int = 0
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
 ):
-    query = db.query(Knowledge)
+    """
+    ナレッジ一覧を新しい順に返す
+
+    - cursor 未指定: 従来どおり offset/limit で取得し、配列を返す
+    - cursor 指定（1ページ目は空文字）: (created_at, id) のキーセットで取得し、
+      {"items": [...], "next_cursor": ...} を返す。ページが深くても速度が落ちない
+    """
+    # キーワードなしの1ページ目はアクセスが集中するためキャッシュする
+    cache_key = None
+    if not keyword and not offset and not cursor:
+        cache_key = response_cache.key(
+            "knowledge.list",
+            limit=limit,
+            paging="cursor" if cursor is not None else "offset",
+        )
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    started_at = time.time()
+
+    # 著者は selectinload で1クエリにまとめて取得する
+    query = select(Knowledge).options(selectinload(Knowledge.author))
 
     # タイトルでの部分一致検索
     if keyword:
-        query = query.filter(Knowledge.title.like(f"%{keyword}%"))
+        query = query.where(Knowledge.title.like(f"%{keyword}%"))
 
-    knowledges = (
-        query.order_by(Knowledge.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
+    query = query.order_by(Knowledge.created_at.desc(), Knowledge.id.desc())
 
-    result = []
-    for k in knowledges:
-        result.append({
-            "id": k.id,
-            "title": k.title,
-            "category": k.category,
-            "method": k.method,
-            "target": k.target,
-            "views": k.views,
-            "createdAt": k.created_at.strftime("%Y年%m月%d日"),
-            "author": {
-                "id": k.author.id,
-                "name": k.author.username,
-                "avatarUrl": k.author.avatar_url
-            }
-        })
+    if cursor is not None:
+        if cursor:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+            query = query.where(
+                or_(
+                    Knowledge.created_at < cursor_created_at,
+                    and_(Knowledge.created_at == cursor_created_at, Knowledge.id < cursor_id),
+                )
+            )
+        # 次ページの有無を判定するため1件多く取得する
+        result = await db.execute(query.limit(limit + 1))
+    else:
+        result = await db.execute(query.offset(offset).limit(limit))
+    knowledges = result.scalars().all()
+
+    next_cursor = None
+    if cursor is not None and len(knowledges) > limit:
+        knowledges = knowledges[:limit]
+        last = knowledges[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
 
-    return result
+    items = [KnowledgeListItem.from_knowledge(k) for k in knowledges]
+
+    response = items
+    if cursor is not None:
+        response = KnowledgeCursorPage(items=items, next_cursor=next_cursor)
+    if cache_key is not None:
+        return await response_cache.store(
+            cache_key,
+            response,
+            tags=knowledge_tags(knowledges),
+            started_at=started_at,
+        )
+    return response
 
 @router.put("/{knowledge_id}")
 async def update_knowledge(
@@ -235,10 +521,10 @@ async def update_knowledge(
     target: str = Form(...),
     description: str = Form(...),
     category: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
+    knowledge = await db.get(Knowledge, knowledge_id)
 
     if not knowledge:
         raise HTTPException(status_code=404, detail="ナレッジが見つかりません")
@@ -251,73 +537,59 @@ async def update_knowledge(
     knowledge.description = description
     knowledge.category = category
     knowledge.updated_at = datetime.utcnow()
+    await adjust_user_stats(db, current_user.id, activity_at=knowledge.updated_at)
 
-    db.commit()
-    db.refresh(knowledge)
+    await db.commit()
+    await db.refresh(knowledge)
+    await response_cache.invalidate(f"knowledge:{knowledge.id}")
+    knowledge_search.index_knowledge(knowledge)
 
     return {"message": "ナレッジを更新しました", "id": knowledge.id}
 
 @router.delete("/{knowledge_id}")
 async def delete_knowledge(
     knowledge_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
+    # カスケード削除対象の子レコードも事前に読み込んでおく
+    result = await db.execute(
+        select(Knowledge)
+        .options(
+            selectinload(Knowledge.files),
+            selectinload(Knowledge.comments),
+            selectinload(Knowledge.collaborators),
+        )
+        .where(Knowledge.id == knowledge_id)
+    )
+    knowledge = result.scalars().first()
 
     if not knowledge:
         raise HTTPException(status_code=404, detail="ナレッジが見つかりません")
     if knowledge.author_id != current_user.id:
         raise HTTPException(status_code=403, detail="削除権限がありません")
 
-    db.delete(knowledge)
-    db.commit()
+    storage_keys = [f.storage_key for f in knowledge.files if f.storage_key]
 
-    return {"message": "ナレッジを削除しました", "id": knowledge_id}
+    # 集計値から削除分を引く（カスケード削除されるコメントはそれぞれの投稿者から引く）
+    await adjust_user_stats(db, knowledge.author_id, knowledge=-1, views=-(knowledge.views or 0))
+    comment_counts = {}
+    for comment in knowledge.comments:
+        comment_counts[comment.author_id] = comment_counts.get(comment.author_id, 0) + 1
+    for author_id, count in comment_counts.items():
+        await adjust_user_stats(db, author_id, comments=-count)
 
-# 閲覧数順のナレッジ取得を追加　0408
-@router.get("/popular")
-async def get_popular_knowledge(
-    limit: int = 10,
-    db: Session = Depends(get_db)
-):
-    
-    knowledge_list = (
-        db.query(Knowledge)
-        .order_by(Knowledge.views.desc())
-        .limit(limit)
-        .all()
-    )
+    await db.delete(knowledge)
+    await db.commit()
+    await response_cache.invalidate(f"knowledge:{knowledge_id}", f"user:{current_user.id}")
+    knowledge_search.remove_knowledge(knowledge_id)
 
-    result = []
-    for k in knowledge_list:
-        author = db.query(User).filter(User.id == k.author_id).first()
-        file_count = db.query(FileModel).filter(FileModel.knowledge_id == k.id).count()
-        comment_count = db.query(Comment).filter(Comment.knowledge_id == k.id).count()
-
-        result.append({
-            "id": k.id,
-            "title": k.title,
-            "description": k.description,
-            "method": k.method,
-            "target": k.target,
-            "category": k.category,
-            "views": k.views,
-            "createdAt": k.created_at.strftime("%Y年%m月%d日"),
-            "updatedAt": k.updated_at.strftime("%Y年%m月%d日"),
-            "author": {
-                "id": author.id,
-                "name": author.username,
-                "avatarUrl": author.avatar_url,
-                "department": author.department
-            },
-            "stats": {
-                "commentCount": comment_count,
-                "fileCount": file_count
-            }
-        })
+    # ストレージ上の添付ファイルも削除する（失敗してもナレッジの削除は完了させる）
+    storage = get_storage()
+    for key in storage_keys:
+        try:
+            await storage.delete(key)
+        except Exception as e:
+            print(f"❌ 添付ファイルの削除に失敗しました ({key}): {str(e)}")
 
-    return {
-        "total": len(result),
-        "items": result
-    }
\ No newline at end of file
+    return {"message": "ナレッジを削除しました", "id": knowledge_id}
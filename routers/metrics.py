@@ -0,0 +1,33 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from core.config import settings
+from utils.metrics import metrics
+
+router = APIRouter()
+
+def verify_metrics_token(request: Request, token: Optional[str] = None) -> None:
+    """
+    METRICS_TOKEN と一致するトークンが指定されているか確認する
+    （Authorization: Bearer <トークン> または ?token=<トークン>）
+    METRICS_TOKEN が未設定の場合はエンドポイントごと無効にする
+    """
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        token = credentials
+    if token is None or not secrets.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="認証に失敗しました",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+@router.get("/", dependencies=[Depends(verify_metrics_token)])
+async def get_metrics():
+    # プロセス内で集計したメトリクスを返す（ワーカー単位の値）
+    return metrics.snapshot()
@@ -1,20 +1,60 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from pydantic import BaseModel
+import asyncio
+import hashlib
 import os
+import time
 from sqlalchemy.sql import func
 
 from models.database import get_db
 from models.user import User
+from models.user_avatar import UserAvatar
+from models.avatar_rendition import AvatarRendition
 from models.profile import Profile
+from models.user_stats import UserStats
 from models.knowledge import Knowledge
 from models.comment import Comment
-from core.security import get_current_user, get_password_hash
+from utils.conditional import http_date, is_not_modified, validator_headers, weak_etag
+from utils.avatar import validate_image, store_renditions, pick_rendition_size
+from utils.jobs import job_queue
+from utils.cache import TTLCache
+from utils.response_cache import response_cache
+from utils.batch import parse_ids
+from core.config import settings
+from schemas.profile import (
+    AvatarUploadResponse,
+    MyPageKnowledge,
+    MyPageResponse,
+    MyPageStats,
+    MyPageUser,
+    ProfileBase,
+    ProfileResponse,
+    ProfileStats,
+    RecentActivity,
+    RecentComment,
+    RecentKnowledge,
+    UserCard,
+    UserCardBatchResponse,
+    UserProfileResponse,
+)
+from core.security import (
+    CurrentUser,
+    get_current_user,
+    get_current_db_user,
+    get_password_hash,
+    invalidate_principal
+)
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
+# (ユーザーID, サイズ, バージョン) → (画像データ, MIMEタイプ, ETag, 更新日時)
+avatar_rendition_cache = TTLCache("avatar_renditions", maxsize=2048, ttl=3600)
+
 class UserProfileUpdate(BaseModel):
     username: Optional[str] = None
     department: Optional[str] = None
@@ -22,134 +62,90 @@ class UserProfileUpdate(BaseModel):
     bio: Optional[str] = None
     phoneNumber: Optional[str] = None
 
-@router.get("/{user_id}")
-async def get_user_profile(
-    user_id: int,
-    db: Session = Depends(get_db)
-):
-    # ユーザー情報を取得
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="ユーザーが見つかりません"
-        )
-    
-    # ユーザーの最新のナレッジを取得
-    recent_knowledge = (
-        db.query(Knowledge)
-        .filter(Knowledge.author_id == user.id)
-        .order_by(Knowledge.created_at.desc())
-        .limit(5)
-        .all()
-    )
-
-    # アクティビティリストの作成
-    activities = []
-    for knowledge in recent_knowledge:
-        activities.append({
-            "id": knowledge.id,
-            "title": knowledge.title,
-            "category": knowledge.category,
-            "method": knowledge.method,
-            "target": knowledge.target,
-            "views": knowledge.views,
-            "createdAt": knowledge.created_at.strftime("%Y年%m月%d日"),
-            "author": {
-                "id": user.id,
-                "name": user.username,
-                "avatarUrl": user.avatar_url
-            }
-        })
-
-    return {
-        "id": user.id,
-        "email": user.email,
-        "name": user.username,
-        "department": user.department,
-        "level": user.level,
-        "currentXp": user.current_xp,
-        "avatar": user.avatar_data,
-        "activity": activities
-    }
+async def _profile_and_stats(db: AsyncSession, user_id: int) -> tuple[Optional[Profile], Optional[UserStats]]:
+    """
+    プロフィールと集計値を1クエリで取得する
+    どちらもユーザー登録時に作られるが、ない場合もGETでは作らずにNoneを返す
+    """
+    row = (await db.execute(
+        select(Profile, UserStats)
+        .select_from(User)
+        .outerjoin(Profile, Profile.user_id == User.id)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(User.id == user_id)
+    )).first()
+    return (row[0], row[1]) if row else (None, None)
 
-@router.get("/me")
+@router.get("/me", response_model=ProfileResponse)
 async def read_profile(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    # プロフィール情報を取得
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-    if not profile:
-        profile = Profile(user_id=current_user.id)
-        db.add(profile)
-        db.commit()
-        db.refresh(profile)
-    
-    # ナレッジ数を取得
-    knowledge_count = db.query(Knowledge).filter(
-        Knowledge.author_id == current_user.id
-    ).count()
-    
-    # コメント数を取得
-    comment_count = db.query(Comment).filter(
-        Comment.author_id == current_user.id
-    ).count()
+    # プロフィール情報と集計値（ナレッジ数・コメント数）を取得
+    profile, stats = await _profile_and_stats(db, current_user.id)
     
     # 最近の活動を取得（最新5件のナレッジとコメント）
-    recent_knowledge = db.query(Knowledge).filter(
-        Knowledge.author_id == current_user.id
-    ).order_by(Knowledge.created_at.desc()).limit(5).all()
+    result = await db.execute(
+        select(Knowledge).where(
+            Knowledge.author_id == current_user.id
+        ).order_by(Knowledge.created_at.desc()).limit(5)
+    )
+    recent_knowledge = result.scalars().all()
     
-    recent_comments = db.query(Comment).filter(
-        Comment.author_id == current_user.id
-    ).order_by(Comment.created_at.desc()).limit(5).all()
+    result = await db.execute(
+        select(Comment).where(
+            Comment.author_id == current_user.id
+        ).order_by(Comment.created_at.desc()).limit(5)
+    )
+    recent_comments = result.scalars().all()
     
-    return {
-        "id": current_user.id,
-        "name": current_user.username,
-        "email": current_user.email,
-        "department": current_user.department,
-        "hasAvatar": current_user.avatar_data is not None,
-        "experiencePoints": current_user.experience_points,
-        "level": current_user.level,
-        "bio": profile.bio,
-        "phoneNumber": profile.phone_number,
-        "stats": {
-            "knowledgeCount": knowledge_count,
-            "commentCount": comment_count
-        },
-        "recentActivity": {
-            "knowledge": [
-                {
-                    "id": k.id,
-                    "title": k.title,
-                    "createdAt": k.created_at.strftime("%Y年%m月%d日")
-                } for k in recent_knowledge
+    return ProfileResponse(
+        id=current_user.id,
+        name=current_user.username,
+        email=current_user.email,
+        department=current_user.department,
+        hasAvatar=current_user.has_avatar,
+        experiencePoints=current_user.experience_points,
+        level=current_user.level,
+        bio=profile.bio if profile else None,
+        phoneNumber=profile.phone_number if profile else None,
+        stats=ProfileStats(
+            knowledgeCount=stats.knowledge_count if stats else 0,
+            commentCount=stats.comment_count if stats else 0,
+            lastActivityAt=stats.last_activity_at if stats else None
+        ),
+        recentActivity=RecentActivity(
+            knowledge=[
+                RecentKnowledge(id=k.id, title=k.title, createdAt=k.created_at)
+                for k in recent_knowledge
             ],
-            "comments": [
-                {
-                    "id": c.id,
-                    "content": c.content,
-                    "knowledgeId": c.knowledge_id,
-                    "createdAt": c.created_at.strftime("%Y年%m月%d日")
-                } for c in recent_comments
+            comments=[
+                RecentComment(
+                    id=c.id,
+                    content=c.content,
+                    knowledgeId=c.knowledge_id,
+                    createdAt=c.created_at
+                )
+                for c in recent_comments
             ]
-        }
-    }
+        )
+    )
 
-@router.put("/me")
+@router.put("/me", response_model=ProfileBase)
 async def update_profile(
     profile_data: UserProfileUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_db_user)
 ):
     if profile_data.username is not None:
         # ユーザー名の重複チェック
-        existing_user = db.query(User).filter(
-            User.username == profile_data.username,
-            User.id != current_user.id
-        ).first()
+        result = await db.execute(
+            select(User).where(
+                User.username == profile_data.username,
+                User.id != current_user.id
+            )
+        )
+        existing_user = result.scalars().first()
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -161,10 +157,11 @@ async def update_profile(
         current_user.department = profile_data.department
     
     if profile_data.password is not None:
-        current_user.password_hash = get_password_hash(profile_data.password)
+        current_user.password_hash = await get_password_hash(profile_data.password)
     
     # プロフィール情報の更新
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    result = await db.execute(select(Profile).where(Profile.user_id == current_user.id))
+    profile = result.scalars().first()
     if not profile:
         profile = Profile(user_id=current_user.id)
         db.add(profile)
@@ -176,27 +173,29 @@ async def update_profile(
         profile.phone_number = profile_data.phoneNumber
     
     current_user.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(current_user)
-    db.refresh(profile)
+    await db.commit()
+    await invalidate_principal(current_user.email)
+    await response_cache.invalidate(f"user:{current_user.id}")
+    await db.refresh(current_user)
+    await db.refresh(profile)
     
-    return {
-        "id": current_user.id,
-        "name": current_user.username,
-        "email": current_user.email,
-        "department": current_user.department,
-        "hasAvatar": current_user.avatar_data is not None,
-        "experiencePoints": current_user.experience_points,
-        "level": current_user.level,
-        "bio": profile.bio,
-        "phoneNumber": profile.phone_number
-    }
+    return ProfileBase(
+        id=current_user.id,
+        name=current_user.username,
+        email=current_user.email,
+        department=current_user.department,
+        hasAvatar=current_user.avatar_etag is not None,
+        experiencePoints=current_user.experience_points,
+        level=current_user.level,
+        bio=profile.bio,
+        phoneNumber=profile.phone_number
+    )
 
-@router.post("/me/avatar")
+@router.post("/me/avatar", response_model=AvatarUploadResponse)
 async def update_avatar(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_db_user)
 ):
     # ファイルタイプの検証
     if not file.content_type.startswith('image/'):
@@ -205,21 +204,50 @@ async def update_avatar(
             detail="File must be an image"
         )
     
+    # ファイルの内容を読み込む
+    file_content = await file.read()
+
+    # 画像として読み込めるかだけを確認する（縮小版の生成はジョブで行う）
+    try:
+        await asyncio.to_thread(validate_image, file_content)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
     try:
-        # ファイルの内容を読み込む
-        file_content = await file.read()
+        etag = hashlib.sha256(file_content).hexdigest()
+        
+        # アバター画像は user_avatars テーブルに保存する
+        avatar = await db.get(UserAvatar, current_user.id)
+        if avatar is None:
+            avatar = UserAvatar(user_id=current_user.id)
+            db.add(avatar)
+        avatar.data = file_content
+        avatar.content_type = file.content_type
+        avatar.etag = etag
+        avatar.updated_at = datetime.utcnow()
+        await db.flush()
+
+        # 古い画像の縮小版を削除する
+        await db.execute(delete(AvatarRendition).where(AvatarRendition.user_id == current_user.id))
         
         # ユーザーのアバター情報を更新
-        current_user.avatar_data = file_content
-        current_user.avatar_content_type = file.content_type
+        current_user.avatar_etag = etag
         current_user.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await invalidate_principal(current_user.email)
+        await response_cache.invalidate(f"user:{current_user.id}")
+
+        # 縮小版はバックグラウンドで生成する（生成前に参照された場合はその場で生成する）
+        await job_queue.enqueue("avatar_renditions", {"user_id": current_user.id, "etag": etag})
         
-        return {
-            "message": "Avatar updated successfully",
-            "contentType": current_user.avatar_content_type
-        }
+        return AvatarUploadResponse(
+            message="Avatar updated successfully",
+            contentType=avatar.content_type,
+            avatarUrl=current_user.avatar_url
+        )
         
     except Exception as e:
         raise HTTPException(
@@ -229,54 +257,32 @@ async def update_avatar(
 
 @router.get("/me/avatar")
 async def get_avatar(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    size: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    if not current_user.avatar_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Avatar not found"
-        )
-    
-    return Response(
-        content=current_user.avatar_data,
-        media_type=current_user.avatar_content_type
-    )
+    return await _avatar_response(request, db, current_user.id, version=None, size=size)
 
-@router.get("/mypage")
+@router.get("/mypage", response_model=MyPageResponse)
 async def get_mypage(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    # プロフィール情報を取得
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-    if not profile:
-        profile = Profile(user_id=current_user.id)
-        db.add(profile)
-        db.commit()
-        db.refresh(profile)
-
-    # 登録ナレッジ数を取得
-    knowledge_count = db.query(Knowledge).filter(
-        Knowledge.author_id == current_user.id
-    ).count()
-
-    # 累積PV数を取得
-    total_views = db.query(func.sum(Knowledge.views)).filter(
-        Knowledge.author_id == current_user.id
-    ).scalar() or 0
+    # プロフィール情報と集計値（登録ナレッジ数・累積PV数）を取得
+    profile, stats = await _profile_and_stats(db, current_user.id)
 
     # 次のレベルまでに必要な経験値を計算
     next_level_exp = (current_user.level + 1) * 100 - current_user.experience_points
 
     # 最近のナレッジを取得（最新5件）
-    recent_knowledge = (
-        db.query(Knowledge)
-        .filter(Knowledge.author_id == current_user.id)
+    result = await db.execute(
+        select(Knowledge)
+        .where(Knowledge.author_id == current_user.id)
         .order_by(Knowledge.created_at.desc())
         .limit(5)
-        .all()
     )
+    recent_knowledge = result.scalars().all()
 
     # ナレッジリストの作成
     knowledge_list = []
@@ -284,34 +290,34 @@ async def get_mypage(
         # カテゴリーに基づくアイコンとカラーの設定
         icon, bg_color = get_category_icon_and_color(k.category)
         
-        knowledge_list.append({
-            "id": k.id,
-            "title": k.title,
-            "category": k.category,
-            "icon": icon,
-            "iconBgColor": bg_color,
-            "author": current_user.username,
-            "views": k.views,
-            "createdAt": k.created_at.strftime("%Y年%m月%d日"),
-            "content": k.description  # または整形されたコンテンツ
-        })
-
-    return {
-        "user": {
-            "id": current_user.id,
-            "name": current_user.username,
-            "department": current_user.department or "所属なし",
-            "level": current_user.level,
-            "nextLevelExp": next_level_exp,
-            "avatar_url": current_user.avatar_url,
-            "bio": profile.bio,
-            "stats": {
-                "knowledgeCount": knowledge_count,
-                "totalPageViews": total_views
-            }
-        },
-        "knowledgeList": knowledge_list
-    }
+        knowledge_list.append(MyPageKnowledge(
+            id=k.id,
+            title=k.title,
+            category=k.category,
+            icon=icon,
+            iconBgColor=bg_color,
+            author=current_user.username,
+            views=k.views,
+            createdAt=k.created_at,
+            content=k.description  # または整形されたコンテンツ
+        ))
+
+    return MyPageResponse(
+        user=MyPageUser(
+            id=current_user.id,
+            name=current_user.username,
+            department=current_user.department or "所属なし",
+            level=current_user.level,
+            nextLevelExp=next_level_exp,
+            avatar_url=current_user.avatar_url,
+            bio=profile.bio if profile else None,
+            stats=MyPageStats(
+                knowledgeCount=stats.knowledge_count if stats else 0,
+                totalPageViews=stats.total_views if stats else 0
+            )
+        ),
+        knowledgeList=knowledge_list
+    )
 
 def get_category_icon_and_color(category: str) -> tuple[str, str]:
     """カテゴリーに基づいてアイコンと背景色を返す"""
@@ -323,4 +329,224 @@ def get_category_icon_and_color(category: str) -> tuple[str, str]:
         # 他のカテゴリーも必要に応じて追加
     }
     
-    return category_mapping.get(category, ("📝", "#FFE0D6"))  # デフォルト値
\ No newline at end of file
+    return category_mapping.get(category, ("📝", "#FFE0D6"))  # デフォルト値
+
+# フィード表示用のユーザーカードの一括取得（/{user_id} より先に定義する）
+@router.get("/batch", response_model=UserCardBatchResponse)
+async def get_user_cards(
+    ids: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    カンマ区切りで指定したユーザーのカードをまとめて返す
+    ユーザーとナレッジ件数（user_stats）を1クエリで取得する
+    """
+    user_ids = parse_ids(ids, settings.BATCH_MAX_IDS)
+    users = {}
+    knowledge_counts = {}
+    if user_ids:
+        result = await db.execute(
+            select(User, UserStats.knowledge_count)
+            .outerjoin(UserStats, UserStats.user_id == User.id)
+            .where(User.id.in_(user_ids))
+        )
+        for user, knowledge_count in result.all():
+            users[user.id] = user
+            knowledge_counts[user.id] = knowledge_count or 0
+
+    return UserCardBatchResponse(
+        items={
+            user_id: UserCard.from_user(users[user_id], knowledge_counts.get(user_id, 0))
+            for user_id in user_ids
+            if user_id in users
+        },
+        missing=[user_id for user_id in user_ids if user_id not in users]
+    )
+
+@router.get("/{user_id}", response_model=UserProfileResponse)
+async def get_user_profile(
+    user_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    ユーザーのプロフィールと最近のナレッジを返す
+
+    ETag はユーザーの更新日時と、集計値（ナレッジ数・最終活動日時）から作る。
+    一致する条件付きGETにはナレッジを読み込まずに304を返す
+    """
+    cache_key = response_cache.key("profile.user", user_id=user_id)
+    cached = await response_cache.get(cache_key, request)
+    if cached is not None:
+        return cached
+    started_at = time.time()
+
+    # ユーザー情報と集計値を取得
+    row = (await db.execute(
+        select(User, UserStats)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(User.id == user_id)
+    )).first()
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="ユーザーが見つかりません"
+        )
+    user, stats = row
+
+    last_activity_at = stats.last_activity_at if stats else None
+    etag = weak_etag(user.id, user.updated_at, stats.knowledge_count if stats else None, last_activity_at)
+    last_modified = max(
+        (value for value in (user.updated_at, last_activity_at) if value is not None),
+        default=None,
+    )
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    # ユーザーの最新のナレッジを取得
+    result = await db.execute(
+        select(Knowledge)
+        .where(Knowledge.author_id == user.id)
+        .order_by(Knowledge.created_at.desc())
+        .limit(5)
+    )
+    recent_knowledge = result.scalars().all()
+
+    return await response_cache.store(
+        cache_key,
+        UserProfileResponse.from_user(user, recent_knowledge),
+        tags=[f"user:{user.id}"] + [f"knowledge:{k.id}" for k in recent_knowledge],
+        started_at=started_at,
+        headers=headers,
+    )
+
+@router.get("/{user_id}/avatar")
+async def get_user_avatar(
+    user_id: int,
+    request: Request,
+    v: Optional[str] = None,
+    size: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    # imgタグから直接参照されるため認証は不要
+    # size を指定すると、それ以上で最小の縮小版（32/64/256px）を返す
+    return await _avatar_response(request, db, user_id, version=v, size=size)
+
+def _avatar_headers(etag: str, updated_at: Optional[datetime], versioned: bool) -> dict:
+    headers = {
+        "ETag": etag,
+        # バージョン付きURL（?v=）は内容が変わらないため長期キャッシュできる
+        "Cache-Control": "public, max-age=31536000, immutable" if versioned else "no-cache",
+    }
+    if updated_at is not None:
+        headers["Last-Modified"] = http_date(updated_at)
+    return headers
+
+def _cached_avatar_response(request: Request, entry: tuple, versioned: bool) -> Response:
+    data, content_type, etag, updated_at = entry
+    headers = _avatar_headers(etag, updated_at, versioned)
+    if is_not_modified(request, etag, updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=data, media_type=content_type, headers=headers)
+
+async def _original_avatar_response(
+    request: Request,
+    db: AsyncSession,
+    user_id: int,
+    meta,
+    versioned: bool
+) -> Response:
+    etag = f'"{meta.etag}"'
+    headers = _avatar_headers(etag, meta.updated_at, versioned)
+    if is_not_modified(request, etag, meta.updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    data = await db.scalar(select(UserAvatar.data).where(UserAvatar.user_id == user_id))
+    if data is None:
+        # メタデータの取得後にアバターが削除された
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Avatar not found"
+        )
+    return Response(content=data, media_type=meta.content_type, headers=headers)
+
+async def _avatar_response(
+    request: Request,
+    db: AsyncSession,
+    user_id: int,
+    version: Optional[str],
+    size: Optional[int] = None
+) -> Response:
+    """
+    アバター画像を条件付きGET対応で返す
+    304の場合は画像データを読み込まない
+    縮小版はバージョン付きURLであればDBを参照せずにキャッシュから返す
+    """
+    rendition_size = pick_rendition_size(size)
+    cache_key = (user_id, rendition_size, version) if version and rendition_size else None
+    if cache_key is not None:
+        entry = avatar_rendition_cache.get(cache_key)
+        if entry is not None:
+            return _cached_avatar_response(request, entry, versioned=True)
+
+    result = await db.execute(
+        select(UserAvatar.etag, UserAvatar.content_type, UserAvatar.updated_at)
+        .where(UserAvatar.user_id == user_id)
+    )
+    meta = result.first()
+    if meta is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Avatar not found"
+        )
+
+    # 古いバージョンのURLで参照された場合は長期キャッシュさせない
+    # URLの v は build_avatar_url が埋め込むハッシュの先頭16文字と完全に一致する場合だけ有効とする
+    versioned = version == meta.etag[:16]
+
+    if rendition_size is None:
+        return await _original_avatar_response(request, db, user_id, meta, versioned)
+
+    etag = f'"{meta.etag[:16]}-{rendition_size}"'
+    if is_not_modified(request, etag, meta.updated_at):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=_avatar_headers(etag, meta.updated_at, versioned)
+        )
+
+    result = await db.execute(
+        select(AvatarRendition.data, AvatarRendition.content_type)
+        .where(AvatarRendition.user_id == user_id, AvatarRendition.size == rendition_size)
+    )
+    rendition = result.first()
+    if rendition is not None:
+        data, content_type = rendition
+    else:
+        # 縮小版がない（移行前のアバター・生成ジョブの実行前）場合はここで生成して保存する
+        original = await db.scalar(select(UserAvatar.data).where(UserAvatar.user_id == user_id))
+        if original is None:
+            # メタデータの取得後にアバターが削除された
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Avatar not found"
+            )
+        try:
+            renditions = await store_renditions(db, user_id, original)
+        except ValueError as e:
+            # デコードできない・画素数が多すぎる画像は縮小せずに元画像を返す
+            print(f"❌ アバターの縮小版を生成できません (user_id={user_id}): {str(e)}")
+            await db.rollback()
+            return await _original_avatar_response(request, db, user_id, meta, versioned)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # 生成ジョブと同時に保存した場合は、先に保存された方を残す
+            await db.rollback()
+        data, content_type = renditions[rendition_size]
+
+    entry = (data, content_type, etag, meta.updated_at)
+    if versioned:
+        avatar_rendition_cache.set((user_id, rendition_size, version), entry)
+    return _cached_avatar_response(request, entry, versioned)
@@ -1,23 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+import time
 
 from models.database import get_db
-from models.user import User
-from models.user_activity import UserActivity
-from core.security import get_current_user
-from typing import Optional, List
+from models.user import User, build_avatar_url
+from core.security import CurrentUser, get_current_user
+from utils.leaderboard import leaderboard
+from utils.response_cache import response_cache
+from schemas.common import AVATAR_SIZE_CARD
+from schemas.ranking import MyRankResponse, RankPosition, RankingResponse
+from typing import List
 router = APIRouter(prefix="/ranking", tags=["ranking"])
 
-class RankingResponse(BaseModel):
-    id: int
-    position: str
-    name: str
-    department: str
-    level: int
-    avatar_url: Optional[str]
+# 取得件数の上限（キャッシュのキーがパラメータごとに増えすぎないようにする）
+MAX_RANKING_LIMIT = 100
+MAX_AROUND_ME_RADIUS = 20
 
 def get_position_suffix(position: int) -> str:
     if position % 10 == 1 and position != 11:
@@ -28,143 +26,126 @@ def get_position_suffix(position: int) -> str:
         return "rd"
     return "th"
 
-@router.get("/level", response_model=List[RankingResponse])
-async def get_level_ranking(
-    limit: int = 5,
-    db: Session = Depends(get_db)
-):
-    # レベルに基づくランキング
-    users = (
-        db.query(User)
-        .order_by(User.level.desc(), User.experience_points.desc())
-        .limit(limit)
-        .all()
-    )
-    
+async def build_ranking_list(db: AsyncSession, entries: List[tuple]) -> List[RankingResponse]:
+    """
+    (順位, ユーザーID) のリストからランキングのレスポンスを作る
+    順位はリーダーボードから取得し、表示用のユーザー情報だけをDBからまとめて取得する
+    """
+    user_ids = [user_id for _, user_id in entries]
+    users = {}
+    if user_ids:
+        result = await db.execute(select(User).where(User.id.in_(user_ids)))
+        users = {user.id: user for user in result.scalars().all()}
+
     ranking_list = []
-    for i, user in enumerate(users, 1):
+    for i, user_id in entries:
+        user = users.get(user_id)
+        if user is None:
+            # 整合性チェック前に削除されたユーザー
+            continue
         position = f"{i}{get_position_suffix(i)}"
-        ranking_list.append({
-            "id": user.id,
-            "position": position,
-            "name": user.username,
-            "department": user.department or "所属なし",
-            "level": user.level,
-            "avatar_url": user.avatar_url
-        })
-    
+        ranking_list.append(RankingResponse(
+            id=user.id,
+            position=position,
+            name=user.username,
+            department=user.department or "所属なし",
+            level=user.level,
+            avatar_url=build_avatar_url(user.id, user.avatar_etag, size=AVATAR_SIZE_CARD)
+        ))
     return ranking_list
 
+async def get_top_ranking(metric: str, limit: int, db: AsyncSession):
+    """
+    上位ランキングを返す（全員に同じ内容のためキャッシュする）
+    順位の変動は "ranking" タグ、表示名などの変更は "user:{id}" タグで無効化される
+    """
+    cache_key = response_cache.key("ranking.top", metric=metric, limit=limit)
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    started_at = time.time()
+
+    await leaderboard.ensure_loaded()
+    entries = leaderboard.top(metric, limit)
+    ranking_list = await build_ranking_list(
+        db, [(i, user_id) for i, (user_id, _) in enumerate(entries, 1)]
+    )
+    return await response_cache.store(
+        cache_key,
+        ranking_list,
+        tags=["ranking"] + [f"user:{user_id}" for user_id, _ in entries],
+        started_at=started_at,
+    )
+
+@router.get("/level", response_model=List[RankingResponse])
+async def get_level_ranking(
+    limit: int = Query(5, ge=1, le=MAX_RANKING_LIMIT),
+    db: AsyncSession = Depends(get_db)
+):
+    # レベルに基づくランキング（レベル → 累積経験値の順）
+    return await get_top_ranking("level", limit, db)
+
 @router.get("/points", response_model=List[RankingResponse])
 async def get_points_ranking(
-    limit: int = 5,
-    db: Session = Depends(get_db)
+    limit: int = Query(5, ge=1, le=MAX_RANKING_LIMIT),
+    db: AsyncSession = Depends(get_db)
 ):
     # ポイントに基づくランキング
-    users = (
-        db.query(User)
-        .order_by(User.points.desc())
-        .limit(limit)
-        .all()
-    )
-    
-    ranking_list = []
-    for i, user in enumerate(users, 1):
-        position = f"{i}{get_position_suffix(i)}"
-        ranking_list.append({
-            "id": user.id,
-            "position": position,
-            "name": user.username,
-            "department": user.department or "所属なし",
-            "level": user.level,
-            "avatar_url": user.avatar_url
-        })
-    
-    return ranking_list
+    return await get_top_ranking("points", limit, db)
 
 @router.get("/activity", response_model=List[RankingResponse])
 async def get_activity_ranking(
-    limit: int = 5,
-    db: Session = Depends(get_db)
+    limit: int = Query(5, ge=1, le=MAX_RANKING_LIMIT),
+    db: AsyncSession = Depends(get_db)
 ):
     # アクティビティ数に基づくランキング
-    ranking = (
-        db.query(
-            User,
-            func.count(UserActivity.id).label('activity_count')
-        )
-        .join(UserActivity)
-        .group_by(User.id)
-        .order_by(func.count(UserActivity.id).desc())
-        .limit(limit)
-        .all()
-    )
-    
-    ranking_list = []
-    for i, (user, _) in enumerate(ranking, 1):
-        position = f"{i}{get_position_suffix(i)}"
-        ranking_list.append({
-            "id": user.id,
-            "position": position,
-            "name": user.username,
-            "department": user.department or "所属なし",
-            "level": user.level,
-            "avatar_url": user.avatar_url
-        })
-    
-    return ranking_list
+    return await get_top_ranking("activity", limit, db)
 
-@router.get("/me")
+@router.get("/me", response_model=MyRankResponse)
 async def get_my_rank(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    # レベルランキングでの自分の順位
-    level_rank = (
-        db.query(func.count(User.id))
-        .filter(
-            (User.level > current_user.level) |
-            ((User.level == current_user.level) & (User.experience_points > current_user.experience_points))
-        )
-        .scalar() + 1
-    )
-    
-    # ポイントランキングでの自分の順位
-    points_rank = (
-        db.query(func.count(User.id))
-        .filter(User.points > current_user.points)
-        .scalar() + 1
+    await leaderboard.ensure_loaded()
+    ranks = leaderboard.my_ranks(
+        current_user.id,
+        current_user.level,
+        current_user.experience_points,
+        current_user.points
     )
+    level_rank = ranks["level"]
+    points_rank = ranks["points"]
+    activity_rank = ranks["activity"]
     
-    # アクティビティランキングでの自分の順位
-    my_activity_count = (
-        db.query(func.count(UserActivity.id))
-        .filter(UserActivity.user_id == current_user.id)
-        .scalar() or 0
+    return MyRankResponse(
+        level_rank=RankPosition(
+            position=f"{level_rank}{get_position_suffix(level_rank)}",
+            rank=level_rank
+        ),
+        points_rank=RankPosition(
+            position=f"{points_rank}{get_position_suffix(points_rank)}",
+            rank=points_rank
+        ),
+        activity_rank=RankPosition(
+            position=f"{activity_rank}{get_position_suffix(activity_rank)}",
+            rank=activity_rank
+        )
     )
-    
-    activity_rank = (
-        db.query(func.count())
-        .from_self(
-            db.query(User.id, func.count(UserActivity.id).label('count'))
-            .join(UserActivity)
-            .group_by(User.id)
-            .having(func.count(UserActivity.id) > my_activity_count)
+
+@router.get("/{metric}/around-me", response_model=List[RankingResponse])
+async def get_ranking_around_me(
+    metric: str,
+    radius: int = Query(2, ge=0, le=MAX_AROUND_ME_RADIUS),
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    # 自分の前後のユーザー（自分を含む）
+    if metric not in leaderboard.METRICS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="ランキングの種類が正しくありません"
         )
-        .scalar() or 0
-    ) + 1
-    
-    return {
-        "level_rank": {
-            "position": f"{level_rank}{get_position_suffix(level_rank)}",
-            "rank": level_rank
-        },
-        "points_rank": {
-            "position": f"{points_rank}{get_position_suffix(points_rank)}",
-            "rank": points_rank
-        },
-        "activity_rank": {
-            "position": f"{activity_rank}{get_position_suffix(activity_rank)}",
-            "rank": activity_rank
-        }
-    } 
\ No newline at end of file
+    await leaderboard.ensure_loaded()
+    entries = leaderboard.around(metric, current_user.id, radius)
+    return await build_ranking_list(
+        db, [(position, user_id) for position, user_id, _ in entries]
+    )
@@ -0,0 +1,8 @@
+"""
+認証関連のレスポンス
+"""
+from pydantic import BaseModel
+
+
+class TokenResponse(BaseModel):
+    jwt_token: str
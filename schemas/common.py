@@ -0,0 +1,66 @@
+"""
+各レスポンスで共通して使う型・シリアライザ
+
+- DisplayDate: datetime を受け取り、画面表示用の「YYYY年MM月DD日」形式の文字列にする
+- AuthorSummary / AuthorCard: 著者情報のカード
+"""
+from datetime import datetime
+from typing import Annotated, Optional
+
+from pydantic import BaseModel, BeforeValidator
+
+from models.user import build_avatar_url
+
+DATE_FORMAT = "%Y年%m月%d日"
+
+# 一覧表示で使うアバターの縮小版のサイズ（utils.avatar.AVATAR_SIZES のいずれか）
+AVATAR_SIZE_INLINE = 32  # 名前の横に並べる小さいアイコン（コメントなど）
+AVATAR_SIZE_CARD = 64  # カード・ランキング
+
+
+def format_date(value):
+    """datetime を表示用の文字列にする（変換済みの文字列・Noneはそのまま）"""
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    return value
+
+
+# 文字列として保持する（FastAPIがレスポンスを再検証しても形式が変わらないように）
+DisplayDate = Annotated[str, BeforeValidator(format_date)]
+OptionalDisplayDate = Annotated[Optional[str], BeforeValidator(format_date)]
+
+
+class AuthorSummary(BaseModel):
+    """一覧表示用の著者情報"""
+    id: int
+    name: Optional[str]
+    avatarUrl: Optional[str]
+
+    @classmethod
+    def from_user(cls, user) -> "AuthorSummary":
+        """User または CurrentUser から作る"""
+        return cls(
+            id=user.id,
+            name=user.username,
+            avatarUrl=build_avatar_url(user.id, user.avatar_etag, size=AVATAR_SIZE_INLINE),
+        )
+
+
+class AuthorCard(AuthorSummary):
+    """所属部署つきの著者情報"""
+    department: Optional[str]
+
+    @classmethod
+    def from_user(cls, user) -> "AuthorCard":
+        return cls(
+            id=user.id,
+            name=user.username,
+            avatarUrl=build_avatar_url(user.id, user.avatar_etag, size=AVATAR_SIZE_CARD),
+            department=user.department,
+        )
+
+
+class MessageResponse(BaseModel):
+    """更新・削除系の結果"""
+    message: str
+    id: int
@@ -0,0 +1,141 @@
+"""
+ナレッジ関連のレスポンス
+"""
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from schemas.common import AuthorCard, AuthorSummary, DisplayDate, OptionalDisplayDate
+
+
+class KnowledgeStats(BaseModel):
+    commentCount: int
+    fileCount: int
+
+    @classmethod
+    def from_knowledge(cls, knowledge) -> "KnowledgeStats":
+        # 件数は非正規化カウンタから読む
+        return cls(commentCount=knowledge.comment_count, fileCount=knowledge.file_count)
+
+
+class KnowledgeListItem(BaseModel):
+    """一覧・検索結果の1件"""
+    id: int
+    title: Optional[str]
+    category: Optional[str]
+    method: Optional[str]
+    target: Optional[str]
+    views: Optional[int]
+    createdAt: DisplayDate
+    author: AuthorSummary
+    stats: KnowledgeStats
+
+    @classmethod
+    def from_knowledge(cls, knowledge, **overrides) -> "KnowledgeListItem":
+        """著者を読み込み済みの Knowledge から作る（overrides で項目を追加・上書きできる）"""
+        fields = dict(
+            id=knowledge.id,
+            title=knowledge.title,
+            category=knowledge.category,
+            method=knowledge.method,
+            target=knowledge.target,
+            views=knowledge.views,
+            createdAt=knowledge.created_at,
+            author=AuthorSummary.from_user(knowledge.author),
+            stats=KnowledgeStats.from_knowledge(knowledge),
+        )
+        fields.update(overrides)
+        return cls(**fields)
+
+
+class KnowledgeCursorPage(BaseModel):
+    items: List[KnowledgeListItem]
+    next_cursor: Optional[str]
+
+
+class KnowledgeSearchItem(KnowledgeListItem):
+    score: float
+    highlights: Dict[str, str]
+
+
+class KnowledgeSearchResponse(BaseModel):
+    total: int
+    items: List[KnowledgeSearchItem]
+
+
+class KnowledgeSummary(BaseModel):
+    """本文・著者カードつきのナレッジ"""
+    id: int
+    title: Optional[str]
+    method: Optional[str]
+    target: Optional[str]
+    description: Optional[str]
+    category: Optional[str]
+    views: Optional[int]
+    createdAt: DisplayDate
+    updatedAt: DisplayDate
+    author: AuthorCard
+    stats: KnowledgeStats
+
+    @classmethod
+    def from_knowledge(cls, knowledge, author, **overrides) -> "KnowledgeSummary":
+        fields = dict(
+            id=knowledge.id,
+            title=knowledge.title,
+            method=knowledge.method,
+            target=knowledge.target,
+            description=knowledge.description,
+            category=knowledge.category,
+            views=knowledge.views,
+            createdAt=knowledge.created_at,
+            updatedAt=knowledge.updated_at,
+            author=AuthorCard.from_user(author),
+            stats=KnowledgeStats.from_knowledge(knowledge),
+        )
+        fields.update(overrides)
+        return cls(**fields)
+
+
+class PopularKnowledgeResponse(BaseModel):
+    total: int
+    items: List[KnowledgeSummary]
+
+
+class KnowledgeBatchResponse(BaseModel):
+    """一括取得の結果（items のキーはナレッジID、見つからなかったIDは missing）"""
+    items: Dict[int, KnowledgeSummary]
+    missing: List[int]
+
+
+class CommentItem(BaseModel):
+    id: int
+    content: Optional[str]
+    author: AuthorCard
+    createdAt: DisplayDate
+
+
+class KnowledgeDetail(KnowledgeSummary):
+    comments: List[CommentItem]
+
+
+class ExperienceResult(BaseModel):
+    level_up: bool
+    before_level: int
+    before_xp: int
+    after_level: int
+    after_xp: int
+    required_xp: int
+
+
+class KnowledgeCreateResponse(KnowledgeSummary):
+    # 認証なしのテスト用レスポンスには含まれない
+    experience: Optional[ExperienceResult] = None
+
+
+class KnowledgeFileItem(BaseModel):
+    id: int
+    fileName: Optional[str]
+    contentType: Optional[str]
+    size: Optional[int]
+    uploadedAt: OptionalDisplayDate
+    url: str
@@ -0,0 +1,166 @@
+"""
+プロフィール・マイページ関連のレスポンス
+"""
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from models.user import build_avatar_url
+from schemas.common import AVATAR_SIZE_CARD, AuthorCard, AuthorSummary, DisplayDate, OptionalDisplayDate
+
+
+class ProfileBase(BaseModel):
+    """自分のプロフィール（更新結果）"""
+    id: int
+    name: Optional[str]
+    email: Optional[str]
+    department: Optional[str]
+    hasAvatar: bool
+    experiencePoints: Optional[int]
+    level: Optional[int]
+    bio: Optional[str]
+    phoneNumber: Optional[str]
+
+
+class ProfileStats(BaseModel):
+    knowledgeCount: int
+    commentCount: int
+    lastActivityAt: OptionalDisplayDate = None
+
+
+class RecentKnowledge(BaseModel):
+    id: int
+    title: Optional[str]
+    createdAt: DisplayDate
+
+
+class RecentComment(BaseModel):
+    id: int
+    content: Optional[str]
+    knowledgeId: Optional[int]
+    createdAt: DisplayDate
+
+
+class RecentActivity(BaseModel):
+    knowledge: List[RecentKnowledge]
+    comments: List[RecentComment]
+
+
+class ProfileResponse(ProfileBase):
+    """自分のプロフィール（件数・最近の活動つき）"""
+    stats: ProfileStats
+    recentActivity: RecentActivity
+
+
+class AvatarUploadResponse(BaseModel):
+    message: str
+    contentType: Optional[str]
+    avatarUrl: Optional[str]
+
+
+class MyPageKnowledge(BaseModel):
+    id: int
+    title: Optional[str]
+    category: Optional[str]
+    icon: str
+    iconBgColor: str
+    author: Optional[str]
+    views: Optional[int]
+    createdAt: DisplayDate
+    content: Optional[str]
+
+
+class MyPageStats(BaseModel):
+    knowledgeCount: int
+    totalPageViews: int
+
+
+class MyPageUser(BaseModel):
+    id: int
+    name: Optional[str]
+    department: str
+    level: Optional[int]
+    nextLevelExp: int
+    avatar_url: Optional[str]
+    bio: Optional[str]
+    stats: MyPageStats
+
+
+class MyPageResponse(BaseModel):
+    user: MyPageUser
+    knowledgeList: List[MyPageKnowledge]
+
+
+class ActivityItem(BaseModel):
+    """ユーザーの最近のナレッジ"""
+    id: int
+    title: Optional[str]
+    category: Optional[str]
+    method: Optional[str]
+    target: Optional[str]
+    views: Optional[int]
+    createdAt: DisplayDate
+    author: AuthorSummary
+
+    @classmethod
+    def from_knowledge(cls, knowledge, author) -> "ActivityItem":
+        return cls(
+            id=knowledge.id,
+            title=knowledge.title,
+            category=knowledge.category,
+            method=knowledge.method,
+            target=knowledge.target,
+            views=knowledge.views,
+            createdAt=knowledge.created_at,
+            author=AuthorSummary.from_user(author),
+        )
+
+
+class UserProfileResponse(BaseModel):
+    """ユーザーの公開プロフィール（/auth/me と /profile/{user_id}）"""
+    id: int
+    email: Optional[str]
+    name: Optional[str]
+    department: Optional[str]
+    level: Optional[int]
+    currentXp: Optional[int]
+    avatarUrl: Optional[str]
+    activity: List[ActivityItem]
+
+    @classmethod
+    def from_user(cls, user, recent_knowledge) -> "UserProfileResponse":
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.username,
+            department=user.department,
+            level=user.level,
+            currentXp=user.current_xp,
+            avatarUrl=user.avatar_url,
+            activity=[ActivityItem.from_knowledge(k, user) for k in recent_knowledge],
+        )
+
+
+class UserCard(AuthorCard):
+    """フィードなどに並べるユーザーのカード"""
+    level: Optional[int]
+    currentXp: Optional[int]
+    knowledgeCount: int
+
+    @classmethod
+    def from_user(cls, user, knowledge_count: int = 0) -> "UserCard":
+        return cls(
+            id=user.id,
+            name=user.username,
+            avatarUrl=build_avatar_url(user.id, user.avatar_etag, size=AVATAR_SIZE_CARD),
+            department=user.department,
+            level=user.level,
+            currentXp=user.current_xp,
+            knowledgeCount=knowledge_count,
+        )
+
+
+class UserCardBatchResponse(BaseModel):
+    """一括取得の結果（items のキーはユーザーID、見つからなかったIDは missing）"""
+    items: Dict[int, UserCard]
+    missing: List[int]
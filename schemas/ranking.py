@@ -0,0 +1,26 @@
+"""
+ランキング関連のレスポンス
+"""
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class RankingResponse(BaseModel):
+    id: int
+    position: str
+    name: str
+    department: str
+    level: int
+    avatar_url: Optional[str]
+
+
+class RankPosition(BaseModel):
+    position: str
+    rank: int
+
+
+class MyRankResponse(BaseModel):
+    level_rank: RankPosition
+    points_rank: RankPosition
+    activity_rank: RankPosition
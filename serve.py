@@ -0,0 +1,93 @@
+"""
+本番用のサーバー起動スクリプト
+
+    python serve.py
+
+gunicorn + UvicornWorker で起動する
+- ワーカー数は利用可能なCPU数から決める（SERVER_WORKERS で上書き可能）
+  ワーカー間でキャッシュの無効化を共有するため RESPONSE_CACHE_SHARED_PATH が必要
+  （既定値あり。空にした場合は1ワーカーで起動する）
+- アプリはマスタープロセスで事前に読み込み（preload）、fork後の各ワーカーが
+  起動時にDB接続を事前確立する。確立が終わるまで /readyz は503を返す
+- max_requests（ジッターつき）でワーカーを順番に入れ替え、同時に再起動しないようにする
+
+再起動の方法（マスタープロセスにシグナルを送る）
+- HUP: ワーカーを入れ替える。preload しているため、新しいワーカーもマスターが読み込み済みの
+  アプリのコードと設定（.env）を引き継ぐ。コード・設定の変更は反映されない
+- USR2 → 新マスターのワーカーが準備できたら旧マスターに WINCH, QUIT:
+  新しいマスターがコードと設定を読み込み直すため、コード・設定を更新したときはこちらを使う
+"""
+import os
+
+from gunicorn.app.base import BaseApplication
+
+from core.config import settings
+
+
+def available_cpus() -> int:
+    """このプロセスが使えるCPU数（コンテナのCPU割り当てを考慮する）"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def worker_count() -> int:
+    if settings.SERVER_WORKERS:
+        return settings.SERVER_WORKERS
+    # 非同期ワーカーは1つでCPU1コアを使い切れるため、コア数と同じにする
+    return max(1, min(available_cpus(), settings.SERVER_MAX_WORKERS))
+
+
+def post_fork(server, worker) -> None:
+    # マスターで作られたプールの接続をワーカー間で共有しないようにする
+    from models.database import engine
+    engine.sync_engine.dispose(close=False)
+
+
+class RebemaApplication(BaseApplication):
+    def __init__(self, app_uri: str, options: dict):
+        self.app_uri = app_uri
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from main import app
+        return app
+
+
+def build_options() -> dict:
+    return {
+        "bind": f"{settings.SERVER_HOST}:{settings.SERVER_PORT}",
+        "workers": worker_count(),
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "timeout": settings.SERVER_TIMEOUT,
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT,
+        "keepalive": settings.SERVER_KEEPALIVE,
+        "max_requests": settings.SERVER_MAX_REQUESTS,
+        "max_requests_jitter": settings.SERVER_MAX_REQUESTS_JITTER,
+        "post_fork": post_fork,
+        "accesslog": "-",
+        "errorlog": "-",
+    }
+
+
+def main() -> None:
+    options = build_options()
+    if options["workers"] > 1 and not settings.RESPONSE_CACHE_SHARED_PATH:
+        # 共有ストアがないと、更新時の無効化が他のワーカーのキャッシュに届かないため1ワーカーにする
+        print(
+            f"❌ RESPONSE_CACHE_SHARED_PATH が空のため、workers={options['workers']} ではなく1ワーカーで起動します"
+        )
+        options["workers"] = 1
+    print(f"✅ サーバーを起動します: workers={options['workers']}, bind={options['bind']}")
+    RebemaApplication("main:app", options).run()
+
+
+if __name__ == "__main__":
+    main()
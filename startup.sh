@@ -17,15 +17,15 @@ run_with_output() {
     cat /tmp/last_command_output
 }
 
-# パッケージインストール
-run_with_output python3 -m pip install -r /home/site/wwwroot/requirements.txt
+# パッケージインストール（requirements.txt が変わったときだけ）
+REQUIREMENTS=/home/site/wwwroot/requirements.txt
+REQUIREMENTS_STAMP=/home/site/.requirements.sha256
+if ! sha256sum --status -c "${REQUIREMENTS_STAMP}" 2>/dev/null; then
+    run_with_output python3 -m pip install -r "${REQUIREMENTS}"
+    sha256sum "${REQUIREMENTS}" > "${REQUIREMENTS_STAMP}"
+fi
 
-# DB接続確認
-run_with_output python3 -c 'from models.database import engine; print("✅ DB connection successful")'
+# DB接続の確認は各ワーカーの /readyz で行う（utils/health.py）
 
-# FastAPIアプリ起動
-exec gunicorn main:app \
-    --workers 1 \
-    --worker-class uvicorn.workers.UvicornWorker \
-    --bind=0.0.0.0:8000 \
-    --timeout 120
+# FastAPIアプリ起動（ワーカー数はCPU数から決める。serve.py を参照）
+exec python3 serve.py
@@ -0,0 +1,82 @@
+"""
+テストの共通設定
+
+- DBは ASYNC_DATABASE_URL で sqlite+aiosqlite の一時ファイルに差し替え、テストごとに作り直す
+- 必須の設定値にはダミーの値を入れる（アプリのモジュールを読み込む前に設定する必要がある）
+"""
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="rebema-test-")
+
+os.environ.update({
+    "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{_TMP_DIR}/test.sqlite3",
+    "JOB_SPOOL_PATH": os.path.join(_TMP_DIR, "jobs.sqlite3"),
+    "RESPONSE_CACHE_SHARED_PATH": "",
+    "STORAGE_BACKEND": "local",
+    "LOCAL_STORAGE_DIR": os.path.join(_TMP_DIR, "uploads"),
+    "PASSWORD_HASH_ROUNDS": "4",
+})
+for name, value in {
+    "SECRET_KEY": "test-secret-key",
+    "MYSQL_HOST": "localhost",
+    "MYSQL_PORT": "3306",
+    "MYSQL_USER": "test",
+    "MYSQL_PASSWORD": "test",
+    "MYSQL_DB": "test",
+    "MYSQL_SSL_MODE": "disable",
+    "AZURE_STORAGE_CONNECTION_STRING": "unused",
+    "AZURE_STORAGE_CONTAINER_NAME": "unused",
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx
+import pytest
+
+from core.security import create_access_token, principal_cache, token_cache
+from models.database import AsyncSessionLocal, Base, engine
+# テーブルを作成するため、マッパーをすべて登録する（alembic/env.py と同じ）
+from models.user import User
+from models.user_avatar import UserAvatar
+from models.avatar_rendition import AvatarRendition
+from models.knowledge import Knowledge
+from models.file import File
+from models.comment import Comment
+from models.knowledge_collaborator import KnowledgeCollaborator
+from models.user_activity import UserActivity
+from models.user_stats import UserStats
+from models.profile import Profile
+from utils.response_cache import response_cache
+
+
+@pytest.fixture
+async def db():
+    """空のテーブルを作成したDBのセッション"""
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        yield session
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+    # 接続はテストごとのイベントループに紐づくため、プールごと閉じる
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(db):
+    """アプリに直接リクエストするクライアント（起動処理のバックグラウンドタスクは動かさない）"""
+    from main import app
+
+    # プロセス内のキャッシュに前のテストの内容を残さない
+    principal_cache.clear()
+    token_cache.clear()
+    response_cache._local.clear()
+    response_cache._invalidated_at.clear()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as http_client:
+        yield http_client
+
+
+def auth_headers(user: User) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
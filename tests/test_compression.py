@@ -0,0 +1,131 @@
+import gzip
+
+import httpx
+import msgpack
+import orjson
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+from utils.compression import ContentEncodingMiddleware, choose_encoding, choose_msgpack, parse_qualities
+
+PAYLOAD = {"items": [{"id": i, "title": "ナレッジ" * 10} for i in range(50)]}
+BODY = orjson.dumps(PAYLOAD)
+
+
+def test_parse_qualities():
+    assert parse_qualities("gzip;q=0.5, br , *;q=0, x;q=bad") == {"gzip": 0.5, "br": 1.0, "*": 0.0, "x": 0.0}
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+    ("identity", None),
+    ("br;q=0, gzip;q=0", None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("application/json", None),
+    ("application/msgpack", "application/msgpack"),
+    ("application/x-msgpack, application/json;q=0.5", "application/x-msgpack"),
+    ("application/msgpack;q=0.5, application/json", None),
+    ("*/*", None),
+])
+def test_choose_msgpack(header, expected):
+    assert choose_msgpack(header) == expected
+
+
+async def json_endpoint(request):
+    return Response(BODY, media_type="application/json", headers={"ETag": '"v1"'})
+
+
+async def small_endpoint(request):
+    return Response(b'{"ok":true}', media_type="application/json")
+
+
+async def not_modified_endpoint(request):
+    return Response(status_code=304, headers={"ETag": '"v1"'})
+
+
+async def attachment_endpoint(request):
+    return Response(b"not json at all", media_type="application/json",
+                    headers={"Content-Disposition": 'attachment; filename="a.json"'})
+
+
+async def partial_endpoint(request):
+    return Response(BODY[:2000], status_code=206, media_type="application/json",
+                    headers={"Content-Range": f"bytes 0-1999/{len(BODY)}"})
+
+
+@pytest.fixture
+async def client():
+    app = Starlette(routes=[
+        Route("/json", json_endpoint),
+        Route("/small", small_endpoint),
+        Route("/not-modified", not_modified_endpoint),
+        Route("/attachment", attachment_endpoint),
+        Route("/partial", partial_endpoint),
+    ])
+    app.add_middleware(ContentEncodingMiddleware, minimum_size=1024)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as http_client:
+        yield http_client
+
+
+async def get_raw(client, path, **headers):
+    """Content-Encoding を展開せずに受け取る"""
+    request = client.build_request("GET", path, headers=headers)
+    response = await client.send(request, stream=True)
+    body = b"".join([chunk async for chunk in response.aiter_raw()])
+    await response.aclose()
+    return response, body
+
+
+async def test_json_is_compressed_with_the_preferred_encoding(client):
+    response, body = await get_raw(client, "/json", **{"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body) == BODY
+    assert response.headers["content-length"] == str(len(body))
+    assert "Accept-Encoding" in response.headers["vary"]
+
+
+async def test_msgpack_is_returned_when_preferred(client):
+    response, body = await get_raw(client, "/json", Accept="application/msgpack", **{"Accept-Encoding": "identity"})
+
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(body) == PAYLOAD
+    assert "Accept" in response.headers["vary"]
+
+
+async def test_small_bodies_are_not_compressed(client):
+    response, body = await get_raw(client, "/small", **{"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert body == b'{"ok":true}'
+
+
+async def test_not_modified_responses_carry_vary(client):
+    response, _ = await get_raw(client, "/not-modified", **{"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 304
+    assert "Accept-Encoding" in response.headers["vary"]
+
+
+@pytest.mark.parametrize("path", ["/attachment", "/partial"])
+async def test_files_and_partial_responses_pass_through(client, path):
+    plain, plain_body = await get_raw(client, path, **{"Accept-Encoding": "identity"})
+
+    response, body = await get_raw(client, path, Accept="application/msgpack", **{"Accept-Encoding": "gzip"})
+
+    assert response.status_code == plain.status_code
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-type"].startswith("application/json")
+    assert body == plain_body
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from models.comment import Comment
+from models.knowledge import Knowledge
+from models.user import User
+from tests.conftest import auth_headers
+from utils.counters import adjust_knowledge_counters, reconcile_knowledge_counters
+
+UPDATED_AT = datetime(2024, 1, 1, 12, 0, 0)
+
+
+async def create_knowledge(db, **values):
+    user = User(email="author@example.com", username="author")
+    db.add(user)
+    await db.flush()
+    knowledge = Knowledge(title="ナレッジ", author_id=user.id, updated_at=UPDATED_AT, **values)
+    db.add(knowledge)
+    await db.commit()
+    return user, knowledge
+
+
+async def load(db, knowledge_id):
+    return (await db.execute(
+        select(Knowledge.comment_count, Knowledge.file_count, Knowledge.updated_at)
+        .where(Knowledge.id == knowledge_id)
+        .execution_options(populate_existing=True)
+    )).one()
+
+
+async def test_adjust_counters_adds_in_sql_without_touching_updated_at(db):
+    _, knowledge = await create_knowledge(db)
+
+    await adjust_knowledge_counters(db, knowledge.id, comments=2, files=1)
+    await adjust_knowledge_counters(db, knowledge.id, comments=-1)
+    await db.commit()
+
+    assert tuple(await load(db, knowledge.id)) == (1, 1, UPDATED_AT)
+
+
+async def test_reconcile_repairs_drifted_counters(db):
+    user, knowledge = await create_knowledge(db, comment_count=5, file_count=2)
+    db.add(Comment(knowledge_id=knowledge.id, author_id=user.id, content="コメント"))
+    await db.commit()
+
+    assert await reconcile_knowledge_counters(db) == 1
+    assert tuple(await load(db, knowledge.id)) == (1, 0, UPDATED_AT)
+    assert await reconcile_knowledge_counters(db) == 0
+
+
+async def test_comments_update_counter_and_detail_etag(db, client):
+    user, knowledge = await create_knowledge(db)
+    headers = auth_headers(user)
+    detail_url = f"/knowledge/{knowledge.id}"
+    comments_url = f"/knowledge/{knowledge.id}/comments/"
+
+    first = await client.post(comments_url, json={"content": "一つ目"}, headers=headers)
+    await client.post(comments_url, json={"content": "二つ目"}, headers=headers)
+    assert first.status_code == 200
+    assert tuple(await load(db, knowledge.id)) == (2, 0, UPDATED_AT)
+    etag = (await client.get(detail_url, headers=headers)).headers["etag"]
+
+    # 件数が同じでもコメントが入れ替わった場合は別のETagになる
+    deleted = await client.delete(f"{comments_url}{first.json()['id']}", headers=headers)
+    assert deleted.status_code == 200
+    await client.post(comments_url, json={"content": "三つ目"}, headers=headers)
+    assert tuple(await load(db, knowledge.id)) == (2, 0, UPDATED_AT)
+
+    response = await client.get(detail_url, headers=dict(headers, **{"If-None-Match": etag}))
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert [comment["content"] for comment in response.json()["comments"]] == ["二つ目", "三つ目"]
+
+    not_modified = await client.get(detail_url, headers=dict(headers, **{"If-None-Match": response.headers["etag"]}))
+    assert not_modified.status_code == 304
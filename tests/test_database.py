@@ -0,0 +1,39 @@
+from sqlalchemy import select, text
+
+from models.database import get_db
+from models.knowledge import Knowledge
+from models.user import User
+from tests.conftest import auth_headers
+
+
+async def test_get_db_yields_async_session(db):
+    async for session in get_db():
+        assert (await session.execute(text("SELECT 1"))).scalar() == 1
+
+
+async def test_knowledge_list_runs_on_async_session(db, client):
+    user = User(email="author@example.com", username="author")
+    db.add(user)
+    await db.flush()
+    db.add_all([
+        Knowledge(title="一つ目", author_id=user.id),
+        Knowledge(title="二つ目", author_id=user.id),
+    ])
+    await db.commit()
+
+    response = await client.get("/knowledge/", headers=auth_headers(user))
+
+    assert response.status_code == 200
+    assert {item["title"] for item in response.json()} == {"一つ目", "二つ目"}
+
+
+async def test_requests_without_token_are_rejected(db, client):
+    response = await client.get("/knowledge/")
+
+    assert response.status_code == 401
+
+
+async def test_user_card_batch_requires_token(db, client):
+    response = await client.get("/profile/batch", params={"ids": "1,2"})
+
+    assert response.status_code == 401
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from models.user import User
+from models.user_activity import UserActivity
+from utils.experience import REQUIRED_XP, apply_experience, levels_gained, preview_experience
+
+
+def simulate(level, current_xp, experience_points, xp):
+    """1レベルずつ上げていく従来の計算"""
+    current_xp += xp
+    while current_xp >= REQUIRED_XP:
+        current_xp -= REQUIRED_XP
+        level += 1
+        experience_points += REQUIRED_XP
+    return level, current_xp, experience_points
+
+
+def award(user_id, xp, award_id):
+    return {
+        "award_id": award_id,
+        "user_id": user_id,
+        "email": f"user{user_id}@example.com",
+        "xp": xp,
+        "action": "comment",
+        "awarded_at": datetime(2024, 1, 1).isoformat(),
+    }
+
+
+@pytest.mark.parametrize("current_xp", [0, 1, 50, 99])
+@pytest.mark.parametrize("xp", [0, 5, 99, 100, 101, 250, 1000])
+def test_closed_form_matches_level_by_level_loop(current_xp, xp):
+    class Snapshot:
+        level = 3
+
+    Snapshot.current_xp = current_xp
+    expected_level, expected_xp, _ = simulate(3, current_xp, 0, xp)
+
+    result = preview_experience(Snapshot, xp)
+
+    assert levels_gained(current_xp, xp) == expected_level - 3
+    assert (result["after_level"], result["after_xp"]) == (expected_level, expected_xp)
+    assert result["level_up"] == (expected_level > 3)
+
+
+async def test_apply_experience_sums_awards_in_sql(db):
+    user = User(email="user1@example.com", username="user1", level=2, current_xp=90, experience_points=100)
+    db.add(user)
+    await db.commit()
+
+    await apply_experience([award(user.id, 30, "a1"), award(user.id, 45, "a2"), award(user.id, 40, "a3")])
+
+    row = (await db.execute(
+        select(User.level, User.current_xp, User.experience_points).where(User.id == user.id)
+        .execution_options(populate_existing=True)
+    )).one()
+    assert tuple(row) == simulate(2, 90, 100, 115)
+    assert await db.scalar(select(func.count()).select_from(UserActivity)) == 3
+
+
+async def test_redelivered_awards_are_applied_once(db):
+    user = User(email="user1@example.com", username="user1", level=1, current_xp=0, experience_points=0)
+    db.add(user)
+    await db.commit()
+    awards = [award(user.id, 40, "a1"), award(user.id, 40, "a2")]
+
+    await apply_experience(awards)
+    # ジョブの再実行（同じバッチの再配送・バッチ内の重複）
+    await apply_experience(awards)
+    await apply_experience([award(user.id, 40, "a3"), award(user.id, 40, "a3")])
+
+    row = (await db.execute(
+        select(User.level, User.current_xp, User.experience_points).where(User.id == user.id)
+        .execution_options(populate_existing=True)
+    )).one()
+    assert tuple(row) == simulate(1, 0, 0, 120)
+    assert await db.scalar(select(func.count()).select_from(UserActivity)) == 3
@@ -0,0 +1,100 @@
+import pytest
+
+from utils.jobs import JobQueue, JobSpool
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return JobSpool(str(tmp_path / "jobs.sqlite3"), lock_timeout=60)
+
+
+def make_queue(tmp_path, max_attempts=3):
+    return JobQueue(
+        spool_path=str(tmp_path / "queue.sqlite3"),
+        workers=1,
+        poll_interval=0.01,
+        max_attempts=max_attempts,
+        retry_base_delay=0.0,
+        retry_max_delay=0.0,
+        lock_timeout=60,
+    )
+
+
+def test_claimed_jobs_are_locked_until_released(spool):
+    first = spool.push("mail", {"n": 1})
+    second = spool.push("mail", {"n": 2})
+    spool.push("other", {"n": 3})
+
+    claimed = spool.claim("mail", limit=10, owner="worker-a")
+
+    assert [(job.id, job.payload) for job in claimed] == [(first, {"n": 1}), (second, {"n": 2})]
+    assert spool.claim("mail", limit=10, owner="worker-b") == []
+
+    spool.release([first])
+    assert [job.id for job in spool.claim("mail", limit=10, owner="worker-b")] == [first]
+
+
+def test_stale_locks_are_reclaimed(tmp_path):
+    spool = JobSpool(str(tmp_path / "jobs.sqlite3"), lock_timeout=-1)
+    job_id = spool.push("mail", {})
+    spool.claim("mail", limit=1, owner="crashed")
+
+    assert [job.id for job in spool.claim("mail", limit=1, owner="worker")] == [job_id]
+
+
+def test_delayed_jobs_wait_until_available(spool):
+    spool.push("mail", {}, delay=3600)
+
+    assert spool.claim("mail", limit=1, owner="worker") == []
+
+
+def test_jobs_survive_reopening_the_spool(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    JobSpool(path, lock_timeout=60).push("mail", {"to": "a@example.com"})
+
+    reopened = JobSpool(path, lock_timeout=60)
+
+    assert [job.payload for job in reopened.claim("mail", limit=1, owner="worker")] == [{"to": "a@example.com"}]
+    assert reopened.depth() == {"mail": {"pending": 1}}
+
+
+async def test_queue_runs_handlers_in_batches_and_deletes_completed_jobs(tmp_path):
+    queue = make_queue(tmp_path)
+    batches = []
+
+    @queue.handler("mail", batch_size=2)
+    async def send(payloads):
+        batches.append([payload["n"] for payload in payloads])
+
+    for n in range(3):
+        await queue.enqueue("mail", {"n": n})
+
+    assert await queue.run_once() == 2
+    assert await queue.run_once() == 1
+    assert await queue.run_once() == 0
+    assert batches == [[0, 1], [2]]
+    assert queue.spool.depth() == {}
+
+
+async def test_failing_jobs_are_retried_then_buried(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    calls = []
+
+    @queue.handler("mail")
+    async def send(payloads):
+        calls.append(payloads)
+        raise RuntimeError("smtp down")
+
+    await queue.enqueue("mail", {"n": 1})
+
+    await queue.run_once()
+    assert queue.spool.depth() == {"mail": {"pending": 1}}
+    await queue.run_once()
+    assert queue.spool.depth() == {"mail": {"dead": 1}}
+    assert await queue.run_once() == 0
+    assert len(calls) == 2
+
+
+async def test_enqueue_rejects_unknown_job_types(tmp_path):
+    with pytest.raises(ValueError):
+        await make_queue(tmp_path).enqueue("unknown", {})
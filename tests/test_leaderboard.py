@@ -0,0 +1,107 @@
+import random
+import time
+
+import pytest
+from sqlalchemy import update
+
+from models.user import User
+from utils.leaderboard import IndexableSkipList, Leaderboard, LeaderboardService
+from utils.response_cache import SharedCacheStore, response_cache
+
+
+def test_skip_list_matches_sorted_list_under_random_operations():
+    rng = random.Random(0)
+    skip_list = IndexableSkipList()
+    expected = []
+    for _ in range(2000):
+        key = rng.randrange(500)
+        if key in expected:
+            skip_list.remove(key)
+            expected.remove(key)
+        else:
+            skip_list.insert(key)
+            expected.append(key)
+            expected.sort()
+
+        assert len(skip_list) == len(expected)
+        probe = rng.randrange(500)
+        assert skip_list.rank(probe) == sum(1 for value in expected if value < probe)
+
+    for index in (0, len(expected) // 2, len(expected) - 1):
+        assert list(skip_list.iter_from(index)) == expected[index:]
+    assert list(skip_list.iter_from(len(expected))) == []
+
+
+def test_skip_list_remove_missing_key_raises():
+    skip_list = IndexableSkipList()
+    skip_list.insert(1)
+
+    with pytest.raises(KeyError):
+        skip_list.remove(2)
+
+
+def test_leaderboard_orders_by_score_then_user_id():
+    board = Leaderboard()
+    board.update(1, (3, 100))
+    board.update(2, (5, 10))
+    board.update(3, (3, 100))
+    board.update(4, (3, 50))
+
+    assert board.top(10) == [(2, (5, 10)), (1, (3, 100)), (3, (3, 100)), (4, (3, 50))]
+    # 同点は同順位
+    assert [board.rank(user_id) for user_id in (2, 1, 3, 4)] == [1, 2, 2, 4]
+    assert board.slice(1, 2) == [(1, (3, 100)), (3, (3, 100))]
+
+
+def test_leaderboard_update_moves_user_and_reports_changes():
+    board = Leaderboard()
+    board.update(1, (10,))
+    board.update(2, (20,))
+
+    assert board.update(1, (10,)) is False
+    assert board.update(1, (30,)) is True
+    assert board.top(2) == [(1, (30,)), (2, (20,))]
+    assert board.discard(1) is True
+    assert board.discard(1) is False
+    assert len(board) == 1
+
+
+def test_service_around_me_clamps_at_the_top():
+    service = LeaderboardService(check_interval=60)
+    for user_id, points in enumerate([50, 40, 30, 20, 10], start=1):
+        service.update_user(user_id, level=1, experience_points=0, points=points)
+
+    assert [user_id for _, user_id, _ in service.around("points", 1, radius=2)] == [1, 2, 3]
+    assert [position for position, _, _ in service.around("points", 4, radius=1)] == [3, 4, 5]
+    assert service.around("points", 99, radius=2) == []
+
+
+def test_service_activity_board_excludes_users_without_activity():
+    service = LeaderboardService(check_interval=60)
+    service.add_activity(1, 2)
+    service.add_activity(2)
+    service.add_activity(2, -1)
+
+    assert service.top("activity", 10) == [(1, (2,))]
+    assert service.my_ranks(2, level=1, experience_points=0, points=0)["activity"] == 2
+
+
+async def test_service_refreshes_users_changed_by_another_worker(db, tmp_path, monkeypatch):
+    store = SharedCacheStore(str(tmp_path / "shared.sqlite3"))
+    monkeypatch.setattr(response_cache, "_shared", store)
+    users = [User(email=f"user{i}@example.com", username=f"user{i}", points=points) for i, points in enumerate([10, 20])]
+    db.add_all(users)
+    await db.commit()
+    service = LeaderboardService(check_interval=60)
+    await service.ensure_loaded()
+    assert [user_id for user_id, _ in service.top("points", 2)] == [users[1].id, users[0].id]
+
+    await db.execute(update(User).where(User.id == users[0].id).values(points=30))
+    await db.commit()
+    # 別のワーカーが経験値ジョブを実行した
+    store.invalidate([f"user:{users[0].id}"], time.time())
+
+    await service.ensure_loaded()
+    assert [user_id for user_id, _ in service.top("points", 2)] == [users[0].id, users[1].id]
+    # 取り込み済みの無効化では読み直さない
+    assert await service.refresh_changed() == 0
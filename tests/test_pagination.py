@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from models.knowledge import Knowledge
+from models.user import User
+from tests.conftest import auth_headers
+from utils.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips_and_is_url_safe():
+    created_at = datetime(2024, 5, 1, 9, 30, 15, 123456)
+
+    cursor = encode_cursor(created_at, 42)
+
+    assert decode_cursor(cursor) == (created_at, 42)
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", encode_cursor(datetime(2024, 1, 1), 1)[:-4]])
+def test_malformed_cursors_are_rejected_with_400(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor)
+
+    assert exc_info.value.status_code == 400
+
+
+async def test_cursor_pages_cover_every_item_once_with_tied_timestamps(db, client):
+    user = User(email="author@example.com", username="author")
+    db.add(user)
+    await db.flush()
+    # 同じ作成日時のナレッジがページの境目をまたいでも、重複・欠落しない
+    timestamps = [datetime(2024, 1, 1)] * 3 + [datetime(2024, 1, 2)] * 2
+    db.add_all([
+        Knowledge(title=f"ナレッジ{i}", author_id=user.id, created_at=created_at)
+        for i, created_at in enumerate(timestamps)
+    ])
+    await db.commit()
+
+    seen, cursor = [], ""
+    while cursor is not None:
+        response = await client.get(
+            "/knowledge/", params={"cursor": cursor, "limit": 2}, headers=auth_headers(user)
+        )
+        assert response.status_code == 200
+        page = response.json()
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+
+    assert seen == [5, 4, 3, 2, 1]
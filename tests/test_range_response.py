@@ -0,0 +1,52 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from utils.range_response import parse_range
+
+SIZE = 1000
+ETAG = '"abc"'
+
+
+def request_with(**headers):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=900-", (900, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_range(request_with(range=header), SIZE, ETAG) == expected
+
+
+@pytest.mark.parametrize("header", ["items=0-1", "bytes=0-1,5-6", "bytes=a-b", "bytes=-0"])
+def test_unsupported_ranges_fall_back_to_the_full_body(header):
+    assert parse_range(request_with(range=header), SIZE, ETAG) is None
+
+
+def test_no_range_header_returns_full_body():
+    assert parse_range(request_with(), SIZE, ETAG) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=500-100"])
+def test_unsatisfiable_ranges_raise_416(header):
+    with pytest.raises(HTTPException) as exc_info:
+        parse_range(request_with(range=header), SIZE, ETAG)
+
+    assert exc_info.value.status_code == 416
+    assert exc_info.value.headers["Content-Range"] == f"bytes */{SIZE}"
+
+
+def test_if_range_must_match_the_current_etag():
+    assert parse_range(request_with(range="bytes=0-9", if_range=ETAG), SIZE, ETAG) == (0, 9)
+    assert parse_range(request_with(range="bytes=0-9", if_range='"old"'), SIZE, ETAG) is None
+    assert parse_range(request_with(range="bytes=0-9", if_range=ETAG), SIZE, None) is None
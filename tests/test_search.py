@@ -0,0 +1,92 @@
+import time
+
+from models.knowledge import Knowledge
+from models.user import User
+from utils.response_cache import SharedCacheStore, response_cache
+from utils.search import KnowledgeSearchService, SearchIndex, highlight, tokenize
+
+
+def test_tokenize_splits_segments_into_bigrams_with_source_offsets():
+    assert tokenize("設計レビュー") == [
+        ("設計", 0, 2), ("計レ", 1, 3), ("レビ", 2, 4), ("ビュ", 3, 5), ("ュー", 4, 6),
+    ]
+    # 記号で区間が切れ、1文字だけの区間はunigramになる
+    assert tokenize("A/BC") == [("a", 0, 1), ("bc", 2, 4)]
+
+
+def test_tokenize_normalizes_width_and_case():
+    assert [token for token, _, _ in tokenize("ＡＢＣ")] == ["ab", "bc"]
+    assert tokenize(None) == []
+
+
+def test_search_ranks_title_matches_above_body_matches():
+    index = SearchIndex()
+    index.add(1, {"title": "議事録", "description": "レビューの進め方"})
+    index.add(2, {"title": "レビューの進め方", "description": "議事録"})
+    index.add(3, {"title": "無関係", "description": "まったく別の話"})
+
+    ranked, _ = index.search("レビュー")
+
+    assert [doc_id for doc_id, _ in ranked] == [2, 1]
+
+
+def test_search_requires_most_query_bigrams_to_match():
+    index = SearchIndex()
+    index.add(1, {"title": "設計レビュー"})
+    index.add(2, {"title": "設計書"})
+
+    ranked, _ = index.search("設計レビュー")
+
+    assert [doc_id for doc_id, _ in ranked] == [1]
+
+
+def test_one_character_query_matches_inside_longer_text():
+    index = SearchIndex()
+    index.add(1, {"title": "設計レビュー"})
+    index.add(2, {"title": "テスト計画"})
+    index.add(3, {"title": "議事録"})
+
+    ranked, tokens = index.search("計")
+
+    assert {doc_id for doc_id, _ in ranked} == {1, 2}
+    assert highlight("テスト計画", tokens) == "テス<mark>ト計画</mark>"
+
+
+def test_removed_documents_are_not_returned():
+    index = SearchIndex()
+    index.add(1, {"title": "設計"})
+    index.add(1, {"title": "運用"})
+    index.add(2, {"title": "設計"})
+    index.remove(2)
+
+    assert index.search("設計")[0] == []
+    assert index.search("設")[0] == []
+    assert [doc_id for doc_id, _ in index.search("運用")[0]] == [1]
+
+
+def test_highlight_escapes_html_and_marks_matches():
+    assert highlight("<b>設計</b>の話", {"設計"}) == "&lt;b&gt;<mark>設計</mark>&lt;/b&gt;の話"
+    assert highlight("設計", {"運用"}) is None
+
+
+async def test_sync_removes_only_documents_deleted_by_another_worker(db, tmp_path, monkeypatch):
+    store = SharedCacheStore(str(tmp_path / "shared.sqlite3"))
+    monkeypatch.setattr(response_cache, "_shared", store)
+    user = User(email="author@example.com", username="author")
+    db.add(user)
+    await db.flush()
+    knowledge = Knowledge(title="設計レビュー", author_id=user.id)
+    db.add(knowledge)
+    await db.commit()
+    service = KnowledgeSearchService(refresh_interval=60)
+    await service.rebuild()
+    # 自ワーカーで索引付けした、DBにはまだ見えないナレッジ
+    service.index.add(999, {"title": "設計書"})
+
+    await db.delete(knowledge)
+    await db.commit()
+    # 別のワーカーが削除した
+    store.invalidate([f"knowledge:{knowledge.id}", "knowledge:list"], time.time())
+    await service.sync()
+
+    assert service.index.doc_ids() == {999}
@@ -0,0 +1,43 @@
+import time
+
+import pytest
+from sqlalchemy import update
+
+from models.user import User
+from tests.conftest import auth_headers
+from utils.response_cache import SharedCacheStore, response_cache
+
+
+@pytest.fixture
+def shared_store(tmp_path, monkeypatch):
+    """同じマシンの他のワーカーと共有するストア"""
+    store = SharedCacheStore(str(tmp_path / "shared.sqlite3"))
+    monkeypatch.setattr(response_cache, "_shared", store)
+    return store
+
+
+async def test_principal_is_cached_between_requests(db, client):
+    user = User(email="user@example.com", username="user", level=1)
+    db.add(user)
+    await db.commit()
+
+    assert (await client.get("/auth/me", headers=auth_headers(user))).json()["level"] == 1
+    await db.execute(update(User).where(User.id == user.id).values(level=5))
+    await db.commit()
+
+    # 無効化されていなければキャッシュ済みの値のまま（DBを読まない）
+    assert (await client.get("/auth/me", headers=auth_headers(user))).json()["level"] == 1
+
+
+async def test_invalidation_from_another_worker_reloads_the_principal(db, client, shared_store):
+    user = User(email="user@example.com", username="user", level=1)
+    db.add(user)
+    await db.commit()
+    assert (await client.get("/auth/me", headers=auth_headers(user))).json()["level"] == 1
+
+    await db.execute(update(User).where(User.id == user.id).values(level=5))
+    await db.commit()
+    # 別のワーカーが経験値を付与して無効化した（このプロセスのキャッシュには触れない）
+    shared_store.invalidate([f"principal:{user.email}"], time.time())
+
+    assert (await client.get("/auth/me", headers=auth_headers(user))).json()["level"] == 5
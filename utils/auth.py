@@ -1,35 +1,34 @@
-from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+"""
+トークン・パスワード関連の関数
+
+実装は core.security に集約している（このモジュールは互換のために残している）
+"""
 from fastapi import HTTPException, status
-from core.config import settings
+from jose import JWTError
+
+from core.security import (
+    create_access_token,
+    decode_access_token,
+    pwd_context,
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# core.security の verify_password / get_password_hash はスレッドプールで実行するコルーチンのため、
+# このモジュールでは従来どおり同期で呼べる版を提供する（スクリプトなどイベントループ外から使う）
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
 
 def verify_token(token: str) -> dict:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
+        return decode_access_token(token)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="認証に失敗しました",
             headers={"WWW-Authenticate": "Bearer"},
-        ) 
\ No newline at end of file
+        )
@@ -0,0 +1,132 @@
+"""
+アバター画像の縮小版の生成
+
+元画像を正方形に中央トリミングし、決まったサイズに縮小・再エンコードする
+（WebPに対応していない環境ではJPEG）。CPU処理のため呼び出し側でスレッドに逃がすこと
+
+アップロード時はバックグラウンドジョブ（avatar_renditions）で生成する
+"""
+import asyncio
+import io
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.avatar_rendition import AvatarRendition
+from models.database import AsyncSessionLocal
+from models.user_avatar import UserAvatar
+from utils.jobs import job_queue
+
+# 生成するサイズ（一辺のピクセル数）
+AVATAR_SIZES = (32, 64, 256)
+
+_WEBP_SUPPORTED = features.check("webp")
+
+
+def pick_rendition_size(requested: Optional[int]) -> Optional[int]:
+    """
+    要求サイズ以上で最小の縮小版のサイズを返す
+    指定なし・最大サイズより大きい場合は None（元画像）
+    """
+    if requested is None:
+        return None
+    for size in AVATAR_SIZES:
+        if requested <= size:
+            return size
+    return None
+
+
+def validate_image(data: bytes) -> None:
+    """
+    画像として読み込めるかをヘッダーだけで確認する（デコードはしない）
+
+    Raises:
+        ValueError: 画像として読み込めない場合
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ValueError("画像ファイルを読み込めません") from e
+
+
+def render_avatar(data: bytes) -> Dict[int, Tuple[bytes, str]]:
+    """
+    縮小版を生成する
+
+    Returns:
+        Dict[int, Tuple[bytes, str]]: サイズ → (画像データ, MIMEタイプ)
+
+    Raises:
+        ValueError: 画像として読み込めない場合（画素数が多すぎる・デコードに失敗した場合を含む）
+    """
+    try:
+        return _render_avatar(data)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ValueError("画像ファイルを読み込めません") from e
+
+
+def _render_avatar(data: bytes) -> Dict[int, Tuple[bytes, str]]:
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if _WEBP_SUPPORTED:
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        image_format, content_type = "WEBP", "image/webp"
+    else:
+        image = image.convert("RGB")
+        image_format, content_type = "JPEG", "image/jpeg"
+
+    # 中央で正方形にトリミング
+    side = min(image.size)
+    left = (image.width - side) // 2
+    top = (image.height - side) // 2
+    square = image.crop((left, top, left + side, top + side))
+
+    renditions = {}
+    for size in AVATAR_SIZES:
+        resized = square.resize((size, size), Image.LANCZOS) if side > size else square
+        buffer = io.BytesIO()
+        resized.save(buffer, format=image_format, quality=80)
+        renditions[size] = (buffer.getvalue(), content_type)
+    return renditions
+
+
+async def store_renditions(db: AsyncSession, user_id: int, data: bytes) -> Dict[int, Tuple[bytes, str]]:
+    """
+    縮小版を生成して保存し直す（コミットは呼び出し側で行う）
+
+    Raises:
+        ValueError: 画像として読み込めない場合
+    """
+    renditions = await asyncio.to_thread(render_avatar, data)
+    await db.execute(delete(AvatarRendition).where(AvatarRendition.user_id == user_id))
+    for size, (rendered, content_type) in renditions.items():
+        db.add(AvatarRendition(user_id=user_id, size=size, data=rendered, content_type=content_type))
+    return renditions
+
+
+@job_queue.handler("avatar_renditions", batch_size=10)
+async def generate_renditions(jobs: List[dict]) -> None:
+    """アップロードされたアバターの縮小版を生成する"""
+    # 同じユーザーの連続アップロードは最後の1件だけ処理する
+    latest = {job["user_id"]: job["etag"] for job in jobs}
+    async with AsyncSessionLocal() as db:
+        for user_id, etag in latest.items():
+            result = await db.execute(
+                select(UserAvatar.data).where(UserAvatar.user_id == user_id, UserAvatar.etag == etag)
+            )
+            data = result.scalar()
+            if data is None:
+                # 既に別の画像に差し替えられている
+                continue
+            try:
+                await store_renditions(db, user_id, data)
+            except ValueError as e:
+                print(f"❌ アバターの縮小版を生成できません (user_id={user_id}): {str(e)}")
+                continue
+            await db.commit()
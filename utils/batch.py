@@ -0,0 +1,38 @@
+"""
+一括取得（/knowledge/batch, /profile/batch）のヘルパー
+"""
+from typing import List
+
+from fastapi import HTTPException, status
+
+
+def parse_ids(ids: str, max_ids: int) -> List[int]:
+    """
+    カンマ区切りのIDを重複を除いて指定順のリストにする
+
+    Raises:
+        HTTPException: 形式が正しくない・件数が上限を超える場合（400）
+    """
+    parsed: List[int] = []
+    seen = set()
+    for value in ids.split(","):
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            item_id = int(value)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"IDの形式が正しくありません: {value}"
+            )
+        if item_id not in seen:
+            seen.add(item_id)
+            parsed.append(item_id)
+
+    if len(parsed) > max_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"一度に取得できるのは{max_ids}件までです"
+        )
+    return parsed
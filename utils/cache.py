@@ -0,0 +1,96 @@
+"""
+プロセス内キャッシュ
+
+件数上限つきのTTL/LRUキャッシュ。ヒット・ミス・追い出し件数を
+utils.metrics に記録する
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+from utils.metrics import metrics
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    件数上限つきのTTL/LRUキャッシュ（スレッドセーフ）
+
+    Args:
+        name (str): メトリクス名の接頭辞
+        maxsize (int): 保持する最大件数（超えた場合は最も古く使われたものから追い出す）
+        ttl (float): エントリの有効秒数
+        on_evict (Callable | None): エントリが取り除かれたとき（追い出し・期限切れ・
+            無効化・上書き）に (キー, 値) で呼ばれる。ロックの外で呼ぶ
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 1024,
+        ttl: float = 60.0,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.register_gauge(f"cache.{name}.size", lambda: len(self._data))
+
+    def _notify(self, removed: List[Tuple[Hashable, Any]]) -> None:
+        if self.on_evict is not None:
+            for key, value in removed:
+                self.on_evict(key, value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        removed = []
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                expires_at, value = item
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    metrics.incr(f"cache.{self.name}.hits")
+                    return value
+                del self._data[key]
+                removed.append((key, value))
+        self._notify(removed)
+        metrics.incr(f"cache.{self.name}.misses")
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        removed = []
+        with self._lock:
+            previous = self._data.pop(key, _MISSING)
+            if previous is not _MISSING:
+                removed.append((key, previous[1]))
+            self._data[key] = (expires_at, value)
+            evicted = 0
+            while len(self._data) > self.maxsize:
+                evicted_key, (_, evicted_value) = self._data.popitem(last=False)
+                removed.append((evicted_key, evicted_value))
+                evicted += 1
+        if evicted:
+            metrics.incr(f"cache.{self.name}.evictions", evicted)
+        self._notify(removed)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        if item is not _MISSING:
+            self._notify([(key, item[1])])
+
+    def clear(self) -> None:
+        with self._lock:
+            removed = [(key, value) for key, (_, value) in self._data.items()]
+            self._data.clear()
+        self._notify(removed)
+
+    def __len__(self) -> int:
+        return len(self._data)
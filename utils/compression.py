@@ -0,0 +1,231 @@
+"""
+レスポンスのエンコーディング（圧縮・MessagePack）をネゴシエーションするASGIミドルウェア
+
+- Accept-Encoding に応じて brotli / gzip で圧縮する（COMPRESSION_MIN_SIZE 未満は圧縮しない）
+- Accept で application/msgpack（または application/x-msgpack）を希望された場合は
+  JSONのレスポンスを MessagePack に変換する
+- ETag 付き・レスポンスキャッシュ済みのレスポンスは、変換・圧縮の結果をキャッシュして使い回す
+
+brotli と msgpack は任意の依存パッケージで、インストールされていない場合は
+その形式をネゴシエーションの候補にしない
+"""
+import asyncio
+import gzip
+import hashlib
+from typing import Dict, List, Optional
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.cache import TTLCache
+from utils.metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 優先する順（q値が同じ場合は先のものを選ぶ）
+SUPPORTED_ENCODINGS: List[str] = (["br"] if brotli is not None else []) + ["gzip"]
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# これより大きいレスポンスはイベントループを塞がないよう別スレッドで圧縮する
+THREAD_THRESHOLD = 256 * 1024
+
+
+def parse_qualities(header: str) -> Dict[str, float]:
+    """Accept / Accept-Encoding を {トークン: q値} に変換する"""
+    qualities = {}
+    for item in header.split(","):
+        token, *params = item.split(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[token] = quality
+    return qualities
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """使う圧縮形式を返す（圧縮しない場合はNone）"""
+    if not accept_encoding:
+        return None
+    qualities = parse_qualities(accept_encoding)
+    chosen, chosen_quality = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > chosen_quality:
+            chosen, chosen_quality = encoding, quality
+    return chosen
+
+
+def choose_msgpack(accept: Optional[str]) -> Optional[str]:
+    """MessagePackで返す場合はそのメディアタイプを返す（JSONのままの場合はNone）"""
+    if msgpack is None or not accept:
+        return None
+    qualities = parse_qualities(accept)
+    media_type = max(MSGPACK_MEDIA_TYPES, key=lambda media_type: qualities.get(media_type, 0.0))
+    quality = qualities.get(media_type, 0.0)
+    if quality <= 0:
+        return None
+    json_quality = qualities.get(
+        "application/json",
+        qualities.get("application/*", qualities.get("*/*", 0.0)),
+    )
+    return media_type if quality >= json_quality else None
+
+
+def compress(body: bytes, encoding: str, gzip_level: int, brotli_quality: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class ContentEncodingMiddleware:
+    """
+    JSONのレスポンスを Accept / Accept-Encoding に応じて変換・圧縮する
+
+    次のレスポンスはそのまま通す
+    - ストリーミングのレスポンス（複数チャンクで送られるもの）
+    - 添付ファイル（Content-Disposition あり）と部分取得（Content-Range あり）。
+      JSONのファイルでも本文はAPIのレスポンスではなく、Content-Range は元のバイト列を指すため
+    - 200以外のレスポンス
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        cache_size: int = 512,
+        cache_ttl: float = 300.0,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = TTLCache("encoded_response", maxsize=cache_size, ttl=cache_ttl)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        responder = _EncodingResponder(
+            self,
+            send,
+            encoding=choose_encoding(headers.get("accept-encoding")),
+            msgpack_type=choose_msgpack(headers.get("accept")),
+        )
+        await self.app(scope, receive, responder.send)
+
+    async def encode(self, body: bytes, target: str, cacheable: bool) -> bytes:
+        """
+        body を target（"msgpack" または圧縮形式）に変換する
+        cacheable の場合は本文のハッシュをキーに結果をキャッシュする
+        """
+        key = None
+        if cacheable:
+            key = (hashlib.blake2b(body, digest_size=16).digest(), target)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        if target == "msgpack":
+            encoded = msgpack.packb(orjson.loads(body))
+        elif len(body) >= THREAD_THRESHOLD:
+            encoded = await asyncio.to_thread(compress, body, target, self.gzip_level, self.brotli_quality)
+        else:
+            encoded = compress(body, target, self.gzip_level, self.brotli_quality)
+
+        if key is not None:
+            self.cache.set(key, encoded)
+        return encoded
+
+
+class _EncodingResponder:
+    """1リクエスト分のレスポンスを受け取り、必要に応じて変換してから送る"""
+
+    def __init__(
+        self,
+        middleware: ContentEncodingMiddleware,
+        send: Send,
+        encoding: Optional[str],
+        msgpack_type: Optional[str],
+    ):
+        self.middleware = middleware
+        self._send = send
+        self.encoding = encoding
+        self.msgpack_type = msgpack_type
+        self.start: Optional[Message] = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # 本文を見てから変換するか決めるため、ヘッダーの送信を遅らせる
+            self.start = message
+            return
+
+        start, self.start = self.start, None
+        if start is None:
+            await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or message.get("more_body", False):
+            # ストリーミングやゼロコピー送信はそのまま通す
+            await self._send(start)
+            await self._send(message)
+            return
+
+        await self._send_encoded(start, message.get("body", b""))
+
+    async def _send_encoded(self, start: Message, body: bytes) -> None:
+        headers = MutableHeaders(raw=list(start.get("headers", [])))
+        content_type = headers.get("content-type", "")
+        is_file = "content-disposition" in headers or "content-range" in headers
+        is_json = content_type.startswith("application/json") and not is_file
+        if is_json or start["status"] == 304:
+            # 304にも付け、キャッシュがエンコーディングの異なる表現を取り違えないようにする
+            headers.add_vary_header("Accept")
+            headers.add_vary_header("Accept-Encoding")
+
+        eligible = is_json and start["status"] == 200 and "content-encoding" not in headers and len(body) > 0
+        if eligible:
+            # ETag付き、またはレスポンスキャッシュから返す内容は何度も同じ本文になる
+            cacheable = "etag" in headers or "x-cache" in headers
+
+            if self.msgpack_type is not None:
+                try:
+                    body = await self.middleware.encode(body, "msgpack", cacheable)
+                    headers["content-type"] = self.msgpack_type
+                    metrics.incr("encoding.msgpack")
+                except ValueError as e:
+                    # JSONとして読めない本文はJSONのまま返す（orjson.JSONDecodeError は ValueError）
+                    print(f"❌ MessagePackへの変換に失敗しました: {str(e)}")
+
+            if self.encoding is not None and len(body) >= self.middleware.minimum_size:
+                compressed = await self.middleware.encode(body, self.encoding, cacheable)
+                if len(compressed) < len(body):
+                    metrics.incr(f"compression.{self.encoding}")
+                    metrics.incr("compression.bytes_in", len(body))
+                    metrics.incr("compression.bytes_out", len(compressed))
+                    body = compressed
+                    headers["content-encoding"] = self.encoding
+
+            headers["content-length"] = str(len(body))
+
+        await self._send(dict(start, headers=headers.raw))
+        await self._send({"type": "http.response.body", "body": body, "more_body": False})
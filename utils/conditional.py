@@ -0,0 +1,78 @@
+"""
+HTTPの条件付きGET（ETag / Last-Modified）のヘルパー
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request
+
+
+def http_date(value: datetime) -> str:
+    """naiveなUTC日時をHTTP-date形式に変換する"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def weak_etag(*parts) -> str:
+    """更新日時やカウンタなどの値から弱いETagを作る"""
+    source = "|".join("" if part is None else str(part) for part in parts)
+    return f'W/"{hashlib.blake2b(source.encode(), digest_size=12).hexdigest()}"'
+
+
+def validator_headers(
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    cache_control: str = "private, no-cache",
+) -> Dict[str, str]:
+    """
+    ETag / Last-Modified / Cache-Control のヘッダーを作る
+    既定の "private, no-cache" はブラウザに保存させつつ、使う前に毎回再検証させる
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # 弱いETag（W/"..."）も比較対象とする
+    candidates = [tag.strip() for tag in header.split(",")]
+    normalized = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == normalized
+        for candidate in candidates
+    )
+
+
+def is_not_modified(
+    request: Request,
+    etag: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+) -> bool:
+    """
+    リクエストの If-None-Match / If-Modified-Since からキャッシュが有効か判定する
+    If-None-Match がある場合はそちらを優先する（RFC 9110）
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag is not None and _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified
+        if modified.tzinfo is None:
+            modified = modified.replace(tzinfo=timezone.utc)
+        # HTTP-dateは秒単位のため切り捨てて比較する
+        return modified.replace(microsecond=0) <= since
+    return False
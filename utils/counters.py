@@ -0,0 +1,194 @@
+"""
+非正規化カウンタの更新と整合性チェック
+
+- ナレッジごと: comment_count / file_count
+- ユーザーごと（user_stats）: knowledge_count / comment_count / total_views / last_activity_at
+
+使い方（カウンタの再計算）:
+    python -m utils.counters
+"""
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, update, insert, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.knowledge import Knowledge
+from models.comment import Comment
+from models.file import File as FileModel
+from models.user import User
+from models.user_stats import UserStats
+
+
+async def adjust_knowledge_counters(
+    db: AsyncSession,
+    knowledge_id: int,
+    comments: int = 0,
+    files: int = 0
+) -> None:
+    """
+    カウンタをSQL側で加算する（UPDATE ... SET x = x + n）
+    コミットは呼び出し側で行い、子レコードの追加・削除と同じトランザクションに含める
+    本文の更新ではないため updated_at は変えない
+    """
+    values = {}
+    if comments:
+        values["comment_count"] = Knowledge.comment_count + comments
+    if files:
+        values["file_count"] = Knowledge.file_count + files
+    if not values:
+        return
+    await db.execute(
+        update(Knowledge)
+        .where(Knowledge.id == knowledge_id)
+        # updated_at の onupdate が走らないよう現在値のまま指定する
+        .values(**values, updated_at=Knowledge.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def adjust_user_stats(
+    db: AsyncSession,
+    user_id: int,
+    knowledge: int = 0,
+    comments: int = 0,
+    views: int = 0,
+    activity_at: Optional[datetime] = None
+) -> None:
+    """
+    ユーザーの集計値をSQL側で加算する（コミットは呼び出し側で行う）
+    activity_at を指定した場合は last_activity_at も更新する
+    """
+    values = {}
+    if knowledge:
+        values["knowledge_count"] = UserStats.knowledge_count + knowledge
+    if comments:
+        values["comment_count"] = UserStats.comment_count + comments
+    if views:
+        values["total_views"] = UserStats.total_views + views
+    if activity_at is not None:
+        values["last_activity_at"] = activity_at
+    if not values:
+        return
+    await db.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def reconcile_knowledge_counters(db: AsyncSession) -> int:
+    """
+    子テーブルの実件数とカウンタがずれているナレッジを修正する
+
+    Returns:
+        int: 修正したナレッジ数
+    """
+    actual_comments = (
+        select(func.count(Comment.id))
+        .where(Comment.knowledge_id == Knowledge.id)
+        .correlate(Knowledge)
+        .scalar_subquery()
+    )
+    actual_files = (
+        select(func.count(FileModel.id))
+        .where(FileModel.knowledge_id == Knowledge.id)
+        .correlate(Knowledge)
+        .scalar_subquery()
+    )
+
+    result = await db.execute(
+        select(Knowledge.id, actual_comments.label("comments"), actual_files.label("files"))
+        .where(or_(
+            Knowledge.comment_count != actual_comments,
+            Knowledge.file_count != actual_files,
+        ))
+    )
+    mismatches = result.all()
+
+    for knowledge_id, comments, files in mismatches:
+        await db.execute(
+            update(Knowledge)
+            .where(Knowledge.id == knowledge_id)
+            .values(comment_count=comments, file_count=files, updated_at=Knowledge.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    return len(mismatches)
+
+
+async def reconcile_user_stats(db: AsyncSession) -> int:
+    """
+    user_stats を実データから再計算し、ずれている（または行のない）ユーザーを修正する
+    last_activity_at は加算ではないため対象外
+
+    Returns:
+        int: 修正したユーザー数
+    """
+    actual_knowledge = (
+        select(func.count(Knowledge.id))
+        .where(Knowledge.author_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    actual_comments = (
+        select(func.count(Comment.id))
+        .where(Comment.author_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    actual_views = (
+        select(func.coalesce(func.sum(Knowledge.views), 0))
+        .where(Knowledge.author_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+
+    result = await db.execute(
+        select(
+            User.id,
+            UserStats.user_id,
+            actual_knowledge.label("knowledge"),
+            actual_comments.label("comments"),
+            actual_views.label("views"),
+        )
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(or_(
+            UserStats.user_id.is_(None),
+            UserStats.knowledge_count != actual_knowledge,
+            UserStats.comment_count != actual_comments,
+            UserStats.total_views != actual_views,
+        ))
+    )
+    mismatches = result.all()
+
+    for user_id, stats_user_id, knowledge, comments, views in mismatches:
+        values = dict(knowledge_count=knowledge, comment_count=comments, total_views=views)
+        if stats_user_id is None:
+            await db.execute(insert(UserStats).values(user_id=user_id, **values))
+        else:
+            await db.execute(
+                update(UserStats)
+                .where(UserStats.user_id == user_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+    await db.commit()
+    return len(mismatches)
+
+
+async def _main():
+    from models.database import AsyncSessionLocal, engine
+
+    async with AsyncSessionLocal() as db:
+        fixed = await reconcile_knowledge_counters(db)
+        fixed_users = await reconcile_user_stats(db)
+    await engine.dispose()
+    print(f"✅ カウンタを修正したナレッジ数: {fixed}")
+    print(f"✅ 集計値を修正したユーザー数: {fixed_users}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,38 +1,57 @@
+"""
+データベースの死活確認
+
+ロードバランサーのヘルスチェックから呼ばれるため、SELECT 1 だけを実行する
+（テーブル走査や同期的なsleepを含めない）
+
+    python -m utils.db_check   # 手動で1回確認する
+"""
+import asyncio
+import sys
+import time
+
 from sqlalchemy import text
+
 from models.database import engine
-import time
 
-def check_database_connection():
-    max_retries = 3
-    retry_delay = 2  # seconds
-
-    for attempt in range(max_retries):
-        try:
-            # データベース接続をテスト
-            with engine.connect() as connection:
-                # 基本的な接続テスト
-                connection.execute(text("SELECT 1"))
-                print(f"✅ データベース接続テスト成功 (試行回数: {attempt + 1})")
-                
-                # ユーザーテーブルの存在確認
-                result = connection.execute(text("SHOW TABLES"))
-                tables = [row[0] for row in result]
-                print(f"✅ 確認されたテーブル: {', '.join(tables)}")
-                
-                # ユーザー数の確認
-                result = connection.execute(text("SELECT COUNT(*) FROM users"))
-                user_count = result.scalar()
-                print(f"✅ ユーザー数: {user_count}")
-                
-                return True
-        except Exception as e:
-            print(f"❌ データベース接続エラー (試行回数: {attempt + 1}): {str(e)}")
-            if attempt < max_retries - 1:
-                print(f"⏳ {retry_delay}秒後に再試行します...")
-                time.sleep(retry_delay)
-            else:
-                print("❌ 最大試行回数に達しました。データベース接続に失敗しました。")
-                return False
+
+async def ping_database(timeout: float) -> float:
+    """
+    SELECT 1 を実行する
+
+    Returns:
+        float: 応答までの秒数
+
+    Raises:
+        Exception: 接続できない・timeout 秒以内に応答がない場合
+    """
+    start = time.perf_counter()
+
+    async def _ping():
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await asyncio.wait_for(_ping(), timeout=timeout)
+    return time.perf_counter() - start
+
+
+async def check_database_connection(timeout: float = 5.0) -> bool:
+    try:
+        elapsed = await ping_database(timeout)
+    except Exception as e:
+        print(f"❌ データベース接続エラー: {str(e) or type(e).__name__}")
+        return False
+    print(f"✅ データベース接続テスト成功 ({elapsed * 1000:.1f}ms)")
+    return True
+
+
+async def _main() -> bool:
+    # 接続プールは作成したイベントループの中で閉じる
+    try:
+        return await check_database_connection()
+    finally:
+        await engine.dispose()
+
 
 if __name__ == "__main__":
-    check_database_connection() 
\ No newline at end of file
+    sys.exit(0 if asyncio.run(_main()) else 1)
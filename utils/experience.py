@@ -1,58 +1,171 @@
-from sqlalchemy.orm import Session
+"""
+経験値の付与
+
+付与はバックグラウンドジョブ（utils.jobs）として登録し、リクエストはすぐに返す
+ジョブはユーザーごとにまとめて1つのUPDATE文でSQL側で加算し、
+付与履歴（user_activities）を同じトランザクションでまとめて追記する
+
+ジョブは少なくとも1回実行される（再実行されうる）ため、付与ごとに award_id を振り、
+user_activities の一意制約で反映済みの付与をスキップする
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, select, update
+
+from core.security import invalidate_principal
+from models.database import AsyncSessionLocal
 from models.user import User
-from typing import Tuple, Dict, Any
+from models.user_activity import UserActivity
+from utils.jobs import job_queue
+from utils.leaderboard import leaderboard
+from utils.response_cache import response_cache
 
-def add_experience(user: User, xp: int, db: Session) -> Dict[str, Any]:
-    """
-    ユーザーに経験値を追加し、レベルアップの処理を行う
+# 1レベル上がるのに必要な経験値（全レベル共通）
+REQUIRED_XP = 100
 
-    Args:
-        user (User): 経験値を追加するユーザー
-        xp (int): 追加する経験値
-        db (Session): データベースセッション
+# 行動ごとの獲得経験値
+KNOWLEDGE_XP = 10
+COMMENT_XP = 5
+
+
+def levels_gained(xp_before, xp):
+    """レベル内の経験値 xp_before に xp を加えたときに上がるレベル数（SQL式にも使える）"""
+    return (xp_before + xp) // REQUIRED_XP
+
+
+def preview_experience(user, xp: int) -> Dict[str, Any]:
+    """
+    付与後のレベル・経験値を、手元のユーザー情報から計算する（DBは更新しない）
 
     Returns:
-        Dict[str, Any]: 
-            - leveled_up (bool): レベルアップしたかどうか
+        Dict[str, Any]:
+            - level_up (bool): レベルアップしたかどうか
             - before_level (int): 追加前のレベル
             - before_xp (int): 追加前の経験値
             - after_level (int): 追加後のレベル
             - after_xp (int): 追加後の経験値
             - required_xp (int): 次のレベルに必要な経験値
-
-    Note:
-        - current_xpに経験値を加算
-        - pointsに経験値を加算
-        - レベルアップに必要な経験値に達した場合、レベルアップ処理を実行
-        - レベルアップ後の必要経験値は 100
-        - レベルアップした場合、experience_pointsに満たしたrequired_expを追加
     """
-    # 経験値追加前のレベルと経験値を記録
-    before_level = user.level
-    before_xp = user.current_xp
-    
-    user.current_xp += xp
-    required_xp = 100
-    
-    leveled_up = False
-    earned_required_xp = 0
-    
-    while user.current_xp >= required_xp:
-        user.current_xp -= required_xp
-        user.level += 1
-        leveled_up = True
-        earned_required_xp += required_xp
-    
-    if leveled_up:
-        user.experience_points += earned_required_xp
-    
-    db.commit()
-    
+    before_level = user.level or 0
+    before_xp = user.current_xp or 0
+    gained = levels_gained(before_xp, xp)
     return {
-        "level_up": leveled_up,
+        "level_up": gained > 0,
         "before_level": before_level,
         "before_xp": before_xp,
-        "after_level": user.level,
-        "after_xp": user.current_xp,
-        "required_xp": required_xp
-    }
\ No newline at end of file
+        "after_level": before_level + gained,
+        "after_xp": (before_xp + xp) % REQUIRED_XP,
+        "required_xp": REQUIRED_XP
+    }
+
+
+async def add_experience(user, xp: int, action: str) -> Dict[str, Any]:
+    """
+    ユーザーに経験値を付与する（ジョブとして登録し、すぐに返す）
+
+    Args:
+        user (User | CurrentUser): 経験値を追加するユーザー
+        xp (int): 追加する経験値
+        action (str): 付与の理由（user_activities.action に記録する）
+
+    Returns:
+        Dict[str, Any]: preview_experience の結果（同時に付与された分は含まない）
+    """
+    await job_queue.enqueue("experience", {
+        "award_id": str(uuid.uuid4()),
+        "user_id": user.id,
+        "email": user.email,
+        "xp": xp,
+        "action": action,
+        "awarded_at": datetime.utcnow().isoformat(),
+    })
+    return preview_experience(user, xp)
+
+
+@job_queue.handler("experience", batch_size=100)
+async def apply_experience(awards: List[dict]) -> None:
+    """
+    経験値の付与ジョブをまとめて反映する
+
+    Note:
+        - 読み取ってから書き戻すのではなく、ユーザーごとに1つのUPDATE文でSQL側で加算する
+          （同時に付与しても更新が失われない）
+        - 上がったレベル数は (current_xp + xp) DIV 100 の閉じた式で求める
+        - レベルアップした場合、experience_pointsに満たした必要経験値を追加
+        - 付与履歴は user_activities に同じトランザクションでまとめて追記する
+        - 冪等性: 反映済みの award_id はスキップする。付与履歴をUPDATEより先に挿入するため、
+          同じ付与を別ワーカーが同時に反映しようとした場合は一意制約違反で片方が失敗し、
+          ジョブの再試行時にスキップされる
+    """
+    emails: Dict[int, str] = {award["user_id"]: award["email"] for award in awards}
+
+    async with AsyncSessionLocal() as db:
+        award_ids = [award["award_id"] for award in awards if award.get("award_id")]
+        applied = set()
+        if award_ids:
+            applied = set((await db.scalars(
+                select(UserActivity.award_id).where(UserActivity.award_id.in_(award_ids))
+            )).all())
+        # 同じバッチ内の重複も1回だけ反映する
+        pending = []
+        for award in awards:
+            award_id = award.get("award_id")
+            if award_id is not None:
+                if award_id in applied:
+                    continue
+                applied.add(award_id)
+            pending.append(award)
+        if not pending:
+            return
+
+        totals: Dict[int, int] = defaultdict(int)
+        for award in pending:
+            totals[award["user_id"]] += award["xp"]
+
+        # 他のワーカーが同じ付与を先に反映していた場合は一意制約違反（IntegrityError）になり、
+        # このトランザクションは何も反映せずに終わる（ジョブの再試行時にスキップされる）
+        await db.execute(insert(UserActivity), [
+            {
+                "user_id": award["user_id"],
+                "action": award["action"],
+                "xp_amount": award["xp"],
+                "timestamp": datetime.fromisoformat(award["awarded_at"]),
+                "award_id": award.get("award_id"),
+            }
+            for award in pending
+        ])
+
+        for user_id, xp in totals.items():
+            gained = levels_gained(User.current_xp, xp)
+            # MySQLはSET句を左から順に評価し、後の式は更新後の値を参照するため current_xp は最後に更新する
+            await db.execute(
+                update(User)
+                .where(User.id == user_id)
+                .ordered_values(
+                    (User.level, User.level + gained),
+                    (User.experience_points, User.experience_points + gained * REQUIRED_XP),
+                    (User.current_xp, (User.current_xp + xp) % REQUIRED_XP),
+                )
+                .execution_options(synchronize_session=False)
+            )
+        result = await db.execute(
+            select(User.id, User.level, User.experience_points, User.points)
+            .where(User.id.in_(list(totals)))
+        )
+        users = result.all()
+        await db.commit()
+
+    # レベル・経験値がキャッシュ済みのプリンシパルと食い違わないようにする
+    # （他のワーカーのキャッシュにも共有ストア経由で伝わる）
+    await invalidate_principal(*emails.values())
+    # リーダーボードはこのワーカーの分をここで更新する
+    # （他のワーカーは下の user:{id} タグの無効化を見てDBから読み直す）
+    for user_id, level, experience_points, points in users:
+        leaderboard.update_user(user_id, level, experience_points, points)
+    for award in pending:
+        leaderboard.add_activity(award["user_id"])
+    # レベル・経験値を含むレスポンス（ランキング・プロフィール）のキャッシュを無効化する
+    await response_cache.invalidate("ranking", *(f"user:{user_id}" for user_id in emails))
@@ -0,0 +1,123 @@
+"""
+依存サービスの死活監視（/readyz 用）
+
+バックグラウンドで一定間隔ごとに各依存サービスを確認し、結果を保持する
+/readyz は保持している結果を返すだけなので、ヘルスチェックの頻度に関係なく
+DBへの問い合わせは間隔ごとに1回で、リクエスト処理をブロックしない
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from core.config import settings
+from utils.db_check import ping_database
+from utils.metrics import metrics
+from utils.storage import get_storage
+
+
+@dataclass
+class DependencyStatus:
+    ok: bool = False
+    latency: Optional[float] = None
+    error: Optional[str] = None
+    checked_at: Optional[float] = None  # time.monotonic()
+    checked_at_wall: Optional[datetime] = None
+
+
+class HealthMonitor:
+    """
+    依存サービスの状態を定期的に確認する
+
+    Args:
+        interval (float): 確認の間隔（秒）
+        timeout (float): 1回の確認のタイムアウト（秒）
+    """
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self._checks: Dict[str, Callable[[], Awaitable[object]]] = {}
+        self._critical: Dict[str, bool] = {}
+        self.statuses: Dict[str, DependencyStatus] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, check: Callable[[], Awaitable[object]], critical: bool = True) -> None:
+        """
+        確認処理を登録する
+        critical=False の依存サービスは状態を報告するだけで、準備完了の判定には使わない
+        """
+        self._checks[name] = check
+        self._critical[name] = critical
+        self.statuses[name] = DependencyStatus()
+        metrics.register_gauge(f"health.{name}.ok", lambda name=name: int(self.statuses[name].ok))
+
+    async def _check(self, name: str) -> None:
+        start = time.perf_counter()
+        status = DependencyStatus()
+        try:
+            await asyncio.wait_for(self._checks[name](), timeout=self.timeout)
+            status.ok = True
+        except Exception as e:
+            status.error = str(e) or type(e).__name__
+            metrics.incr(f"health.{name}.failures")
+        status.latency = time.perf_counter() - start
+        status.checked_at = time.monotonic()
+        status.checked_at_wall = datetime.utcnow()
+        self.statuses[name] = status
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(self._check(name) for name in self._checks))
+
+    def _is_fresh(self, status: DependencyStatus) -> bool:
+        # 監視タスクが止まっている場合に古い結果で「正常」と答えないようにする
+        return status.checked_at is not None and time.monotonic() - status.checked_at <= self.interval * 3
+
+    def is_ready(self) -> bool:
+        return all(
+            status.ok and self._is_fresh(status)
+            for name, status in self.statuses.items()
+            if self._critical[name]
+        )
+
+    def report(self) -> Dict[str, dict]:
+        """依存サービスごとの状態"""
+        return {
+            name: {
+                "status": "ok" if status.ok and self._is_fresh(status) else "error",
+                "critical": self._critical[name],
+                "latencyMs": round(status.latency * 1000, 1) if status.latency is not None else None,
+                "checkedAt": status.checked_at_wall.isoformat() + "Z" if status.checked_at_wall else None,
+                "error": status.error if not status.ok else (None if self._is_fresh(status) else "stale"),
+            }
+            for name, status in self.statuses.items()
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """定期確認のバックグラウンドタスクを開始する"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+health_monitor = HealthMonitor(
+    interval=settings.HEALTH_CHECK_INTERVAL,
+    timeout=settings.HEALTH_CHECK_TIMEOUT,
+)
+health_monitor.register("database", lambda: ping_database(settings.HEALTH_CHECK_TIMEOUT))
+# 添付ファイルのストレージが落ちていてもナレッジの閲覧はできるため、報告のみ
+health_monitor.register("storage", lambda: get_storage().ping(), critical=False)
@@ -0,0 +1,356 @@
+"""
+バックグラウンドジョブの実行基盤
+
+リクエスト処理から副作用（経験値の付与、画像の後処理など）を切り離し、
+ジョブとして登録してすぐにレスポンスを返す
+
+- ジョブはローカルのSQLiteファイル（スプール）に永続化する。プロセスが落ちても
+  未完了のジョブは次の起動時に再実行される
+- 同じマシン上の複数ワーカープロセスで1つのスプールを共有し、
+  取り出しは BEGIN IMMEDIATE で排他する
+- ワーカーは種類ごとに最大 batch_size 件をまとめて取り出してハンドラに渡す
+- ハンドラが失敗した場合は指数バックオフで再試行し、上限回数を超えたものは
+  dead として残す（自動では再実行しない）
+
+ハンドラは冪等に書くこと（処理後・削除前にプロセスが落ちると再実行される）
+"""
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from core.config import settings
+from utils.metrics import metrics
+
+JobHandler = Callable[[List[dict]], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class _Registration:
+    handler: JobHandler
+    batch_size: int
+
+
+@dataclass(frozen=True)
+class _Job:
+    id: int
+    payload: dict
+    attempts: int
+    created_at: float
+
+
+class JobSpool:
+    """
+    SQLiteファイルに保存するジョブのキュー
+    メソッドはブロッキングのため、呼び出し側でスレッドに逃がすこと
+    """
+
+    def __init__(self, path: str, lock_timeout: float):
+        self.path = path
+        self.lock_timeout = lock_timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    locked_by TEXT,
+                    locked_at REAL,
+                    last_error TEXT
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_jobs_type_status_available"
+                " ON jobs (type, status, available_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # 接続はスレッドごとに作る（sqlite3の接続はスレッド間で共有できない）
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def push(self, job_type: str, payload: dict, delay: float = 0.0) -> int:
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT INTO jobs (type, payload, available_at, created_at) VALUES (?, ?, ?, ?)",
+            (job_type, json.dumps(payload, ensure_ascii=False), now + delay, now),
+        )
+        return cursor.lastrowid
+
+    def claim(self, job_type: str, limit: int, owner: str) -> List[_Job]:
+        """実行可能なジョブを最大 limit 件取り出してロックする"""
+        now = time.time()
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute(
+                """
+                SELECT id, payload, attempts, created_at FROM jobs
+                WHERE type = ? AND status = 'pending' AND available_at <= ?
+                  AND (locked_by IS NULL OR locked_at < ?)
+                ORDER BY id
+                LIMIT ?
+                """,
+                (job_type, now, now - self.lock_timeout, limit),
+            ).fetchall()
+            if rows:
+                connection.executemany(
+                    "UPDATE jobs SET locked_by = ?, locked_at = ? WHERE id = ?",
+                    [(owner, now, row[0]) for row in rows],
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return [
+            _Job(id=row[0], payload=json.loads(row[1]), attempts=row[2], created_at=row[3])
+            for row in rows
+        ]
+
+    def release(self, job_ids: List[int]) -> None:
+        """ロックを外して、すぐに再実行できるようにする"""
+        self._connect().executemany(
+            "UPDATE jobs SET locked_by = NULL, locked_at = NULL WHERE id = ?",
+            [(job_id,) for job_id in job_ids],
+        )
+
+    def complete(self, job_ids: List[int]) -> None:
+        self._connect().executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def retry(self, jobs: List[_Job], error: str, delays: List[float]) -> None:
+        now = time.time()
+        self._connect().executemany(
+            """
+            UPDATE jobs SET attempts = attempts + 1, available_at = ?, last_error = ?,
+                            locked_by = NULL, locked_at = NULL
+            WHERE id = ?
+            """,
+            [(now + delay, error, job.id) for job, delay in zip(jobs, delays)],
+        )
+
+    def bury(self, jobs: List[_Job], error: str) -> None:
+        self._connect().executemany(
+            """
+            UPDATE jobs SET status = 'dead', attempts = attempts + 1, last_error = ?,
+                            locked_by = NULL, locked_at = NULL
+            WHERE id = ?
+            """,
+            [(error, job.id) for job in jobs],
+        )
+
+    def depth(self) -> Dict[str, Dict[str, int]]:
+        """種類・状態ごとの件数"""
+        result: Dict[str, Dict[str, int]] = {}
+        rows = self._connect().execute(
+            "SELECT type, status, COUNT(*) FROM jobs GROUP BY type, status"
+        ).fetchall()
+        for job_type, status, count in rows:
+            result.setdefault(job_type, {})[status] = count
+        return result
+
+
+class JobQueue:
+    """
+    ジョブの登録とワーカーの管理
+
+    Args:
+        spool_path (str): スプール（SQLiteファイル）のパス
+        workers (int): プロセスあたりのワーカー数
+        poll_interval (float): ジョブがないときに次に確認するまでの秒数
+        max_attempts (int): 再試行を含めた最大実行回数
+        retry_base_delay (float): 再試行までの待ち時間の初期値（秒、失敗のたびに倍）
+        retry_max_delay (float): 再試行までの待ち時間の上限（秒）
+        lock_timeout (float): 取り出したまま完了しないジョブを再実行するまでの秒数
+    """
+
+    def __init__(
+        self,
+        spool_path: str,
+        workers: int,
+        poll_interval: float,
+        max_attempts: int,
+        retry_base_delay: float,
+        retry_max_delay: float,
+        lock_timeout: float,
+    ):
+        self.spool_path = spool_path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.lock_timeout = lock_timeout
+        self._handlers: Dict[str, _Registration] = {}
+        self._spool: Optional[JobSpool] = None
+        self._spool_lock = threading.Lock()
+        self._owner = ""
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._depth: Dict[str, Dict[str, int]] = {}
+        metrics.register_gauge("jobs.pending", lambda: self._count("pending"))
+        metrics.register_gauge("jobs.dead", lambda: self._count("dead"))
+
+    @property
+    def spool(self) -> JobSpool:
+        # インポート時にファイルを作らないよう、最初に使うときに開く
+        if self._spool is None:
+            with self._spool_lock:
+                if self._spool is None:
+                    self._spool = JobSpool(self.spool_path, self.lock_timeout)
+        return self._spool
+
+    def _count(self, status: str) -> int:
+        return sum(counts.get(status, 0) for counts in self._depth.values())
+
+    def handler(self, job_type: str, batch_size: int = 1) -> Callable[[JobHandler], JobHandler]:
+        """
+        ジョブの種類にハンドラを登録するデコレータ
+        ハンドラは payload（dict）のリストを受け取る
+        """
+        def decorator(func: JobHandler) -> JobHandler:
+            self._handlers[job_type] = _Registration(handler=func, batch_size=batch_size)
+            return func
+        return decorator
+
+    async def enqueue(self, job_type: str, payload: dict, delay: float = 0.0) -> int:
+        """
+        ジョブを登録する（スプールに書き込んだ時点で返る）
+
+        Returns:
+            int: ジョブID
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"未登録のジョブの種類です: {job_type}")
+        job_id = await asyncio.to_thread(self.spool.push, job_type, payload, delay)
+        metrics.incr(f"jobs.{job_type}.enqueued")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempts))
+        # 同時に失敗したジョブが一斉に再実行されないようにばらつきを加える
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _run_batch(self, job_type: str, registration: _Registration) -> int:
+        jobs = await asyncio.to_thread(self.spool.claim, job_type, registration.batch_size, self._owner)
+        if not jobs:
+            return 0
+
+        now = time.time()
+        for job in jobs:
+            metrics.observe(f"jobs.{job_type}.latency", now - job.created_at)
+
+        start = time.perf_counter()
+        try:
+            await registration.handler([job.payload for job in jobs])
+        except asyncio.CancelledError:
+            # シャットダウン時は未完了として戻し、次の起動時に再実行する
+            self.spool.release([job.id for job in jobs])
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"❌ ジョブの実行に失敗しました ({job_type}, {len(jobs)}件): {error}")
+            retry = [job for job in jobs if job.attempts + 1 < self.max_attempts]
+            dead = [job for job in jobs if job.attempts + 1 >= self.max_attempts]
+            if retry:
+                await asyncio.to_thread(
+                    self.spool.retry, retry, error, [self._retry_delay(job.attempts) for job in retry]
+                )
+                metrics.incr(f"jobs.{job_type}.retried", len(retry))
+            if dead:
+                await asyncio.to_thread(self.spool.bury, dead, error)
+                metrics.incr(f"jobs.{job_type}.dead", len(dead))
+            return 0
+        finally:
+            metrics.observe(f"jobs.{job_type}.duration", time.perf_counter() - start)
+
+        await asyncio.to_thread(self.spool.complete, [job.id for job in jobs])
+        metrics.incr(f"jobs.{job_type}.processed", len(jobs))
+        return len(jobs)
+
+    async def run_once(self) -> int:
+        """登録されている種類ごとに1バッチずつ実行する"""
+        processed = 0
+        for job_type, registration in list(self._handlers.items()):
+            processed += await self._run_batch(job_type, registration)
+        return processed
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                processed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.incr("jobs.worker_errors")
+                print(f"❌ ジョブワーカーでエラーが発生しました: {str(e)}")
+                processed = 0
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _monitor(self) -> None:
+        # キューの深さはメトリクス用に定期的に集計しておく（/metrics でDBを読まないように）
+        while True:
+            try:
+                self._depth = await asyncio.to_thread(self.spool.depth)
+            except Exception as e:
+                print(f"❌ ジョブキューの集計に失敗しました: {str(e)}")
+            await asyncio.sleep(max(self.poll_interval, 5.0))
+
+    def start(self) -> None:
+        """ワーカーのバックグラウンドタスクを開始する"""
+        if self._tasks:
+            return
+        # preload でforkした後に決める（ワーカープロセスごとに別の値にする）
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._monitor()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._wakeup = None
+
+
+job_queue = JobQueue(
+    spool_path=settings.JOB_SPOOL_PATH,
+    workers=settings.JOB_WORKERS,
+    poll_interval=settings.JOB_POLL_INTERVAL,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    retry_base_delay=settings.JOB_RETRY_BASE_DELAY,
+    retry_max_delay=settings.JOB_RETRY_MAX_DELAY,
+    lock_timeout=settings.JOB_LOCK_TIMEOUT,
+)
@@ -0,0 +1,410 @@
+"""
+ランキング用のインメモリのリーダーボード
+
+指標（レベル・ポイント・アクティビティ数）ごとに幅つきスキップリスト
+（indexable skip list）を持ち、上位N件・自分の順位・前後のユーザーを O(log n) で返す
+
+- 起動後の初回アクセス時にDBから構築する
+- 経験値ジョブ（utils.experience.apply_experience）を実行したワーカーでは、その場で更新する
+- 他のワーカーは、ジョブが共有ストアに記録した user:{id} タグの無効化をランキングの読み込み時に確認し、
+  該当ユーザーだけDBから読み直す（共有ストアがない単一プロセス構成では不要）
+- アクティビティ数は user_activities の件数
+- DBの直接変更などそれ以外のずれは、定期的な整合性チェックで取り込む
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select, func
+
+from core.config import settings
+from models.database import AsyncSessionLocal
+from models.user import User
+from models.user_activity import UserActivity
+from utils.metrics import metrics
+from utils.response_cache import response_cache
+
+_MAX_LEVEL = 32
+
+# 他ワーカーでの変更を確認する際、時計のずれや書き込みの遅れを見込んで遡る秒数
+REFRESH_OVERLAP = 5.0
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * level
+        # width[i]: next[i] までに進む要素数（末尾の場合は残り要素数 + 1）
+        self.width: List[int] = [1] * level
+
+
+class IndexableSkipList:
+    """
+    順位（インデックス）でアクセスできるスキップリスト
+    キーは一意で、昇順に並ぶ
+    """
+
+    def __init__(self):
+        self._head = _Node(None, _MAX_LEVEL)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _random_level() -> int:
+        level = 1
+        while level < _MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key) -> None:
+        chain = [self._head] * _MAX_LEVEL
+        steps_at_level = [0] * _MAX_LEVEL
+        node = self._head
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        new_level = self._random_level()
+        new_node = _Node(key, new_level)
+        steps = 0
+        for level in range(new_level):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(new_level, _MAX_LEVEL):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key) -> None:
+        chain = [self._head] * _MAX_LEVEL
+        node = self._head
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), _MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def rank(self, key) -> int:
+        """key より小さいキーの件数"""
+        node = self._head
+        position = 0
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def iter_from(self, index: int) -> Iterator:
+        """index番目（0始まり）以降のキーを順に返す"""
+        if index < 0 or index >= self._size:
+            return
+        node = self._head
+        remaining = index + 1
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+
+class Leaderboard:
+    """
+    1つの指標のリーダーボード
+
+    スコアは「大きいほど上位」のタプル。内部では符号を反転したキー
+    (-score..., user_id) を昇順に並べる
+    """
+
+    def __init__(self):
+        self._list = IndexableSkipList()
+        self._keys: Dict[int, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self._list)
+
+    @staticmethod
+    def _key(user_id: int, score: tuple) -> tuple:
+        return tuple(-value for value in score) + (user_id,)
+
+    def score(self, user_id: int) -> Optional[tuple]:
+        key = self._keys.get(user_id)
+        if key is None:
+            return None
+        return tuple(-value for value in key[:-1])
+
+    def update(self, user_id: int, score: tuple) -> bool:
+        """
+        スコアを設定する
+
+        Returns:
+            bool: 値が変わった場合True
+        """
+        key = self._key(user_id, score)
+        old_key = self._keys.get(user_id)
+        if old_key == key:
+            return False
+        if old_key is not None:
+            self._list.remove(old_key)
+        self._list.insert(key)
+        self._keys[user_id] = key
+        return True
+
+    def discard(self, user_id: int) -> bool:
+        key = self._keys.pop(user_id, None)
+        if key is None:
+            return False
+        self._list.remove(key)
+        return True
+
+    def user_ids(self) -> List[int]:
+        return list(self._keys)
+
+    def rank_of_score(self, score: tuple) -> int:
+        """そのスコアの順位（同点は同順位、1始まり）"""
+        # 同じスコアのどのユーザーIDよりも小さいキーで検索し、上位の件数を数える
+        return self._list.rank(self._key(-1, score)) + 1
+
+    def rank(self, user_id: int) -> Optional[int]:
+        score = self.score(user_id)
+        if score is None:
+            return None
+        return self.rank_of_score(score)
+
+    def top(self, limit: int) -> List[Tuple[int, tuple]]:
+        return self.slice(0, limit)
+
+    def slice(self, start: int, limit: int) -> List[Tuple[int, tuple]]:
+        """start番目（0始まり）から limit 件の (user_id, score) を返す"""
+        entries = []
+        for key in self._list.iter_from(max(start, 0)):
+            if len(entries) >= limit:
+                break
+            entries.append((key[-1], tuple(-value for value in key[:-1])))
+        return entries
+
+    def position(self, user_id: int) -> Optional[int]:
+        """並び順での位置（0始まり、同点でも一意）"""
+        key = self._keys.get(user_id)
+        if key is None:
+            return None
+        return self._list.rank(key)
+
+
+class LeaderboardService:
+    """レベル・ポイント・アクティビティの各リーダーボードの管理"""
+
+    METRICS = ("level", "points", "activity")
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self.boards: Dict[str, Leaderboard] = {metric: Leaderboard() for metric in self.METRICS}
+        self._activity_counts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._load_lock = asyncio.Lock()
+        self._loaded = False
+        # 他ワーカーでの変更をどの時刻まで取り込んだか、取り込み済みの {タグ: 無効化の時刻}
+        self._refreshed_at = 0.0
+        self._applied_invalidations: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        for metric in self.METRICS:
+            metrics.register_gauge(f"leaderboard.{metric}.size", lambda metric=metric: len(self.boards[metric]))
+
+    def update_user(self, user_id: int, level: int, experience_points: int, points: int) -> None:
+        """ユーザーのレベル・経験値・ポイントを反映する"""
+        with self._lock:
+            self.boards["level"].update(user_id, (level or 0, experience_points or 0))
+            self.boards["points"].update(user_id, (points or 0,))
+
+    def add_activity(self, user_id: int, count: int = 1) -> None:
+        """アクティビティ数を加算する"""
+        with self._lock:
+            total = self._activity_counts.get(user_id, 0) + count
+            self._set_activity_locked(user_id, total)
+
+    def _set_activity_locked(self, user_id: int, total: int) -> bool:
+        # アクティビティのないユーザーはランキング対象外（従来のINNER JOINと同じ）
+        if total <= 0:
+            self._activity_counts.pop(user_id, None)
+            return self.boards["activity"].discard(user_id)
+        self._activity_counts[user_id] = total
+        return self.boards["activity"].update(user_id, (total,))
+
+    def top(self, metric: str, limit: int) -> List[Tuple[int, tuple]]:
+        with self._lock:
+            return self.boards[metric].top(limit)
+
+    def around(self, metric: str, user_id: int, radius: int) -> List[Tuple[int, int, tuple]]:
+        """自分の前後 radius 件を (並び順の位置(1始まり), user_id, score) で返す"""
+        with self._lock:
+            board = self.boards[metric]
+            position = board.position(user_id)
+            if position is None:
+                return []
+            start = max(position - radius, 0)
+            entries = board.slice(start, position - start + radius + 1)
+        return [(start + offset + 1, entry_user_id, score) for offset, (entry_user_id, score) in enumerate(entries)]
+
+    def my_ranks(self, user_id: int, level: int, experience_points: int, points: int) -> Dict[str, int]:
+        """各指標での順位（同点は同順位）"""
+        with self._lock:
+            activity = self._activity_counts.get(user_id, 0)
+            return {
+                "level": self.boards["level"].rank_of_score((level or 0, experience_points or 0)),
+                "points": self.boards["points"].rank_of_score((points or 0,)),
+                "activity": self.boards["activity"].rank_of_score((activity,)),
+            }
+
+    async def reconcile(self) -> int:
+        """
+        DBの値と突き合わせ、ずれているユーザーを修正する
+
+        Returns:
+            int: 修正した件数
+        """
+        started_at = time.time()
+        async with AsyncSessionLocal() as db:
+            users = (await db.execute(
+                select(User.id, User.level, User.experience_points, User.points)
+            )).all()
+            activity_rows = (await db.execute(
+                select(UserActivity.user_id, func.count(UserActivity.id))
+                .group_by(UserActivity.user_id)
+            )).all()
+
+        fixed = 0
+        with self._lock:
+            user_ids = set()
+            for user_id, level, experience_points, points in users:
+                user_ids.add(user_id)
+                fixed += self.boards["level"].update(user_id, (level or 0, experience_points or 0))
+                fixed += self.boards["points"].update(user_id, (points or 0,))
+
+            activity_counts = dict(activity_rows)
+            for user_id in set(self._activity_counts) | set(activity_counts):
+                fixed += self._set_activity_locked(user_id, activity_counts.get(user_id, 0))
+
+            for metric in ("level", "points"):
+                for user_id in self.boards[metric].user_ids():
+                    if user_id not in user_ids:
+                        fixed += self.boards[metric].discard(user_id)
+            # これより前の変更は全件の突き合わせに含まれている
+            self._refreshed_at = max(self._refreshed_at, started_at)
+        return fixed
+
+    async def refresh_changed(self) -> int:
+        """
+        他のワーカーで経験値ジョブが更新したユーザーをDBから読み直す
+
+        Returns:
+            int: 読み直したユーザー数
+        """
+        now = time.time()
+        since = self._refreshed_at - REFRESH_OVERLAP
+        invalidations = await response_cache.shared_invalidations_since(since, "user:")
+        self._refreshed_at = max(self._refreshed_at, now)
+
+        changed = {}
+        for tag, invalidated_at in invalidations.items():
+            if self._applied_invalidations.get(tag) == invalidated_at:
+                continue
+            try:
+                changed[int(tag[len("user:"):])] = (tag, invalidated_at)
+            except ValueError:
+                continue
+        # 遡る範囲より古い記録は二度と参照しない
+        self._applied_invalidations = {
+            tag: invalidated_at
+            for tag, invalidated_at in self._applied_invalidations.items()
+            if invalidated_at > since
+        }
+        if not changed:
+            return 0
+
+        user_ids = list(changed)
+        async with AsyncSessionLocal() as db:
+            users = (await db.execute(
+                select(User.id, User.level, User.experience_points, User.points)
+                .where(User.id.in_(user_ids))
+            )).all()
+            activity_counts = dict((await db.execute(
+                select(UserActivity.user_id, func.count(UserActivity.id))
+                .where(UserActivity.user_id.in_(user_ids))
+                .group_by(UserActivity.user_id)
+            )).all())
+
+        with self._lock:
+            found = set()
+            for user_id, level, experience_points, points in users:
+                found.add(user_id)
+                self.boards["level"].update(user_id, (level or 0, experience_points or 0))
+                self.boards["points"].update(user_id, (points or 0,))
+            for user_id in user_ids:
+                if user_id not in found:
+                    self.boards["level"].discard(user_id)
+                    self.boards["points"].discard(user_id)
+                self._set_activity_locked(user_id, activity_counts.get(user_id, 0))
+            self._applied_invalidations.update(changed.values())
+        metrics.incr("leaderboard.refreshed", len(user_ids))
+        return len(user_ids)
+
+    async def ensure_loaded(self) -> None:
+        """初回アクセス時に構築し、以降は他ワーカーでの変更を取り込む"""
+        if not self._loaded:
+            async with self._load_lock:
+                if not self._loaded:
+                    await self.reconcile()
+                    self._loaded = True
+        await self.refresh_changed()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                fixed = await self.reconcile()
+                self._loaded = True
+                if fixed:
+                    metrics.incr("leaderboard.reconciled", fixed)
+                    await response_cache.invalidate("ranking")
+            except Exception as e:
+                metrics.incr("leaderboard.reconcile_errors")
+                print(f"❌ ランキングの整合性チェックに失敗しました: {str(e)}")
+
+    def start(self) -> None:
+        """定期的な整合性チェックを開始する"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+leaderboard = LeaderboardService(check_interval=settings.LEADERBOARD_CHECK_INTERVAL)
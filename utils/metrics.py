@@ -0,0 +1,92 @@
+"""
+プロセス内のメトリクス集計
+
+カウンタ・ゲージ・レイテンシを1か所に集め、/metrics エンドポイントから
+JSONで参照できるようにする（外部の監視サービスには依存しない）
+"""
+import threading
+from collections import deque
+from typing import Callable, Dict, Any
+
+
+class LatencyStats:
+    """レイテンシの件数・平均・最大と直近サンプルのパーセンタイルを保持する"""
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self._samples.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            index = min(len(samples) - 1, int(round(p * (len(samples) - 1))))
+            return samples[index] * 1000
+
+        return {
+            "count": self.count,
+            "avgMs": (self.total / self.count * 1000) if self.count else 0.0,
+            "maxMs": self.max * 1000,
+            "p50Ms": percentile(0.50),
+            "p95Ms": percentile(0.95),
+            "p99Ms": percentile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """スレッドセーフなメトリクスレジストリ"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._latencies: Dict[str, LatencyStats] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+
+    def incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._latencies.get(name)
+            if stats is None:
+                stats = self._latencies[name] = LatencyStats()
+            stats.observe(seconds)
+
+    def register_gauge(self, name: str, func: Callable[[], Any]) -> None:
+        """参照時に値を計算するゲージを登録する"""
+        with self._lock:
+            self._gauges[name] = func
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            latencies = {name: stats.snapshot() for name, stats in self._latencies.items()}
+            gauges = dict(self._gauges)
+
+        gauge_values = {}
+        for name, func in gauges.items():
+            try:
+                gauge_values[name] = func()
+            except Exception as e:
+                gauge_values[name] = f"error: {str(e)}"
+
+        return {
+            "counters": counters,
+            "gauges": gauge_values,
+            "latencies": latencies,
+        }
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,135 @@
+"""
+HTTP Range（部分取得）対応のファイルレスポンス
+"""
+import asyncio
+import os
+from typing import AsyncIterator, Mapping, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from utils.metrics import metrics
+
+# ASGIサーバーがゼロコピー送信に対応している場合の拡張名
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+def parse_range(request: Request, size: int, etag: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    Range ヘッダーを解釈して (開始位置, 終了位置) を返す（両端を含む）
+    Rangeがない・If-Rangeが一致しない・複数範囲の場合は None（全体を返す）
+
+    Raises:
+        HTTPException: 範囲が満たせない場合（416）
+    """
+    header = request.headers.get("range")
+    if not header:
+        return None
+
+    if_range = request.headers.get("if-range")
+    if if_range is not None and (etag is None or if_range.strip() != etag):
+        return None
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            # bytes=-N（末尾Nバイト）
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+            end = min(end, size - 1)
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="指定された範囲を返せません",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+class ZeroCopyFileResponse(Response):
+    """
+    ローカルファイルの一部を送るレスポンス
+
+    ASGIサーバーが zerocopysend 拡張に対応していれば sendfile で送り、
+    未対応ならチャンク単位で読みながら送る（いずれもファイル全体をメモリに載せない）
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        start: int,
+        length: int,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+    ):
+        self.path = path
+        self.start = start
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.body = b""
+        self.init_headers(headers)
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope.get("method") == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with open(self.path, "rb") as f:
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                metrics.incr("file_download.zerocopy")
+                await send({
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": f.fileno(),
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+
+            f.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def range_streaming_response(
+    iterator: AsyncIterator[bytes],
+    length: int,
+    status_code: int,
+    headers: Mapping[str, str],
+    media_type: Optional[str],
+) -> StreamingResponse:
+    """ストレージからのチャンクをそのまま流すレスポンス"""
+    response = StreamingResponse(iterator, status_code=status_code, headers=dict(headers), media_type=media_type)
+    response.headers["content-length"] = str(length)
+    return response
@@ -0,0 +1,335 @@
+"""
+GETレスポンスのキャッシュ（タグによる無効化つき）
+
+読み込みに比べて更新の少ないエンドポイント（ランキング・人気ナレッジ・
+一覧の1ページ目・ユーザーのプロフィール）のJSONを、シリアライズ済みのバイト列で保持する
+
+- キーはルート名と正規化したパラメータから作る
+- エントリには関連するエンティティのタグ（"knowledge:42", "user:7" など）を付ける
+- 更新系の処理は invalidate(タグ) を呼ぶ。タグが無効化された時刻より前に
+  作り始めたエントリは、以後ヒットしない（作成中に更新された場合も含む）
+- ETag などの検証用ヘッダーも一緒に保持し、条件付きGETにはDBを読まずに304を返す
+- プロセス内のLRUに加えて、RESPONSE_CACHE_SHARED_PATH を指定すると同じマシンの
+  ワーカー間でSQLiteファイルを共有し、エントリと無効化を共有する
+  （既定で有効）。空にした場合、無効化は更新を処理したワーカーにしか届かず、他のワーカーは
+  TTLが切れるまで古い内容を返す。そのため serve.py は1ワーカーで起動する
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import orjson
+from fastapi import Request, Response, status
+from pydantic import BaseModel
+
+from core.config import settings
+from utils.cache import TTLCache
+from utils.conditional import is_not_modified
+from utils.metrics import metrics
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    tags: Tuple[str, ...]
+    started_at: float  # 作成を始めた時刻（UNIX時刻）
+    expires_at: float
+    headers: Tuple[Tuple[str, str], ...] = ()
+
+    def is_not_modified(self, request: Request) -> bool:
+        headers = dict(self.headers)
+        etag = headers.get("ETag")
+        if etag is None:
+            return False
+        last_modified = headers.get("Last-Modified")
+        return is_not_modified(
+            request,
+            etag,
+            parsedate_to_datetime(last_modified) if last_modified else None,
+        )
+
+    def to_response(self, request: Optional[Request] = None) -> Response:
+        headers = dict(self.headers, **{"X-Cache": "HIT"})
+        if request is not None and self.is_not_modified(request):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+def to_jsonable(content: Any) -> Any:
+    """レスポンスモデル（またはそのリスト・dict）をJSONにできる値にする"""
+    if isinstance(content, BaseModel):
+        return content.model_dump(mode="json")
+    if isinstance(content, list):
+        return [to_jsonable(item) for item in content]
+    if isinstance(content, dict):
+        return {key: to_jsonable(value) for key, value in content.items()}
+    return content
+
+
+class SharedCacheStore:
+    """
+    同じマシンのワーカー間で共有するSQLiteのストア
+    メソッドはブロッキングのため、呼び出し側でスレッドに逃がすこと
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        connection = self._connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                tags TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                headers TEXT NOT NULL DEFAULT '[]'
+            )
+            """
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS tag_invalidations (tag TEXT PRIMARY KEY, invalidated_at REAL NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_tag_invalidations_invalidated_at ON tag_invalidations (invalidated_at)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # 接続はスレッドごとに作る（sqlite3の接続はスレッド間で共有できない）
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+
+    def load(self, key: str) -> Optional[CachedResponse]:
+        row = self._connect().execute(
+            "SELECT body, tags, started_at, expires_at, headers FROM entries WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(
+            body=row[0],
+            tags=tuple(json.loads(row[1])),
+            started_at=row[2],
+            expires_at=row[3],
+            headers=tuple(tuple(header) for header in json.loads(row[4])),
+        )
+
+    def save(self, key: str, entry: CachedResponse) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO entries (key, body, tags, started_at, expires_at, headers)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, entry.body, json.dumps(entry.tags), entry.started_at, entry.expires_at, json.dumps(entry.headers)),
+        )
+
+    def last_invalidated(self, tags: Iterable[str]) -> float:
+        tags = list(tags)
+        if not tags:
+            return 0.0
+        placeholders = ",".join("?" * len(tags))
+        row = self._connect().execute(
+            f"SELECT MAX(invalidated_at) FROM tag_invalidations WHERE tag IN ({placeholders})",
+            tags,
+        ).fetchone()
+        return row[0] or 0.0
+
+    def invalidated_since(self, since: float, prefix: str) -> List[Tuple[str, float]]:
+        """since より後に無効化された、prefix で始まるタグと無効化の時刻"""
+        return self._connect().execute(
+            "SELECT tag, invalidated_at FROM tag_invalidations"
+            " WHERE invalidated_at > ? AND substr(tag, 1, ?) = ?",
+            (since, len(prefix), prefix),
+        ).fetchall()
+
+    def invalidate(self, tags: Iterable[str], at: float) -> None:
+        self._connect().executemany(
+            "INSERT OR REPLACE INTO tag_invalidations (tag, invalidated_at) VALUES (?, ?)",
+            [(tag, at) for tag in tags],
+        )
+
+    def purge_expired(self) -> int:
+        cursor = self._connect().execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+
+class ResponseCache:
+    """
+    タグで無効化できるレスポンスキャッシュ
+
+    Args:
+        maxsize (int): プロセス内に保持する最大件数
+        ttl (float): エントリの有効秒数の既定値
+        shared_path (str | None): ワーカー間で共有するSQLiteファイル（Noneの場合はプロセス内のみ）
+    """
+
+    def __init__(self, maxsize: int, ttl: float, shared_path: Optional[str] = None):
+        self.ttl = ttl
+        self.shared_path = shared_path
+        self._local = TTLCache("response", maxsize=maxsize, ttl=ttl, on_evict=self._forget)
+        self._invalidated_at: Dict[str, float] = {}
+        self._tag_keys: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._shared: Optional[SharedCacheStore] = None
+        self._shared_lock = threading.Lock()
+        self._purged_at = 0.0
+
+    @property
+    def shared(self) -> Optional[SharedCacheStore]:
+        # インポート時にファイルを作らないよう、最初に使うときに開く
+        if self.shared_path and self._shared is None:
+            with self._shared_lock:
+                if self._shared is None:
+                    self._shared = SharedCacheStore(self.shared_path)
+        return self._shared
+
+    @staticmethod
+    def key(route: str, **params: Any) -> str:
+        """ルート名とパラメータからキーを作る（パラメータの順序は問わない）"""
+        normalized = "&".join(f"{name}={params[name]}" for name in sorted(params))
+        return f"{route}?{normalized}"
+
+    def _local_last_invalidated(self, tags: Iterable[str]) -> float:
+        with self._lock:
+            return max((self._invalidated_at.get(tag, 0.0) for tag in tags), default=0.0)
+
+    async def last_invalidated(self, tags: Iterable[str]) -> float:
+        """タグが最後に無効化された時刻（共有ストアがあれば他ワーカーでの無効化を含む）"""
+        tags = tuple(tags)
+        last_invalidated = self._local_last_invalidated(tags)
+        shared = self.shared
+        if shared is not None:
+            last_invalidated = max(last_invalidated, await asyncio.to_thread(shared.last_invalidated, tags))
+        return last_invalidated
+
+    async def shared_invalidations_since(self, since: float, prefix: str) -> Dict[str, float]:
+        """
+        since より後に無効化された、prefix で始まるタグ（他のワーカーでの無効化を含む）
+        共有ストアがない場合は空を返す（単一プロセスでは更新した処理が自分で反映している）
+        """
+        shared = self.shared
+        if shared is None:
+            return {}
+        return dict(await asyncio.to_thread(shared.invalidated_since, since, prefix))
+
+    async def get(self, key: str, request: Optional[Request] = None) -> Optional[Response]:
+        """
+        キャッシュ済みのレスポンスを返す（ない場合はNone）
+        request を渡すと、保存済みのETagに一致する条件付きGETには304を返す
+        """
+        entry: Optional[CachedResponse] = self._local.get(key)
+        shared = self.shared
+        if entry is None and shared is not None:
+            entry = await asyncio.to_thread(shared.load, key)
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is not None:
+            last_invalidated = await self.last_invalidated(entry.tags)
+            if entry.started_at > last_invalidated and entry.expires_at > time.time():
+                metrics.incr("response_cache.hits")
+                return entry.to_response(request)
+            self._local.invalidate(key)
+            metrics.incr("response_cache.stale")
+
+        metrics.incr("response_cache.misses")
+        return None
+
+    def _remember(self, key: str, entry: CachedResponse) -> None:
+        self._local.set(key, entry, ttl=max(entry.expires_at - time.time(), 0.0))
+        with self._lock:
+            for tag in entry.tags:
+                self._tag_keys.setdefault(tag, set()).add(key)
+
+    def _forget(self, key: str, entry: CachedResponse) -> None:
+        # 追い出し・期限切れ・上書きされたエントリをタグの索引から外す
+        with self._lock:
+            for tag in entry.tags:
+                keys = self._tag_keys.get(tag)
+                if keys is None:
+                    continue
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+    async def store(
+        self,
+        key: str,
+        content: Any,
+        tags: Iterable[str],
+        started_at: float,
+        ttl: Optional[float] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        """
+        レスポンスを保存して返す
+
+        Args:
+            started_at (float): データを読み始める前の time.time()。
+                これより後に無効化されたタグを含む場合は保存しない
+            headers (dict | None): 一緒に返すヘッダー（ETag / Last-Modified / Cache-Control など）
+        """
+        body = orjson.dumps(to_jsonable(content))
+        entry = CachedResponse(
+            body=body,
+            tags=tuple(sorted(set(tags))),
+            started_at=started_at,
+            expires_at=time.time() + (self.ttl if ttl is None else ttl),
+            headers=tuple((headers or {}).items()),
+        )
+        if entry.started_at > self._local_last_invalidated(entry.tags):
+            self._remember(key, entry)
+            shared = self.shared
+            if shared is not None:
+                await asyncio.to_thread(self._save_shared, shared, key, entry)
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers=dict(headers or {}, **{"X-Cache": "MISS"}),
+        )
+
+    def _save_shared(self, shared: SharedCacheStore, key: str, entry: CachedResponse) -> None:
+        shared.save(key, entry)
+        # 期限切れのエントリはときどきまとめて削除する
+        now = time.time()
+        if now - self._purged_at > self.ttl:
+            self._purged_at = now
+            shared.purge_expired()
+
+    async def invalidate(self, *tags: str) -> None:
+        """タグの付いたエントリを無効化する"""
+        if not tags:
+            return
+        now = time.time()
+        with self._lock:
+            keys: List[str] = []
+            for tag in tags:
+                self._invalidated_at[tag] = now
+                keys.extend(self._tag_keys.pop(tag, ()))
+        for key in keys:
+            self._local.invalidate(key)
+        metrics.incr("response_cache.invalidations", len(tags))
+        shared = self.shared
+        if shared is not None:
+            try:
+                await asyncio.to_thread(shared.invalidate, tags, now)
+            except Exception as e:
+                print(f"❌ 共有キャッシュの無効化に失敗しました: {str(e)}")
+
+
+response_cache = ResponseCache(
+    maxsize=settings.RESPONSE_CACHE_SIZE,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    shared_path=settings.RESPONSE_CACHE_SHARED_PATH,
+)
@@ -0,0 +1,392 @@
+"""
+ナレッジの全文検索（プロセス内の転置インデックス）
+
+日本語は単語境界がないため、NFKC正規化した文字列を文字bigramに分割して索引する
+（1文字だけの区間はunigram）。スコアはフィールド重み付きのBM25
+1文字のクエリは、その文字を含むbigramの出現をまとめて1語として扱う
+
+インデックスはワーカーごとにメモリ上に保持する
+- 起動時にDBから全件を読み込んで構築する
+- 自ワーカーでの作成・更新・削除は即座に反映する
+- 他ワーカーでの作成・更新は updated_at を使った定期同期で取り込む
+- 他ワーカーでの削除は、削除時に共有ストアへ記録される knowledge:{id} タグの無効化を
+  定期同期で確認し、該当するIDだけDBに残っているか調べて取り込む
+"""
+import asyncio
+import html
+import math
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from core.config import settings
+from models.database import AsyncSessionLocal
+from models.knowledge import Knowledge
+from utils.metrics import metrics
+from utils.response_cache import response_cache
+
+# 検索対象フィールドと重み
+FIELD_WEIGHTS: Dict[str, float] = {
+    "title": 3.0,
+    "category": 1.5,
+    "method": 1.0,
+    "target": 1.0,
+    "description": 1.0,
+}
+
+# BM25のパラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# クエリのn-gramのうち、この割合以上を含む文書だけをヒットとする
+MIN_SHOULD_MATCH = 0.75
+
+# 同期の際、コミットの遅れや時計のずれを見込んで遡る秒数
+SYNC_OVERLAP = 5.0
+
+# 単語の一部として扱う記号（長音符・繰り返し記号など）
+_WORD_SYMBOLS = set("ー々〆ヶ")
+
+
+def _normalized_chars(text: str) -> List[Tuple[str, int]]:
+    """1文字ずつNFKC正規化・小文字化し、(正規化後の文字, 元の位置) の列を返す"""
+    chars = []
+    for index, ch in enumerate(text):
+        for normalized in unicodedata.normalize("NFKC", ch).lower():
+            chars.append((normalized, index))
+    return chars
+
+
+def tokenize(text: Optional[str]) -> List[Tuple[str, int, int]]:
+    """
+    文字n-gramに分割する
+
+    Returns:
+        List[Tuple[str, int, int]]: (トークン, 元テキストでの開始位置, 終了位置) の列
+    """
+    if not text:
+        return []
+
+    tokens = []
+    segment: List[Tuple[str, int]] = []
+
+    def flush_segment():
+        if len(segment) == 1:
+            ch, index = segment[0]
+            tokens.append((ch, index, index + 1))
+        for i in range(len(segment) - 1):
+            tokens.append((
+                segment[i][0] + segment[i + 1][0],
+                segment[i][1],
+                segment[i + 1][1] + 1,
+            ))
+        segment.clear()
+
+    for ch, index in _normalized_chars(text):
+        if ch.isalnum() or ch in _WORD_SYMBOLS:
+            segment.append((ch, index))
+        else:
+            flush_segment()
+    flush_segment()
+    return tokens
+
+
+def highlight(text: Optional[str], query_tokens: Set[str], width: int = 60) -> Optional[str]:
+    """
+    クエリに一致した箇所を <mark> で囲んだ抜粋を返す（一致しない場合はNone）
+    テキストはHTMLエスケープ済み
+    """
+    if not text:
+        return None
+
+    spans = [(start, end) for token, start, end in tokenize(text) if token in query_tokens]
+    if not spans:
+        return None
+
+    # 重なっている区間をまとめる
+    spans.sort()
+    merged = [list(spans[0])]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    # 最初の一致箇所を中心に抜粋する
+    first_start = merged[0][0]
+    window_start = max(0, first_start - width // 3)
+    window_end = min(len(text), window_start + width)
+
+    parts = []
+    cursor = window_start
+    for start, end in merged:
+        if end <= window_start or start >= window_end:
+            continue
+        start, end = max(start, window_start), min(end, window_end)
+        parts.append(html.escape(text[cursor:start]))
+        parts.append(f"<mark>{html.escape(text[start:end])}</mark>")
+        cursor = end
+    parts.append(html.escape(text[cursor:window_end]))
+
+    prefix = "…" if window_start > 0 else ""
+    suffix = "…" if window_end < len(text) else ""
+    return prefix + "".join(parts) + suffix
+
+
+class SearchIndex:
+    """フィールド重み付きBM25の転置インデックス（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._doc_lengths: Dict[int, float] = {}
+        self._total_length = 0.0
+        # 文字 → その文字を含む索引語（1文字のクエリを展開するため）
+        self._char_terms: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def doc_ids(self) -> Set[int]:
+        with self._lock:
+            return set(self._doc_terms)
+
+    def _remove_locked(self, doc_id: int) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._forget_term_locked(term)
+        self._total_length -= self._doc_lengths.pop(doc_id, 0.0)
+
+    def _forget_term_locked(self, term: str) -> None:
+        for ch in set(term):
+            terms = self._char_terms.get(ch)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._char_terms[ch]
+
+    def _postings_for_locked(self, token: str) -> Dict[int, float]:
+        """
+        クエリのトークンに一致する (文書ID → 出現頻度)
+        1文字のトークンは、その文字を含むすべての索引語の出現頻度を合計する
+        """
+        if len(token) != 1:
+            return self._postings.get(token) or {}
+        combined: Dict[int, float] = {}
+        for term in self._char_terms.get(token, ()):
+            for doc_id, frequency in self._postings[term].items():
+                combined[doc_id] = combined.get(doc_id, 0.0) + frequency
+        return combined
+
+    def expand(self, query_tokens: Set[str]) -> Set[str]:
+        """ハイライト用に、1文字のトークンをそれを含む索引語に展開する"""
+        with self._lock:
+            expanded = set(query_tokens)
+            for token in query_tokens:
+                if len(token) == 1:
+                    expanded.update(self._char_terms.get(token, ()))
+            return expanded
+
+    def add(self, doc_id: int, fields: Dict[str, Optional[str]]) -> None:
+        """文書を追加する（既にある場合は置き換える）"""
+        terms: Dict[str, float] = {}
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            for token, _, _ in tokenize(fields.get(field)):
+                terms[token] = terms.get(token, 0.0) + weight
+                length += weight
+
+        with self._lock:
+            self._remove_locked(doc_id)
+            self._doc_terms[doc_id] = terms
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = frequency
+                for ch in set(term):
+                    self._char_terms.setdefault(ch, set()).add(term)
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def search(self, query: str) -> Tuple[List[Tuple[int, float]], Set[str]]:
+        """
+        クエリに一致する文書をスコア順に返す
+
+        Returns:
+            Tuple[List[Tuple[int, float]], Set[str]]: ((文書ID, スコア) のリスト, ハイライトするトークンの集合)
+        """
+        query_tokens = {token for token, _, _ in tokenize(query)}
+        if not query_tokens:
+            return [], query_tokens
+
+        required = max(1, math.ceil(len(query_tokens) * MIN_SHOULD_MATCH))
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+
+        with self._lock:
+            total_docs = len(self._doc_terms)
+            if total_docs == 0:
+                return [], query_tokens
+            average_length = self._total_length / total_docs or 1.0
+
+            for token in query_tokens:
+                postings = self._postings_for_locked(token)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                for doc_id, frequency in postings.items():
+                    length_norm = 1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / average_length
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * (
+                        frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+                    )
+                    matched[doc_id] = matched.get(doc_id, 0) + 1
+
+        ranked = [
+            (doc_id, score) for doc_id, score in scores.items()
+            if matched[doc_id] >= required
+        ]
+        ranked.sort(key=lambda item: (-item[1], -item[0]))
+        return ranked, self.expand(query_tokens)
+
+
+def knowledge_fields(knowledge) -> Dict[str, Optional[str]]:
+    """Knowledge（またはそれと同じ属性を持つ行）から検索対象フィールドを取り出す"""
+    return {field: getattr(knowledge, field) for field in FIELD_WEIGHTS}
+
+
+class KnowledgeSearchService:
+    """ナレッジ検索インデックスの構築とDBとの定期同期"""
+
+    def __init__(self, refresh_interval: float):
+        self.index = SearchIndex()
+        self.refresh_interval = refresh_interval
+        self._watermark: Optional[datetime] = None
+        # 他ワーカーでの削除をどの時刻（UNIX時刻）まで確認したか
+        self._deletions_checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        metrics.register_gauge("search.documents", lambda: len(self.index))
+
+    def index_knowledge(self, knowledge) -> None:
+        self.index.add(knowledge.id, knowledge_fields(knowledge))
+
+    def remove_knowledge(self, knowledge_id: int) -> None:
+        self.index.remove(knowledge_id)
+
+    def search(self, query: str) -> Tuple[List[Tuple[int, float]], Set[str]]:
+        start = time.perf_counter()
+        try:
+            return self.index.search(query)
+        finally:
+            metrics.observe("search.query", time.perf_counter() - start)
+
+    async def _load(self, since: Optional[datetime]) -> List:
+        columns = [Knowledge.id, Knowledge.updated_at] + [
+            getattr(Knowledge, field) for field in FIELD_WEIGHTS
+        ]
+        query = select(*columns)
+        if since is not None:
+            query = query.where(Knowledge.updated_at >= since)
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query.execution_options(yield_per=500))
+            return [row async for row in result]
+
+    def _apply(self, rows: Iterable) -> None:
+        for row in rows:
+            self.index.add(row.id, knowledge_fields(row))
+            if row.updated_at is not None and (self._watermark is None or row.updated_at > self._watermark):
+                self._watermark = row.updated_at
+
+    async def rebuild(self) -> int:
+        """DBの全件からインデックスを構築する"""
+        start = time.perf_counter()
+        # これより前の削除は全件の読み込みに含まれている
+        self._deletions_checked_at = time.time()
+        rows = await self._load(None)
+        # 索引付けはCPU処理のためイベントループを塞がないよう別スレッドで行う
+        await asyncio.to_thread(self._apply, rows)
+        metrics.observe("search.rebuild", time.perf_counter() - start)
+        return len(rows)
+
+    async def sync(self) -> None:
+        """他ワーカーでの作成・更新・削除を取り込む"""
+        # コミットの遅れを考慮して少し前から読み直す（再索引は冪等）
+        since = self._watermark - timedelta(seconds=SYNC_OVERLAP) if self._watermark else None
+        rows = await self._load(since)
+        await asyncio.to_thread(self._apply, rows)
+        await self._sync_deletions()
+
+    async def _sync_deletions(self) -> None:
+        """
+        削除（または更新）で無効化されたナレッジのうち、DBにないものをインデックスから除く
+        全件のIDは読まないため、この間に自ワーカーで索引付けしたナレッジを消すことはない
+        """
+        now = time.time()
+        invalidations = await response_cache.shared_invalidations_since(
+            self._deletions_checked_at - SYNC_OVERLAP, "knowledge:"
+        )
+        self._deletions_checked_at = now
+
+        candidates = set()
+        for tag in invalidations:
+            try:
+                candidates.add(int(tag[len("knowledge:"):]))
+            except ValueError:
+                # knowledge:list など
+                continue
+        candidates &= self.index.doc_ids()
+        if not candidates:
+            return
+
+        async with AsyncSessionLocal() as db:
+            existing = set((await db.scalars(
+                select(Knowledge.id).where(Knowledge.id.in_(candidates))
+            )).all())
+        for doc_id in candidates - existing:
+            self.index.remove(doc_id)
+            metrics.incr("search.sync_removed")
+
+    async def _run(self) -> None:
+        try:
+            count = await self.rebuild()
+            print(f"✅ 検索インデックスを構築しました: {count}件")
+        except Exception as e:
+            print(f"❌ 検索インデックスの構築に失敗しました: {str(e)}")
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                metrics.incr("search.sync_errors")
+                print(f"❌ 検索インデックスの同期に失敗しました: {str(e)}")
+
+    def start(self) -> None:
+        """インデックス構築と定期同期のバックグラウンドタスクを開始する"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+knowledge_search = KnowledgeSearchService(refresh_interval=settings.SEARCH_INDEX_REFRESH_INTERVAL)
@@ -0,0 +1,203 @@
+"""
+添付ファイルの保存先（Blobストレージ）の抽象化
+
+- azure: Azure Blob Storage（AZURE_STORAGE_* の設定を使用）
+- local: ローカルファイルシステム（開発・テスト用）
+
+アップロードは固定サイズのチャンク単位でストリーミングし、
+ファイル全体をメモリに載せない。サイズとSHA-256は転送しながら計算する
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator, Optional, Protocol
+
+from core.config import settings
+from utils.metrics import metrics
+
+
+class AsyncReadable(Protocol):
+    async def read(self, size: int = -1) -> bytes: ...
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    key: str
+    url: str
+    size: int
+    sha256: str
+
+
+def build_storage_key(knowledge_id: int, filename: str) -> str:
+    """保存先のキーを作る（ファイル名はパスとして安全な文字だけに置き換える）"""
+    basename = os.path.basename(filename or "") or "file"
+    safe_name = re.sub(r"[^\w.\-]", "_", basename)[:200]
+    return f"knowledge/{knowledge_id}/{uuid.uuid4().hex}/{safe_name}"
+
+
+class BlobStorage:
+    """Blobストレージの共通インターフェース"""
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+
+    async def save(self, key: str, source: AsyncReadable, content_type: str | None) -> StoredBlob:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def iter_range(self, key: str, start: int, length: int) -> AsyncIterator[bytes]:
+        """start バイト目から length バイトをチャンク単位で返す"""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """ローカルファイルとして直接読める場合はそのパス（ゼロコピー送信用）"""
+        return None
+
+    async def ping(self) -> None:
+        """ストレージに到達できるかを確認する（できない場合は例外）"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalBlobStorage(BlobStorage):
+    """ローカルファイルシステムに保存するストレージ"""
+
+    def __init__(self, root: str, chunk_size: int):
+        super().__init__(chunk_size)
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"不正なキーです: {key}")
+        return path
+
+    async def save(self, key: str, source: AsyncReadable, content_type: str | None) -> StoredBlob:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.part"
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, "wb") as f:
+                while chunk := await source.read(self.chunk_size):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        metrics.incr("storage.uploaded_bytes", size)
+        return StoredBlob(key=key, url=f"file://{path}", size=size, sha256=digest.hexdigest())
+
+    async def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    async def iter_range(self, key: str, start: int, length: int) -> AsyncIterator[bytes]:
+        with open(self.path_for(key), "rb") as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self.path_for(key)
+
+    async def ping(self) -> None:
+        if not os.path.isdir(self.root) or not os.access(self.root, os.W_OK):
+            raise RuntimeError(f"保存先に書き込めません: {self.root}")
+
+
+class AzureBlobStorage(BlobStorage):
+    """
+    Azure Blob Storage に保存するストレージ
+    チャンクごとに Put Block し、最後に Put Block List でコミットする
+    """
+
+    def __init__(self, connection_string: str, container_name: str, chunk_size: int):
+        super().__init__(chunk_size)
+        try:
+            from azure.storage.blob.aio import BlobServiceClient
+        except ImportError as e:
+            raise RuntimeError(
+                "Azure Blob Storage を使うには azure-storage-blob と aiohttp が必要です"
+            ) from e
+        self._service = BlobServiceClient.from_connection_string(connection_string)
+        self._container = self._service.get_container_client(container_name)
+
+    async def save(self, key: str, source: AsyncReadable, content_type: str | None) -> StoredBlob:
+        from azure.storage.blob import BlobBlock, ContentSettings
+
+        blob = self._container.get_blob_client(key)
+        digest = hashlib.sha256()
+        size = 0
+        blocks = []
+        while chunk := await source.read(self.chunk_size):
+            digest.update(chunk)
+            size += len(chunk)
+            block_id = base64.b64encode(f"{len(blocks):08d}".encode()).decode()
+            await blob.stage_block(block_id, chunk)
+            blocks.append(BlobBlock(block_id=block_id))
+
+        await blob.commit_block_list(
+            blocks,
+            content_settings=ContentSettings(content_type=content_type or "application/octet-stream"),
+        )
+        metrics.incr("storage.uploaded_bytes", size)
+        return StoredBlob(key=key, url=blob.url, size=size, sha256=digest.hexdigest())
+
+    async def delete(self, key: str) -> None:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            await self._container.delete_blob(key)
+        except ResourceNotFoundError:
+            pass
+
+    async def iter_range(self, key: str, start: int, length: int) -> AsyncIterator[bytes]:
+        # Range付きでダウンロードし、SDKのチャンク単位でそのまま流す
+        downloader = await self._container.get_blob_client(key).download_blob(
+            offset=start,
+            length=length,
+        )
+        async for chunk in downloader.chunks():
+            yield chunk
+
+    async def ping(self) -> None:
+        await self._container.get_container_properties()
+
+    async def close(self) -> None:
+        await self._service.close()
+
+
+@lru_cache
+def get_storage() -> BlobStorage:
+    """設定に応じたストレージを返す（プロセス内で1つを共有）"""
+    if settings.STORAGE_BACKEND == "local":
+        return LocalBlobStorage(settings.LOCAL_STORAGE_DIR, settings.STORAGE_CHUNK_SIZE)
+    return AzureBlobStorage(
+        settings.AZURE_STORAGE_CONNECTION_STRING,
+        settings.AZURE_STORAGE_CONTAINER_NAME,
+        settings.STORAGE_CHUNK_SIZE,
+    )
@@ -0,0 +1,184 @@
+"""
+ナレッジ閲覧数の書き込みバッファ（write-behind）
+
+詳細表示のたびに knowledges の行を更新せず、プロセス内で閲覧数を集計して
+一定間隔または一定件数ごとに UPDATE ... SET views = views + n でまとめて反映する
+著者の累積PV（user_stats.total_views）も同じトランザクションで加算する
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+
+from core.config import settings
+from models.database import engine
+from models.knowledge import Knowledge
+from models.user_stats import UserStats
+from utils.metrics import metrics
+
+
+class ViewCounterBuffer:
+    """
+    閲覧数をバッファリングし、バッチでDBに反映する
+
+    Args:
+        flush_interval (float): 定期フラッシュの間隔（秒）
+        flush_threshold (int): この件数の閲覧が溜まったら間隔を待たずにフラッシュする
+        dedupe_window (float): 同一ユーザーの同一ナレッジ閲覧を1回とみなす秒数（0で無効）
+    """
+
+    def __init__(self, flush_interval: float, flush_threshold: int, dedupe_window: float):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.dedupe_window = dedupe_window
+        self._pending: Dict[int, int] = {}
+        self._pending_total = 0
+        self._recent_views: Dict[Tuple[int, int], float] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        metrics.register_gauge("view_counter.pending", lambda: self._pending_total)
+
+    def record(self, knowledge_id: int, user_id: Optional[int] = None) -> bool:
+        """
+        閲覧を記録する
+
+        Returns:
+            bool: カウントした場合True（重複閲覧として除外した場合False）
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.dedupe_window > 0 and user_id is not None:
+                key = (user_id, knowledge_id)
+                last_seen = self._recent_views.get(key)
+                if last_seen is not None and now - last_seen < self.dedupe_window:
+                    metrics.incr("view_counter.deduped")
+                    return False
+                self._recent_views[key] = now
+            self._pending[knowledge_id] = self._pending.get(knowledge_id, 0) + 1
+            self._pending_total += 1
+            should_flush = self._pending_total >= self.flush_threshold
+
+        if should_flush and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def pending(self, knowledge_id: int) -> int:
+        """まだDBに反映していない閲覧数"""
+        return self._pending.get(knowledge_id, 0)
+
+    def _drain(self) -> Dict[int, int]:
+        with self._lock:
+            drained = self._pending
+            self._pending = {}
+            self._pending_total = 0
+            if self.dedupe_window > 0:
+                cutoff = time.monotonic() - self.dedupe_window
+                self._recent_views = {
+                    key: seen for key, seen in self._recent_views.items() if seen >= cutoff
+                }
+        return drained
+
+    def _restore(self, counts: Dict[int, int]) -> None:
+        # フラッシュに失敗した分は次回に持ち越す
+        with self._lock:
+            for knowledge_id, count in counts.items():
+                self._pending[knowledge_id] = self._pending.get(knowledge_id, 0) + count
+                self._pending_total += count
+
+    async def flush(self) -> int:
+        """
+        溜まっている閲覧数をDBに反映する
+
+        Returns:
+            int: 反映したナレッジ数
+        """
+        async with self._flush_lock:
+            counts = self._drain()
+            if not counts:
+                return 0
+
+            table = Knowledge.__table__
+            statement = (
+                update(table)
+                .where(table.c.id == bindparam("knowledge_id"))
+                # updated_at の onupdate が走らないよう現在値のまま指定する
+                .values(views=table.c.views + bindparam("increment"), updated_at=table.c.updated_at)
+            )
+            stats_table = UserStats.__table__
+            stats_statement = (
+                update(stats_table)
+                .where(stats_table.c.user_id == bindparam("author_id"))
+                .values(total_views=stats_table.c.total_views + bindparam("increment"))
+            )
+            # 行ロックを取る順序をワーカー間でそろえ（主キー順）、同時にフラッシュしたときのデッドロックを避ける
+            params = [
+                {"knowledge_id": knowledge_id, "increment": count}
+                for knowledge_id, count in sorted(counts.items())
+            ]
+
+            start = time.perf_counter()
+            try:
+                async with engine.begin() as connection:
+                    await connection.execute(statement, params)
+                    # 著者ごとに合計し、user_stats も user_id 順に更新する
+                    authors = await connection.execute(
+                        select(table.c.id, table.c.author_id).where(table.c.id.in_(list(counts)))
+                    )
+                    per_author: Dict[int, int] = {}
+                    for knowledge_id, author_id in authors:
+                        if author_id is not None:
+                            per_author[author_id] = per_author.get(author_id, 0) + counts[knowledge_id]
+                    if per_author:
+                        await connection.execute(stats_statement, [
+                            {"author_id": author_id, "increment": increment}
+                            for author_id, increment in sorted(per_author.items())
+                        ])
+            except asyncio.CancelledError:
+                self._restore(counts)
+                raise
+            except Exception as e:
+                print(f"❌ 閲覧数の反映に失敗しました: {str(e)}")
+                metrics.incr("view_counter.flush_errors")
+                self._restore(counts)
+                return 0
+            metrics.observe("view_counter.flush", time.perf_counter() - start)
+            metrics.incr("view_counter.flushed_views", sum(counts.values()))
+            return len(counts)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """定期フラッシュのバックグラウンドタスクを開始する"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """バックグラウンドタスクを止め、残りを反映する（シャットダウン時）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await self.flush()
+
+
+view_counter = ViewCounterBuffer(
+    flush_interval=settings.VIEW_COUNTER_FLUSH_INTERVAL,
+    flush_threshold=settings.VIEW_COUNTER_FLUSH_THRESHOLD,
+    dedupe_window=settings.VIEW_COUNTER_DEDUPE_WINDOW,
+)